@@ -0,0 +1,62 @@
+# бенчмарк фильтра заказов по пользователям: set + isin против EligibleUsers
+#
+#   python bench/bench_user_filter.py --orders 10000000
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from dimensions import EligibleUsers
+
+
+def best_of(func, repeat):
+    # лучшее время из нескольких запусков
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк фильтра заказов по пользователям')
+    parser.add_argument('--orders', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--ratio', type=float, default=0.75, help='доля пользователей 2025 года')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sparse', action='store_true', help='разреженные user_id (хеш-поиск pandas isin по массиву id)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    user_ids = np.arange(1, args.users + 1, dtype=np.int64)
+    if args.sparse:
+        user_ids = user_ids * 1_000_003
+    eligible_ids = user_ids[rng.random(args.users) < args.ratio]
+    orders = pd.DataFrame({'user_id': rng.choice(user_ids, size=args.orders)})
+
+    def isin_path():
+        return orders[orders['user_id'].isin(set(eligible_ids))]
+
+    def mask_path():
+        eligible = EligibleUsers(eligible_ids)
+        return orders[eligible.contains(orders['user_id'])]
+
+    isin_time, expected = best_of(isin_path, args.repeat)
+    mask_time, result = best_of(mask_path, args.repeat)
+    assert len(result) == len(expected)
+
+    print(f"orders={args.orders:,} users={args.users:,} sparse={args.sparse}")
+    print(f"set + isin:     {isin_time:.3f} s")
+    print(f"EligibleUsers:  {mask_time:.3f} s")
+    print(f"ускорение:      x{isin_time / mask_time:.1f}")
+
+
+if __name__ == '__main__':
+    main()
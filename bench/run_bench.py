@@ -0,0 +1,171 @@
+# бенчмарк ETL на синтетических данных разного размера
+#
+#   python bench/run_bench.py --sizes 1e5,1e6 --modes full,streaming
+#   python bench/run_bench.py --sizes 1e5 --update-baseline
+#
+# каждый запуск идет в отдельном процессе, чтобы пиковый RSS относился только к нему
+# результаты пишутся в bench/results/bench_*.json и сравниваются с bench/baseline.json
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+DATA_DIR = BENCH_DIR / 'data'
+RESULTS_DIR = BENCH_DIR / 'results'
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+
+
+def dataset_dir(num_orders):
+    # данные кешируются между запусками: генерация дороже самого ETL
+    path = DATA_DIR / f'orders_{num_orders}'
+    if (path / 'orders.parquet').exists():
+        return path
+
+    from data_generator import DataGenerator
+
+    path.mkdir(parents=True, exist_ok=True)
+    print(f"Генерация данных: {num_orders:,} заказов -> {path}")
+    generator = DataGenerator(
+        num_stores=max(10, num_orders // 10_000),
+        num_users=max(100, num_orders // 2),
+        num_orders=num_orders,
+        seed=42
+    )
+    generator.generate_all_fast(path, chunk_size=1_000_000, workers=multiprocessing.cpu_count())
+    return path
+
+
+def phase(stage_name):
+    # read_* - extract, write_* - load, остальное - transform
+    if stage_name.startswith('read_'):
+        return 'extract'
+    if stage_name.startswith('write_'):
+        return 'load'
+    return 'transform'
+
+
+def run_case(input_dir, mode, workers):
+    # один прогон ETL, выполняется в отдельном процессе
+    import logging
+    from etl_process import StoreAnalyticsETL
+    from profiling import peak_rss_mb
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        etl = StoreAnalyticsETL(input_dir, Path(tmp) / 'output', Path(tmp) / 'logs', mode=mode, workers=workers)
+
+        start = time.perf_counter()
+        etl.run()
+        total = time.perf_counter() - start
+
+    phases = {'extract': 0.0, 'transform': 0.0, 'load': 0.0}
+    stages = {}
+    for record in etl.profiler.stages:
+        phases[phase(record['stage'])] += record['wall_seconds']
+        stages[record['stage']] = record['wall_seconds']
+
+    orders = etl.metrics['records_processed']['orders']
+    return {
+        'extract_seconds': round(phases['extract'], 4),
+        'transform_seconds': round(phases['transform'], 4),
+        'load_seconds': round(phases['load'], 4),
+        'total_seconds': round(total, 4),
+        'orders_per_second': round(orders / total, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 2),
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # регрессия - total_seconds вырос больше чем на tolerance относительно baseline
+    reference = {(item['size'], item['mode']): item for item in baseline.get('results', [])}
+    regressions = []
+
+    for item in results:
+        base = reference.get((item['size'], item['mode']))
+        if base is None:
+            continue
+        ratio = item['total_seconds'] / base['total_seconds']
+        item['baseline_ratio'] = round(ratio, 3)
+        marker = ''
+        if ratio > 1 + tolerance:
+            regressions.append(item)
+            marker = '  <-- регрессия'
+        print(f"  {item['size']:>12,} {item['mode']:<12} {base['total_seconds']:>9.3f}s -> "
+              f"{item['total_seconds']:>9.3f}s  x{ratio:.2f}{marker}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк ETL')
+    parser.add_argument('--sizes', default='1e5,1e6', help='число заказов через запятую: 1e5,1e6,1e7,1e8')
+    parser.add_argument('--modes', default='full,streaming,parallel')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='берется лучший из повторов')
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    for size in sizes:
+        input_dir = dataset_dir(size)
+        for mode in modes:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs.append(pool.submit(run_case, str(input_dir), mode, args.workers).result())
+            best = min(runs, key=lambda run: run['total_seconds'])
+            results.append({'size': size, 'mode': mode, **best})
+            print(f"{size:>12,} {mode:<12} total {best['total_seconds']:.3f}s "
+                  f"(extract {best['extract_seconds']:.3f}, transform {best['transform_seconds']:.3f}, "
+                  f"load {best['load_seconds']:.3f}), {best['orders_per_second']:,.0f} заказов/с, "
+                  f"RSS {best['peak_rss_mb']:.0f} МБ")
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+    regressions = []
+    if args.baseline.exists() and not args.update_baseline:
+        print(f"\nСравнение с {args.baseline}:")
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    output = args.output or RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nРезультаты: {output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline обновлен: {args.baseline}")
+
+    if regressions:
+        print(f"Регрессий: {len(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
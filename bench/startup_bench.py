@@ -0,0 +1,96 @@
+# бенчмарк старта: время импорта по python -X importtime и время процесса целиком
+#
+#   python bench/startup_bench.py
+#   python bench/startup_bench.py --repeat 10 --top 15
+#
+# каждый случай - отдельный процесс, берется лучший из повторов (меньше влияния кеша диска)
+# importtime пишет в stderr строки "import time: self [us] | cumulative | package",
+# вложенность пакета - отступом; верхний уровень - модули, импортированные самим сценарием
+
+import argparse
+from datetime import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+SRC_DIR = BENCH_DIR.parent / 'src'
+RESULTS_DIR = BENCH_DIR / 'results'
+
+# сценарий -> код; что реально импортирует каждая команда CLI
+CASES = {
+    'main': 'import main',
+    'cli_help': 'import main; main.build_parser().format_help()',
+    'run_local': 'import main, etl_process',
+    'run_s3': 'import main, etl_process, s3_handler',
+    'serve': 'import main, service',
+}
+
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'boto3', 'botocore')
+
+
+def parse_importtime(stderr):
+    # [(модуль, self мкс, cumulative мкс, глубина)]
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def run_case(code):
+    env = {**os.environ, 'PYTHONPATH': str(SRC_DIR)}
+    script = f"{code}\nimport sys\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                             capture_output=True, text=True, env=env, check=True)
+    wall = time.perf_counter() - start
+
+    rows = parse_importtime(process.stderr)
+    top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: row[2], reverse=True)
+    return {
+        'wall_seconds': round(wall, 4),
+        'import_seconds': round(sum(row[1] for row in rows) / 1e6, 4),
+        'modules': len(rows),
+        'heavy_modules': [name for name in process.stdout.strip().split(',') if name],
+        'top': [{'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+                for name, _, cumulative, _ in top_level],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк времени старта')
+    parser.add_argument('--cases', default=','.join(CASES), help=f'через запятую из: {",".join(CASES)}')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help='самых дорогих импортов верхнего уровня')
+    parser.add_argument('--output', type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case in args.cases.split(','):
+        runs = [run_case(CASES[case]) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run['wall_seconds'])
+        best['top'] = best['top'][:args.top]
+        results[case] = best
+        print(f"{case:<10} процесс {best['wall_seconds'] * 1000:7.1f} мс, импорт "
+              f"{best['import_seconds'] * 1000:7.1f} мс, модулей {best['modules']:4}, "
+              f"тяжелые: {', '.join(best['heavy_modules']) or '-'}")
+        for item in best['top']:
+            print(f"    {item['module']:<30} {item['cumulative_ms']:8.1f} мс")
+
+    output = args.output or RESULTS_DIR / f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.now().isoformat(), 'python': sys.version.split()[0],
+                   'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\nРезультаты: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# онлайн агрегация: топ-N магазинов по городам без join'а заказов с магазинами
+
+import numpy as np
+
+from dimensions import StoreDimension
+
+
+class StoreAggregator:
+    # копит суммы заказов по store_id, батч за батчем
+    # память O(магазинов), а не O(заказов)
+
+    def __init__(self):
+        self.sums = {}
+        self.rows = 0
+
+    def update(self, orders_batch):
+        # orders_batch - DataFrame с колонками store_id, amount
+        if not len(orders_batch):
+            return
+
+        partial = orders_batch.groupby('store_id')['amount'].sum()
+        for store_id, amount in partial.items():
+            self.sums[store_id] = self.sums.get(store_id, 0.0) + amount
+        self.rows += len(orders_batch)
+
+    def merge(self, other):
+        # слияние частичных сумм (например из другого процесса)
+        for store_id, amount in other.sums.items():
+            self.sums[store_id] = self.sums.get(store_id, 0.0) + amount
+        self.rows += other.rows
+
+    def top_n(self, stores_df, n=3, dimension=None):
+        # только здесь маппим store_id на город и название магазина
+        dimension = dimension or StoreDimension(stores_df)
+
+        store_ids = np.fromiter(self.sums.keys(), dtype=np.int64, count=len(self.sums))
+        amounts = np.fromiter(self.sums.values(), dtype=np.float64, count=len(self.sums))
+
+        # магазины с одинаковым (город, название) складываются, как в groupby(['city', 'name'])
+        totals, counts = dimension.aggregate(dimension.codes(store_ids), amounts)
+        return dimension.top_n(totals, counts, n=n)
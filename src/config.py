@@ -0,0 +1,26 @@
+# загрузка config/config.yaml
+
+import logging
+import os
+from pathlib import Path
+
+import yaml
+
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / 'config' / 'config.yaml'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def load_config(path=None):
+    # путь можно переопределить через ETL_CONFIG, если файла нет - пустой конфиг
+    path = Path(path or os.getenv('ETL_CONFIG', DEFAULT_CONFIG_PATH))
+    if not path.exists():
+        return {}
+
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def setup_logging(level=logging.INFO):
+    # вывод в консоль; вызывается точкой входа, а не при импорте модулей
+    logging.basicConfig(level=level, format=LOG_FORMAT)
@@ -3,19 +3,83 @@
 
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
 import random
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+# состояние процесса-генератора шардов, заполняется в _init_orders_worker
+_worker = {}
+
+# распределения по умолчанию - равномерные, как в построчном генераторе
+DEFAULT_DISTRIBUTIONS = {
+    'user_popularity': 'uniform',
+    'user_zipf_a': 1.1,
+    'store_popularity': 'uniform',
+    'store_zipf_a': 1.1,
+    'city_popularity': 'uniform',
+    'city_zipf_a': 1.0,
+    'num_cities': None,
+    'seasonality': 0.0,
+    'peak_month': 12,
+    'diurnal': False,
+    'late_arrival_ratio': 0.0,
+    'late_arrival_max_days': 30,
+}
+
+# ключи потоков случайных чисел для перемешивания популярных значений
+SAMPLER_KEYS = ('city', 'user', 'store')
+
+# суточный профиль заказов: ночью мало, пик вечером
+DIURNAL_PROFILE = np.array([
+    0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.7, 0.9, 1.0, 1.1, 1.2,
+    1.3, 1.2, 1.1, 1.1, 1.2, 1.4, 1.7, 1.9, 1.8, 1.4, 0.9, 0.5,
+])
+
 
 class DataGenerator:
     
-    def __init__(self, num_stores=10, num_users=10000, num_orders=20000):
+    def __init__(self, num_stores=10, num_users=10000, num_orders=20000, seed=None,
+                 cities=None, users_2025_ratio=0.75, distributions=None):
         self.num_stores = num_stores
         self.num_users = num_users
         self.num_orders = num_orders
+        # seed для векторного генератора (*_fast), с одним seed данные всегда одинаковые;
+        # без seed энтропия берется один раз: иначе каждый процесс-воркер перемешал бы
+        # популярные значения zipf по-своему
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.users_2025_ratio = users_2025_ratio
+        # распределения для *_fast: zipf популярность, сезонность, опоздавшие заказы
+        self.distributions = {**DEFAULT_DISTRIBUTIONS, **(distributions or {})}
         
-        self.cities = ['Москва', 'Санкт-Петербург', 'Магнитогорск', 'Рыбинск', 'Казань']
+        self.cities = cities or ['Москва', 'Санкт-Петербург', 'Магнитогорск', 'Рыбинск', 'Казань']
+        if self.distributions['num_cities']:
+            self.cities = [f'Город_{i}' for i in range(1, self.distributions['num_cities'] + 1)]
 
         self.statuses = ['completed', 'pending', 'cancelled', 'processing']
+        self._samplers = {}
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        # параметры из секции data_generator в config.yaml, overrides - поверх (None пропускаются)
+        section = config.get('data_generator', {})
+        params = {
+            'num_stores': section.get('num_stores', 10),
+            'num_users': section.get('num_users', 10000),
+            'num_orders': section.get('num_orders', 20000),
+            'seed': section.get('seed'),
+            'cities': section.get('cities'),
+            'users_2025_ratio': section.get('users_2025_ratio', 0.75),
+            'distributions': section.get('distributions'),
+        }
+        params.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**params)
         
     def generate_stores(self):
         # данные о магазинах
@@ -90,6 +154,165 @@ class DataGenerator:
         df = pd.DataFrame(orders)
         return df
     
+    # векторная генерация: numpy массивы целиком, без dict на строку
+
+    def _rng(self, *key):
+        # отдельный поток случайных чисел на каждую часть данных
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=key))
+
+    def _sampler(self, name, values):
+        # выбор значений с популярностью из distributions[name + '_popularity']
+        # zipf: вес k-го по популярности значения ~ 1 / k^a, популярные значения перемешаны
+        values = np.asarray(values)
+        kind = self.distributions[f'{name}_popularity']
+        if kind == 'uniform':
+            return lambda rng, size: values[rng.integers(0, len(values), size=size)]
+        if kind != 'zipf':
+            raise ValueError(f"Неизвестное распределение {name}: {kind}")
+
+        if name not in self._samplers:
+            order = self._rng(9, SAMPLER_KEYS.index(name)).permutation(len(values))
+            weights = 1.0 / np.arange(1, len(values) + 1) ** self.distributions[f'{name}_zipf_a']
+            cdf = np.cumsum(weights)
+            self._samplers[name] = (values[order], cdf / cdf[-1])
+        popular, cdf = self._samplers[name]
+        return lambda rng, size: popular[np.minimum(np.searchsorted(cdf, rng.random(size)), len(cdf) - 1)]
+
+    def _order_timestamps(self, rng, size):
+        # время заказов 2025 года: сезонность по месяцам, суточный профиль, опоздания
+        dist = self.distributions
+
+        months = np.arange(1, 13)
+        month_weights = 1 + dist['seasonality'] * np.cos(2 * np.pi * (months - dist['peak_month']) / 12)
+        hour_weights = DIURNAL_PROFILE if dist['diurnal'] else np.ones(24)
+
+        created_at = _timestamps(
+            np.full(size, 2025),
+            rng.choice(months, size=size, p=month_weights / month_weights.sum()),
+            rng.integers(1, 29, size=size),
+            rng.choice(24, size=size, p=hour_weights / hour_weights.sum()),
+            rng.integers(0, 60, size=size)
+        )
+
+        if dist['late_arrival_ratio'] > 0:
+            # внутри куска id идут по времени, а часть заказов приходит с опозданием:
+            # их время сдвинуто назад (до прошлого года), а id - как у свежих
+            created_at.sort()
+            late = rng.random(size) < dist['late_arrival_ratio']
+            delay_minutes = rng.integers(1, dist['late_arrival_max_days'] * 24 * 60, size=int(late.sum()))
+            created_at[late] -= delay_minutes.astype('timedelta64[m]')
+        return created_at
+
+    def generate_stores_fast(self):
+        rng = self._rng(0)
+        ids = np.arange(1, self.num_stores + 1, dtype=np.int64)
+        return pa.table({
+            'id': ids,
+            'name': _prefixed('Магазин_', ids),
+            'city': pa.array(self._sampler('city', self.cities)(rng, len(ids)), type=pa.string())
+        })
+
+    def generate_users_fast(self):
+        rng = self._rng(1)
+        size = self.num_users
+        ids = np.arange(1, size + 1, dtype=np.int64)
+
+        # users_2025_ratio пользователей 2025 года, остальные - 2023, 2024, 2026
+        years = np.where(rng.random(size) < self.users_2025_ratio, 2025, rng.choice([2023, 2024, 2026], size=size))
+        created_at = _timestamps(
+            years,
+            rng.integers(1, 13, size=size),
+            rng.integers(1, 29, size=size),
+            rng.integers(0, 24, size=size),
+            rng.integers(0, 60, size=size)
+        )
+        phones = rng.integers(9000000000, 9999999999, size=size, endpoint=True)
+
+        return pa.table({
+            'id': ids,
+            'name': _prefixed('User_', ids),
+            'phone': _prefixed('+7', phones),
+            'created_at': pa.array(created_at, type=pa.timestamp('ns'))
+        })
+
+    def generate_orders_chunk(self, store_ids, user_ids, start_id, size, chunk_index):
+        # один кусок заказов с id start_id .. start_id + size - 1
+        rng = self._rng(2, chunk_index)
+        ids = np.arange(start_id, start_id + size, dtype=np.int64)
+
+        created_at = self._order_timestamps(rng, size)
+
+        return pa.table({
+            'id': ids,
+            'amount': np.round(rng.uniform(100, 10000, size=size), 2),
+            'user_id': self._sampler('user', np.asarray(user_ids, dtype=np.int64))(rng, size),
+            'store_id': self._sampler('store', np.asarray(store_ids, dtype=np.int64))(rng, size),
+            'status': pc.take(pa.array(self.statuses), rng.integers(0, len(self.statuses), size=size)),
+            'created_at': pa.array(created_at, type=pa.timestamp('ns'))
+        })
+
+    def write_orders_chunked(self, filepath, store_ids, user_ids, chunk_size=1_000_000, workers=1):
+        # заказы пишутся в parquet по кускам, каждый кусок - отдельный row group
+        # workers > 1 - куски генерируются в процессах, результат тот же при том же seed
+        store_ids = np.asarray(store_ids, dtype=np.int64)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        chunks = [
+            (index, start, min(chunk_size, self.num_orders - start))
+            for index, start in enumerate(range(0, self.num_orders, chunk_size))
+        ]
+
+        writer = None
+        try:
+            for table in self._iter_order_chunks(chunks, store_ids, user_ids, workers):
+                if writer is None:
+                    writer = pq.ParquetWriter(filepath, table.schema)
+                writer.write_table(table, row_group_size=chunk_size)
+        finally:
+            if writer is not None:
+                writer.close()
+        return filepath
+
+    def _iter_order_chunks(self, chunks, store_ids, user_ids, workers):
+        if workers <= 1:
+            for index, start, size in chunks:
+                yield self.generate_orders_chunk(store_ids, user_ids, start + 1, size, index)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_orders_worker,
+            initargs=(self, store_ids, user_ids)
+        ) as pool:
+            # окно задач ограничено, чтобы готовые куски не копились в памяти
+            window = 2 * workers
+            pending = []
+            for index, start, size in chunks:
+                pending.append(pool.submit(_orders_chunk, start + 1, size, index))
+                if len(pending) >= window:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def generate_all_fast(self, output_dir='../data/input', chunk_size=1_000_000, workers=1):
+        # векторная генерация всех файлов, заказы - по кускам
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        stores = self.generate_stores_fast()
+        pq.write_table(stores, output_dir / 'stores.parquet')
+
+        users = self.generate_users_fast()
+        pq.write_table(users, output_dir / 'users.parquet')
+
+        self.write_orders_chunked(
+            output_dir / 'orders.parquet',
+            store_ids=stores.column('id').to_numpy(),
+            user_ids=users.column('id').to_numpy(),
+            chunk_size=chunk_size,
+            workers=workers
+        )
+        return output_dir
+
     def save_to_parquet(self, df, filename, output_dir='../data/input'):
     #    сохранение в parquet
         filepath = f"{output_dir}/{filename}"
@@ -122,12 +345,63 @@ class DataGenerator:
         return stores_df, users_df, orders_df
 
 
-if __name__ == '__main__':
-    generator = DataGenerator(
-        num_stores=10,    
-        num_users=10000,   
-        num_orders=20000    
+def _prefixed(prefix, numbers):
+    # строки вида prefix + число без цикла по строкам
+    return pc.binary_join_element_wise(prefix, pc.cast(pa.array(numbers), pa.string()), '')
+
+
+def _timestamps(years, months, days, hours, minutes):
+    # datetime64 из массивов компонент: месяцы от эпохи -> дни -> минуты
+    month_index = (np.asarray(years) - 1970) * 12 + np.asarray(months) - 1
+    dates = month_index.astype('datetime64[M]').astype('datetime64[D]') + (np.asarray(days) - 1)
+    minutes = dates.astype('datetime64[m]') + np.asarray(hours) * 60 + np.asarray(minutes)
+    return minutes.astype('datetime64[ns]')
+
+
+def _init_orders_worker(generator, store_ids, user_ids):
+    # id магазинов и пользователей передаются в процесс один раз, а не в каждую задачу
+    _worker['generator'] = generator
+    _worker['store_ids'] = store_ids
+    _worker['user_ids'] = user_ids
+
+
+def _orders_chunk(start_id, size, chunk_index):
+    return _worker['generator'].generate_orders_chunk(
+        _worker['store_ids'], _worker['user_ids'], start_id, size, chunk_index
+    )
+
+
+def main(argv=None, output_dir='../data/input'):
+    # output_dir - каталог по умолчанию: из src/ это ../data/input, из main.py generate - ./data/input
+    from config import load_config
+
+    parser = argparse.ArgumentParser(description='Генерация тестовых данных')
+    parser.add_argument('--config', default=None, help='config.yaml, секция data_generator')
+    parser.add_argument('--stores', type=int, default=None)
+    parser.add_argument('--users', type=int, default=None)
+    parser.add_argument('--orders', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000, help='заказов в одном row group')
+    parser.add_argument('--workers', type=int, default=1, help='процессов для генерации заказов')
+    parser.add_argument('--output-dir', default=output_dir)
+    parser.add_argument('--slow', action='store_true', help='старый построчный генератор')
+    args = parser.parse_args(argv)
+
+    # аргументы командной строки важнее значений из конфига
+    generator = DataGenerator.from_config(
+        load_config(args.config),
+        num_stores=args.stores,
+        num_users=args.users,
+        num_orders=args.orders,
+        seed=args.seed
     )
     
     # Генерируем данные
-    generator.generate_all()
+    if args.slow:
+        generator.generate_all(args.output_dir)
+    else:
+        generator.generate_all_fast(args.output_dir, chunk_size=args.chunk_size, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
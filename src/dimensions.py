@@ -0,0 +1,175 @@
+# справочники в виде массивов: вместо merge заказов с магазинами
+
+import numpy as np
+import pandas as pd
+
+
+RESULT_COLUMNS = ['city', 'store_name', 'target_amount']
+
+
+class StoreDimension:
+    # справочник магазинов: store_id -> плотный код группы (город, название)
+    # группа = пара (city, name), как в groupby(['city', 'name'])
+
+    def __init__(self, stores_df):
+        ids = stores_df['id'].to_numpy(dtype=np.int64)
+
+        pairs = pd.MultiIndex.from_arrays([stores_df['city'], stores_df['name']])
+        group_codes, groups = pd.factorize(pairs, sort=True)
+
+        # категориальные массивы по кодам групп
+        self.cities = pd.Categorical(groups.get_level_values(0))
+        self.names = pd.Categorical(groups.get_level_values(1))
+        self.num_groups = len(groups)
+
+        if len(ids) and ids.min() >= 0 and ids.max() <= 4 * len(ids) + 1024:
+            # id плотные - прямая таблица id -> код
+            self._lookup = np.full(ids.max() + 1, -1, dtype=np.int64)
+            self._lookup[ids] = group_codes
+            self._sorted_ids = None
+        else:
+            # разреженные id - бинарный поиск по отсортированному массиву
+            order = np.argsort(ids, kind='stable')
+            self._lookup = None
+            self._sorted_ids = ids[order]
+            self._sorted_codes = group_codes[order]
+
+    def codes(self, store_ids):
+        # коды групп для массива store_id, -1 если магазина нет в справочнике
+        store_ids = _as_int(store_ids)
+
+        if self._lookup is not None:
+            inside = (store_ids >= 0) & (store_ids < len(self._lookup))
+            result = np.full(len(store_ids), -1, dtype=np.int64)
+            result[inside] = self._lookup[store_ids[inside]]
+            return result
+
+        if not len(self._sorted_ids):
+            return np.full(len(store_ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_ids, store_ids)
+        pos = np.minimum(pos, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[pos] == store_ids
+        return np.where(found, self._sorted_codes[pos], -1)
+
+    def aggregate(self, codes, amounts):
+        # суммы и количество строк по группам, строки с кодом -1 отбрасываются (inner join)
+        codes = np.asarray(codes)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        known = codes >= 0
+
+        totals = np.bincount(codes[known], weights=amounts[known], minlength=self.num_groups)
+        counts = np.bincount(codes[known], minlength=self.num_groups)
+        return totals, counts
+
+    def top_n(self, totals, counts, n=3):
+        # топ-N групп в каждом городе, города по алфавиту, внутри - по убыванию суммы
+        present = np.flatnonzero(np.asarray(counts) > 0)
+        selected = self.top_codes(present, np.asarray(totals)[present], n=n)
+
+        # город и название остаются категориями - в parquet уходят словарем
+        result = pd.DataFrame({
+            'city': self.cities[selected].remove_unused_categories(),
+            'store_name': self.names[selected].remove_unused_categories(),
+            'target_amount': np.asarray(totals, dtype=np.float64)[selected],
+        }, columns=RESULT_COLUMNS)
+        return result.reset_index(drop=True)
+
+    def top_codes(self, codes, amounts, n=3):
+        # коды топ-N групп каждого города среди codes (по возрастанию) в порядке результата
+        # коды упорядочены по (город, название), поэтому группы города идут подряд;
+        # отбор частичный: в городах больше N групп argpartition оставляет кандидатов
+        # не меньше N-й суммы, полностью сортируются только они
+        codes = np.asarray(codes)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if n <= 0 or not len(codes):
+            return codes[:0]
+        city_codes = self.cities.codes[codes]
+
+        starts = np.flatnonzero(np.r_[True, city_codes[1:] != city_codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)]
+        large = ends - starts > n
+        keep = np.ones(len(codes), dtype=bool)
+        for start, end in zip(starts[large], ends[large]):
+            segment = amounts[start:end]
+            threshold = np.partition(segment, len(segment) - n)[len(segment) - n]
+            # равные N-й сумме остаются кандидатами, между ними решает название
+            keep[start:end] = segment >= threshold
+        candidates = np.flatnonzero(keep)
+
+        # lexsort стабильный: при равных суммах порядок по названию магазина
+        order = np.lexsort((-amounts[candidates], city_codes[candidates]))
+        city_sorted = city_codes[candidates][order]
+        rank = np.arange(len(order)) - np.searchsorted(city_sorted, city_sorted)
+        return codes[candidates[order[rank < n]]]
+
+
+class EligibleUsers:
+    # множество подходящих user_id для фильтра заказов одним gather'ом
+    # id из DataGenerator плотные 1..N - булева маска по id,
+    # для разреженных id - хеш-поиск pandas по массиву id
+    # (searchsorted со случайными запросами на 10M заказов в разы медленнее)
+
+    def __init__(self, user_ids):
+        ids = np.asarray(user_ids, dtype=np.int64)
+
+        if len(ids) and ids.min() >= 0 and ids.max() <= 8 * len(ids) + 4096:
+            self._mask = np.zeros(ids.max() + 1, dtype=bool)
+            self._mask[ids] = True
+            self._ids = None
+            self.size = int(self._mask.sum())
+        else:
+            # np.unique сортирует, а для хеш-поиска порядок не нужен
+            self._mask = None
+            self._ids = pd.unique(ids)
+            self.size = len(self._ids)
+
+    @classmethod
+    def from_users(cls, users_df, year):
+        # пользователи, зарегистрированные в указанном году
+        return cls(users_df.loc[users_df['created_at'].dt.year == year, 'id'])
+
+    @classmethod
+    def from_backing(cls, backing, dense):
+        # обратная сборка из массива (например из shared memory) без копирования
+        eligible = cls.__new__(cls)
+        eligible._mask = backing if dense else None
+        eligible._ids = None if dense else backing
+        eligible.size = int(backing.sum()) if dense else len(backing)
+        return eligible
+
+    @property
+    def dense(self):
+        return self._mask is not None
+
+    @property
+    def backing(self):
+        # массив, на котором держится индекс: маска или id
+        return self._mask if self.dense else self._ids
+
+    def __len__(self):
+        return self.size
+
+    def contains(self, user_ids):
+        # булева маска: подходит ли каждый user_id
+        user_ids = _as_int(user_ids)
+        if not len(user_ids):
+            return np.zeros(0, dtype=bool)
+
+        if self._mask is not None:
+            if user_ids.min() >= 0 and user_ids.max() < len(self._mask):
+                # обычный случай - один gather без копий
+                return self._mask[user_ids]
+            inside = (user_ids >= 0) & (user_ids < len(self._mask))
+            result = np.zeros(len(user_ids), dtype=bool)
+            result[inside] = self._mask[user_ids[inside]]
+            return result
+
+        return pd.Series(user_ids, copy=False).isin(self._ids).to_numpy()
+
+
+def _as_int(values):
+    # int32/int16 id индексируют массивы как есть, без копии в int64
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iu':
+        values = values.astype(np.int64)
+    return values
@@ -0,0 +1,53 @@
+# компактные типы колонок: строки с малым числом значений - словарь (category),
+# id - int32 если влезают, суммы - float32 только если это без потерь
+
+import numpy as np
+
+
+# строковые колонки, которые pyarrow читает сразу словарем (read_dictionary)
+DICTIONARY_COLUMNS = {
+    'stores': ['name', 'city'],
+    'users': [],
+    'orders': ['status'],
+}
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def read_dictionary(table, columns=None):
+    # аргумент read_dictionary для pd.read_parquet с учетом читаемых колонок
+    wanted = [column for column in DICTIONARY_COLUMNS[table] if columns is None or column in columns]
+    return wanted or None
+
+
+def downcast_int(values):
+    # int64 -> int32, если все значения влезают
+    # меньше int32 не опускаемся: id участвуют в арифметике (max + 1 и т.п.)
+    if values.dtype != np.int64 or not len(values):
+        return values
+    if values.min() >= INT32_MIN and values.max() < INT32_MAX:
+        return values.astype(np.int32)
+    return values
+
+
+def downcast_float(values):
+    # float64 -> float32 только если обратное преобразование дает те же числа
+    if values.dtype != np.float64 or not len(values):
+        return values
+    compact = values.astype(np.float32)
+    if np.array_equal(compact.astype(np.float64), values, equal_nan=True):
+        return compact
+    return values
+
+
+def optimize_dtypes(df):
+    # сжимает числовые колонки на месте, строки уже прочитаны словарем
+    for column in df.columns:
+        values = df[column].to_numpy() if df[column].dtype.kind in 'if' else None
+        if values is None:
+            continue
+        compact = downcast_int(values) if values.dtype.kind == 'i' else downcast_float(values)
+        if compact is not values:
+            df[column] = compact
+    return df
@@ -0,0 +1,169 @@
+# движки transform: одна и та же логика
+# (пользователи года -> их заказы -> магазины -> суммы по (город, магазин) -> топ-N в городе)
+# pandas - eager, на справочниках-массивах; arrow - план Acero, многопоточный и потоковый:
+# заказы можно отдать путем к parquet, тогда они сканируются батчами и в память целиком не грузятся
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import acero
+
+from dimensions import RESULT_COLUMNS, EligibleUsers, StoreDimension
+
+
+class PandasEngine:
+    # исходный путь: маска пользователей, коды магазинов, bincount
+    name = 'pandas'
+    scans_files = False
+
+    def transform(self, stores_df, users_df, orders_df, year, n, profiler):
+        # возвращает (результат, статистика для metrics)
+        with profiler.stage('filter_users', rows=len(users_df)):
+            users_year = users_df[users_df['created_at'].dt.year == year]
+
+        with profiler.stage('filter_orders', rows=len(orders_df)):
+            eligible = EligibleUsers(users_year['id'])
+            orders_filtered = orders_df[eligible.contains(orders_df['user_id'])]
+
+        # вместо merge - коды магазинов через справочник-массив
+        with profiler.stage('merge', rows=len(orders_filtered)):
+            dimension = StoreDimension(stores_df)
+            codes = dimension.codes(orders_filtered['store_id'])
+
+        # суммы по (город, магазин) через bincount по кодам
+        with profiler.stage('groupby', rows=len(orders_filtered)):
+            totals, counts = dimension.aggregate(codes, orders_filtered['amount'])
+
+        with profiler.stage('top_n', rows=dimension.num_groups):
+            result = dimension.top_n(totals, counts, n=n)
+
+        present = counts > 0
+        stats = {
+            'users_year': len(users_year),
+            'orders_filtered': len(orders_filtered),
+            'orders_joined': int(counts.sum()),
+            'groups': pd.DataFrame({
+                'city': np.asarray(dimension.cities)[present],
+                'name': np.asarray(dimension.names)[present],
+                'total': totals[present],
+                'count': counts[present],
+            }),
+        }
+        return result, stats
+
+
+class ArrowEngine:
+    # pyarrow Acero: фильтр, semi join по пользователям, join с магазинами и hash group by
+    # в одном плане, по всем ядрам
+    name = 'arrow'
+    scans_files = True
+
+    def transform(self, stores_df, users_df, orders_df, year, n, profiler):
+        # orders_df - DataFrame / pa.Table или путь к parquet (сканируется потоково)
+        with profiler.stage('filter_users', rows=len(users_df)):
+            users = _source(users_df, ['id', 'created_at'], casts={'id': pa.int64()})
+            users = acero.Declaration.from_sequence([
+                users,
+                acero.Declaration('filter', acero.FilterNodeOptions(_year_expression('created_at', year))),
+                acero.Declaration('project', acero.ProjectNodeOptions([pc.field('id')], ['id'])),
+            ])
+            users_year = users.to_table(use_threads=True)
+
+        with profiler.stage('acero_aggregate') as stage:
+            orders = _source(orders_df, ['user_id', 'store_id', 'amount'],
+                             casts={'user_id': pa.int64(), 'store_id': pa.int64(), 'amount': pa.float64()})
+            eligible = acero.Declaration('table_source', acero.TableSourceNodeOptions(users_year))
+            stores = acero.Declaration('table_source', acero.TableSourceNodeOptions(_stores_table(stores_df)))
+
+            # left outer: заказы без магазина попадают в группу с пустым городом,
+            # так общее число отфильтрованных заказов считается в том же проходе
+            plan = acero.Declaration('hashjoin', acero.HashJoinNodeOptions(
+                'left semi', ['user_id'], ['id']), inputs=[orders, eligible])
+            plan = acero.Declaration('hashjoin', acero.HashJoinNodeOptions(
+                'left outer', ['store_id'], ['id'],
+                left_output=['amount'], right_output=['city', 'name']), inputs=[plan, stores])
+            plan = acero.Declaration('aggregate', acero.AggregateNodeOptions([
+                ('amount', 'hash_sum', None, 'total'),
+                ('amount', 'hash_count', pc.CountOptions(mode='all'), 'count'),
+            ], keys=['city', 'name']), inputs=[plan])
+            groups = plan.to_table(use_threads=True)
+            stage['rows'] = int(pc.sum(groups['count']).as_py() or 0)
+
+        with profiler.stage('top_n', rows=groups.num_rows):
+            known = groups.filter(pc.is_valid(groups['city']))
+            groups = known.select(['city', 'name', 'total', 'count']).to_pandas()
+            result = top_n_from_groups(groups, n)
+
+        stats = {
+            'users_year': users_year.num_rows,
+            'orders_filtered': stage['rows'],
+            'orders_joined': int(pc.sum(known['count']).as_py() or 0),
+            'groups': groups,
+        }
+        return result, stats
+
+
+ENGINES = {engine.name: engine for engine in (PandasEngine, ArrowEngine)}
+
+
+def get_engine(name):
+    # движок по имени из конфига (etl.engine)
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный движок: {name}, доступны: {sorted(ENGINES)}") from None
+
+
+def _source(data, columns, casts):
+    # узел-источник Acero: таблица в памяти или потоковое сканирование parquet
+    if isinstance(data, (str, Path)):
+        dataset = ds.dataset(data, format='parquet')
+        source = acero.Declaration('scan', acero.ScanNodeOptions(dataset, columns=columns))
+    else:
+        if isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data[columns], preserve_index=False)
+        source = acero.Declaration('table_source', acero.TableSourceNodeOptions(data.select(columns)))
+
+    # ключи join приводятся к одному типу (после optimize_dtypes id могут быть int32)
+    expressions = [pc.field(column).cast(casts[column]) if column in casts else pc.field(column)
+                   for column in columns]
+    return acero.Declaration.from_sequence([
+        source, acero.Declaration('project', acero.ProjectNodeOptions(expressions, columns))
+    ])
+
+
+def _stores_table(stores_df):
+    # город и название - обычными строками: словари в полях join Acero не поддерживает
+    return pa.table({
+        'id': pa.array(np.asarray(stores_df['id'], dtype=np.int64)),
+        'city': pa.array(np.asarray(stores_df['city'], dtype=object), type=pa.string()),
+        'name': pa.array(np.asarray(stores_df['name'], dtype=object), type=pa.string()),
+    })
+
+
+def _year_expression(column, year):
+    # [year-01-01, year+1-01-01), как _year_filter в etl_process
+    start = pa.scalar(pd.Timestamp(year, 1, 1).to_pydatetime(), pa.timestamp('ns'))
+    end = pa.scalar(pd.Timestamp(year + 1, 1, 1).to_pydatetime(), pa.timestamp('ns'))
+    return (pc.field(column) >= start) & (pc.field(column) < end)
+
+
+def top_n_from_groups(groups, n):
+    # топ-N по таблице сумм групп (city, name, total), в том же виде что StoreDimension.top_n:
+    # города по алфавиту, внутри по убыванию суммы, при равенстве - по названию
+    # групп мало (магазины), поэтому это уже pandas
+    frame = groups[['city', 'name', 'total']]
+    frame = frame.sort_values(['city', 'name'], kind='stable')
+    frame = frame.sort_values(['city', 'total'], ascending=[True, False], kind='stable')
+    frame = frame[frame.groupby('city', sort=False).cumcount() < n]
+
+    result = pd.DataFrame({
+        'city': pd.Categorical(frame['city'].to_numpy()),
+        'store_name': pd.Categorical(frame['name'].to_numpy()),
+        'target_amount': frame['total'].to_numpy(dtype=np.float64),
+    }, columns=RESULT_COLUMNS)
+    return result
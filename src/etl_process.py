@@ -1,23 +1,85 @@
-# расчет топ-3 магазинов по городам
+# расчет топ-N (по умолчанию топ-3) магазинов по городам
 
 import pandas as pd
+import pyarrow.parquet as pq
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import json
 import logging
 
+from config import LOG_FORMAT, setup_logging
+from dimensions import EligibleUsers, StoreDimension
+from dtypes import optimize_dtypes, read_dictionary
+from engines import get_engine
+from profiling import StageProfiler, cprofile_to
+from validation import DataValidator
+from writers import CsvFileSink, ParquetFileSink, ResultWriter, parquet_options
+
+# модули отдельных режимов (aggregation, incremental, parallel, reports, partitioned)
+# импортируются в методах этих режимов
+
+
+# колонки, которые реально нужны для transform
+STORES_COLUMNS = ['id', 'name', 'city']
+USERS_COLUMNS = ['id', 'created_at']
+ORDERS_COLUMNS = ['user_id', 'store_id', 'amount']
+
+# имя основного топ-N среди отчетов общего прохода
+MAIN_REPORT = '_result'
+
 
 class StoreAnalyticsETL:
     # класс для анализа магазинов
 
     
-    def __init__(self, input_dir='../data/input', output_dir='../data/output', log_dir='../logs'):
+    def __init__(self, input_dir='../data/input', output_dir='../data/output', log_dir='../logs',
+                 mode='full', batch_size=1_000_000, workers=None, profile=False, trace_memory=False,
+                 validate=True, quarantine=False, engine='pandas', target_year=2025, top_n=3,
+                 reports=None, output=None, external=None):
         """
         Args:
             input_dir: директория с входными данными
             output_dir: директория для результатов
             log_dir: директория для логов
+            mode: 'full' - читаем файлы целиком, 'streaming' - заказы по батчам,
+                'parallel' - row group'ы заказов обрабатываются в пуле процессов,
+                'incremental' - только новые заказы, суммы хранятся в output_dir/etl_state.json,
+                'external' - агрегация через spill партиций заказов на диск в пределах бюджета памяти
+            batch_size: размер батча заказов в режиме streaming
+            workers: число процессов в режиме parallel (по умолчанию - все ядра)
+            profile: сохранить cProfile всего run() в log_dir/profile_*.prof
+            trace_memory: замерять память этапов через tracemalloc (медленнее)
+            validate: проверять данные правилами моделей между extract и transform
+            quarantine: убирать плохие строки из обработки в output_dir/quarantine/*.parquet
+            engine: движок transform - 'pandas' или 'arrow' (Acero, многопоточный);
+                в режиме streaming arrow сканирует orders.parquet сам, не загружая целиком
+            target_year: год регистрации пользователей (etl.target_year в конфиге)
+            top_n: сколько магазинов брать в каждом городе (etl.top_n)
+            reports: дополнительные отчеты (ReportSpec или dict из etl.reports) в output_dir/reports/*.parquet;
+                в режимах full и streaming считаются вместе с основным топ-N за один проход по заказам
+            output: настройки записи результата (etl.output), например {'parquet': {'compression': 'snappy'}};
+                {'partitioned': {'enabled': True}} - еще и output_dir/result_partitioned/city=/run_date=
+            external: настройки режима external (etl.external): memory_budget_mb, spill_dir, max_partitions
         """
+        self.mode = mode
+        self.batch_size = batch_size
+        self.workers = workers
+        self.profile = profile
+        self.profiler = StageProfiler(trace_memory=trace_memory)
+        self.engine = get_engine(engine)
+        self.aggregates = None
+        self.target_year = target_year
+        self.top_n = top_n
+        self.output_config = output or {}
+        self.parquet_options = parquet_options(output)
+        self.external = external or {}
+        self.reports = []
+        if reports:
+            from reports import ReportSpec
+            self.reports = [spec if isinstance(spec, ReportSpec) else ReportSpec.from_dict(spec)
+                            for spec in reports]
+        self.validator = DataValidator(quarantine=quarantine) if validate else None
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.log_dir = Path(log_dir)
@@ -26,7 +88,8 @@ class StoreAnalyticsETL:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.log_dir.mkdir(parents=True, exist_ok=True)
         
-        self._setup_logging()
+        self.logger = logging.getLogger(__name__)
+        self.log_file = None
         self.metrics = {
             'start_time': None,
             'end_time': None,
@@ -35,20 +98,22 @@ class StoreAnalyticsETL:
             'result_records': 0
         }
     
-    def _setup_logging(self):
-        log_file = self.log_dir / f"etl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
-        
-        self.logger = logging.getLogger(__name__)
-        self.logger.info(f"Лог файл создан: {log_file}")
+    @contextmanager
+    def log_to_file(self):
+        # файл лога на время запуска; не в __init__, чтобы объекты для validate / transform
+        # (s3 режим, сервис, бенчмарки, тесты) не создавали файлы и не копили handler'ы
+        setup_logging()
+        self.log_file = self.log_dir / f"etl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        handler = logging.FileHandler(self.log_file, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root = logging.getLogger()
+        root.addHandler(handler)
+        self.logger.info(f"Лог файл создан: {self.log_file}")
+        try:
+            yield self.log_file
+        finally:
+            root.removeHandler(handler)
+            handler.close()
     
     def extract(self):
     # извлечение из parquet
@@ -58,17 +123,23 @@ class StoreAnalyticsETL:
         
         try:
             stores_path = self.input_dir / 'stores.parquet'
-            stores_df = pd.read_parquet(stores_path)
+            with self.profiler.stage('read_stores', nbytes=stores_path.stat().st_size) as stage:
+                stores_df = optimize_dtypes(pd.read_parquet(stores_path, read_dictionary=read_dictionary('stores')))
+                stage['rows'] = len(stores_df)
             self.logger.info(f"Загружено магазинов: {len(stores_df)}")
             self.metrics['records_processed']['stores'] = len(stores_df)
             
             users_path = self.input_dir / 'users.parquet'
-            users_df = pd.read_parquet(users_path)
+            with self.profiler.stage('read_users', nbytes=users_path.stat().st_size) as stage:
+                users_df = optimize_dtypes(pd.read_parquet(users_path, read_dictionary=read_dictionary('users')))
+                stage['rows'] = len(users_df)
             self.logger.info(f"Загружено пользователей: {len(users_df)}")
             self.metrics['records_processed']['users'] = len(users_df)
             
             orders_path = self.input_dir / 'orders.parquet'
-            orders_df = pd.read_parquet(orders_path)
+            with self.profiler.stage('read_orders', nbytes=orders_path.stat().st_size) as stage:
+                orders_df = optimize_dtypes(pd.read_parquet(orders_path, read_dictionary=read_dictionary('orders')))
+                stage['rows'] = len(orders_df)
             self.logger.info(f"Загружено заказов: {len(orders_df)}")
             self.metrics['records_processed']['orders'] = len(orders_df)
             
@@ -78,55 +149,265 @@ class StoreAnalyticsETL:
             self.logger.error(f"Ошибка при загрузке данных: {e}")
             raise
     
+    def extract_streaming(self, all_users=False):
+        # извлечение только нужных колонок, заказы читаем по батчам
+        # фильтр по году регистрации уходит прямо в parquet reader (all_users - без него, для отчетов)
+
+        self.metrics['start_time'] = datetime.now()
+        self.logger.info("\nЗагрузка данных (streaming)")
+
+        try:
+            stores_df, users_df = self.extract_dimensions(all_users)
+
+            orders_path = self.input_dir / 'orders.parquet'
+            orders_file = pq.ParquetFile(orders_path)
+            self.logger.info(f"Заказов в файле: {orders_file.metadata.num_rows}, "
+                             f"row groups: {orders_file.num_row_groups}")
+            self.metrics['records_processed']['orders'] = orders_file.metadata.num_rows
+
+            return stores_df, users_df, self._iter_orders(orders_file)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при загрузке данных: {e}")
+            raise
+
+    def extract_dimensions(self, all_users=False):
+        # магазины и пользователи target_year (all_users - все), только нужные колонки
+
+        stores_path = self.input_dir / 'stores.parquet'
+        with self.profiler.stage('read_stores', nbytes=stores_path.stat().st_size) as stage:
+            stores_df = pd.read_parquet(
+                stores_path,
+                columns=STORES_COLUMNS,
+                read_dictionary=read_dictionary('stores', STORES_COLUMNS)
+            )
+            stage['rows'] = len(stores_df)
+        self.logger.info(f"Загружено магазинов: {len(stores_df)}")
+        self.metrics['records_processed']['stores'] = len(stores_df)
+
+        users_path = self.input_dir / 'users.parquet'
+        with self.profiler.stage('read_users', nbytes=users_path.stat().st_size) as stage:
+            users_df = pd.read_parquet(
+                users_path,
+                columns=USERS_COLUMNS,
+                filters=None if all_users else self._year_filter('created_at', self.target_year)
+            )
+            stage['rows'] = len(users_df)
+        self.logger.info(f"Загружено пользователей{'' if all_users else f' {self.target_year} года'}: "
+                         f"{len(users_df)}")
+        self.metrics['records_processed']['users'] = pq.ParquetFile(users_path).metadata.num_rows
+
+        return stores_df, users_df
+
+    @staticmethod
+    def _year_filter(column, year):
+        # фильтр [year-01-01, year+1-01-01) для pyarrow
+        return [
+            (column, '>=', pd.Timestamp(year, 1, 1)),
+            (column, '<', pd.Timestamp(year + 1, 1, 1)),
+        ]
+
+    def _iter_orders(self, orders_file):
+        # отдаем заказы батчами, в памяти одновременно только один батч
+        for batch in orders_file.iter_batches(batch_size=self.batch_size, columns=ORDERS_COLUMNS):
+            batch = batch.to_pandas()
+            if self.validator is not None:
+                batch = self.validator.validate_orders(batch)
+            yield batch
+
+    def validate(self, stores_df, users_df, orders_df=None, users_complete=True):
+        # проверки из models.py целыми колонками, между extract и transform
+        # users_complete=False - пользователи уже отфильтрованы по году,
+        # тогда ссылку заказ -> пользователь не проверяем
+        if self.validator is None:
+            return stores_df, users_df, orders_df
+
+        rows = len(stores_df) + len(users_df) + (len(orders_df) if orders_df is not None else 0)
+        with self.profiler.stage('validate', rows=rows):
+            stores_df = self.validator.validate('stores', stores_df)
+            users_df = self.validator.validate('users', users_df)
+            self.validator.set_references(stores_df, users_df if users_complete and orders_df is not None else None)
+            if orders_df is not None:
+                orders_df = self.validator.validate_orders(orders_df)
+        return stores_df, users_df, orders_df
+
+    def _log_validation(self):
+        report = self.validator.report
+        if report.ok:
+            self.logger.info("Проверка данных: нарушений нет")
+            return
+        for rule, count in report.to_dict()['violations'].items():
+            self.logger.warning(f"Проверка данных: {rule} - {count} строк, "
+                                f"примеры id: {report.samples.get(rule, [])}")
+
+    def transform_streaming(self, stores_df, users_df, orders_batches):
+        # то же что transform, но заказы приходят батчами и сразу агрегируются по store_id
+        # merged (заказы x магазины) не строится вообще
+
+        self.logger.info("\nОбработка данных (streaming)...")
+
+        from aggregation import StoreAggregator
+
+        try:
+            with self.profiler.stage('filter_users', rows=len(users_df)):
+                eligible = EligibleUsers.from_users(users_df, self.target_year)
+            self.metrics['records_processed'][f'users_{self.target_year}'] = len(eligible)
+
+            # чтение, фильтр и агрегация идут вместе, батч за батчем
+            aggregator = StoreAggregator()
+            with self.profiler.stage('stream_orders') as stage:
+                stage['rows'] = 0
+                for batch in orders_batches:
+                    stage['rows'] += len(batch)
+                    aggregator.update(batch[eligible.contains(batch['user_id'])])
+            self.logger.info(f"Найдено заказов: {aggregator.rows}")
+            self.metrics['records_processed']['orders_filtered'] = aggregator.rows
+
+            with self.profiler.stage('top_n', rows=len(aggregator.sums)):
+                result = aggregator.top_n(stores_df, n=self.top_n)
+            self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
+            self._log_city_stats(result)
+
+            self.metrics['result_records'] = len(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке данных: {e}")
+            raise
+
+    def transform_parallel(self, stores_df, users_df):
+        # фильтр и частичные суммы по row group'ам в процессах, слияние и топ-N здесь
+
+        self.logger.info("\nОбработка данных (parallel)...")
+        from parallel import aggregate_parallel
+
+        try:
+            with self.profiler.stage('filter_users', rows=len(users_df)):
+                eligible = EligibleUsers.from_users(users_df, self.target_year)
+            self.metrics['records_processed'][f'users_{self.target_year}'] = len(eligible)
+            dimension = StoreDimension(stores_df)
+
+            orders_path = self.input_dir / 'orders.parquet'
+            with self.profiler.stage('parallel_aggregate', nbytes=orders_path.stat().st_size) as stage:
+                totals, counts, rows = aggregate_parallel(
+                    orders_path, eligible, dimension, workers=self.workers, validator=self.validator
+                )
+                stage['rows'] = self.metrics['records_processed'].get('orders')
+            self.logger.info(f"Найдено заказов: {rows}")
+            self.metrics['records_processed']['orders_filtered'] = rows
+
+            with self.profiler.stage('top_n', rows=dimension.num_groups):
+                result = dimension.top_n(totals, counts, n=self.top_n)
+            self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
+            self._log_city_stats(result)
+
+            self.metrics['result_records'] = len(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке данных: {e}")
+            raise
+
+    def transform_incremental(self, stores_df, users_df):
+        # досчитываем сохраненные суммы новыми заказами и новыми пользователями
+
+        self.logger.info("\nОбработка данных (incremental)...")
+        from incremental import IncrementalAggregator, STATE_FILE
+
+        try:
+            users_year = users_df[users_df['created_at'].dt.year == self.target_year]
+            self.metrics['records_processed'][f'users_{self.target_year}'] = len(users_year)
+
+            state = IncrementalAggregator(self.output_dir / STATE_FILE, target_year=self.target_year)
+            self.logger.info(f"Watermark'и: заказы > {state.orders_watermark}, "
+                             f"пользователи > {state.users_watermark}")
+            with self.profiler.stage('incremental_update') as stage:
+                stats = state.update(users_year, self.input_dir / 'orders.parquet', validator=self.validator)
+                stage['rows'] = stats['orders_new'] + stats['orders_backfill']
+            self.logger.info(f"Новых заказов: {stats['orders_new']}, "
+                             f"дозагружено для новых пользователей: {stats['orders_backfill']}")
+            self.metrics['records_processed'].update(stats)
+            self.metrics['records_processed']['orders_filtered'] = state.aggregator.rows
+
+            with self.profiler.stage('top_n', rows=len(state.aggregator.sums)):
+                result = state.top_n(stores_df, n=self.top_n)
+            with self.profiler.stage('save_state'):
+                state.save()
+            self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
+            self._log_city_stats(result)
+
+            self.metrics['result_records'] = len(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке данных: {e}")
+            raise
+
+    def transform_external(self, stores_df, users_df, orders_batches):
+        # как transform_streaming, но суммы групп не держатся в памяти целиком:
+        # заказы раскладываются по партициям на диск, партиции агрегируются по одной
+
+        self.logger.info("\nОбработка данных (external)...")
+        from external import ExternalAggregator, plan_partitions
+
+        try:
+            with self.profiler.stage('filter_users', rows=len(users_df)):
+                eligible = EligibleUsers.from_users(users_df, self.target_year)
+            self.metrics['records_processed'][f'users_{self.target_year}'] = len(eligible)
+            dimension = StoreDimension(stores_df)
+
+            memory_budget = int(self.external.get('memory_budget_mb', 256) * 1024 * 1024)
+            partitions = plan_partitions(self.metrics['records_processed'].get('orders', 0), memory_budget,
+                                         self.external.get('max_partitions', 256))
+            self.logger.info(f"Партиций: {partitions}, бюджет памяти: {memory_budget // 2**20} МБ")
+
+            with ExternalAggregator(dimension, eligible, memory_budget, self.external.get('spill_dir'),
+                                    partitions) as aggregator:
+                with self.profiler.stage('spill_orders') as stage:
+                    stage['rows'] = 0
+                    for batch in orders_batches:
+                        stage['rows'] += len(batch)
+                        aggregator.update(batch)
+                with self.profiler.stage('aggregate_partitions', rows=aggregator.stats['spilled_rows']):
+                    result = aggregator.top_n(n=self.top_n)
+            self.logger.info(f"Найдено заказов: {aggregator.rows}, spill: {aggregator.stats}")
+            self.metrics['records_processed']['orders_filtered'] = aggregator.rows
+            self.metrics['external'] = aggregator.stats
+            self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
+            self._log_city_stats(result)
+
+            self.metrics['result_records'] = len(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке данных: {e}")
+            raise
+
     def transform(self, stores_df, users_df, orders_df):
-        # Фильтруем пользователей: только те, кто зарегистрирован в 2025
-        # Джойним с магазинами чтобы получить город
+        # Фильтруем пользователей: только те, кто зарегистрирован в target_year
+        # Берем их заказы и сопоставляем с магазинами чтобы получить город
         # Группируем по городу и магазину, суммируем amount
-        # Для каждого города берем топ-3 магазина
+        # Для каждого города берем топ-N магазинов
+        # сами шаги выполняет движок (engines.py), orders_df у arrow может быть путем к parquet
 
-        self.logger.info("\nОбработка данных...")
+        self.logger.info(f"\nОбработка данных (движок {self.engine.name})...")
         
         try:
-            # Фильтруем пользователей 
-            users_2025 = users_df[users_df['created_at'].dt.year == 2025].copy()
-            self.logger.info(f"Пользователи 2025 года: {len(users_2025)} из {len(users_df)}")
-            self.metrics['records_processed']['users_2025'] = len(users_2025)
-            
-            # Фильтруем заказы 
-            self.logger.info("Заказы от пользователей 2025 года")
-            user_ids_2025 = set(users_2025['id'])
-            orders_filtered = orders_df[orders_df['user_id'].isin(user_ids_2025)].copy()
-            self.logger.info(f"Найдено заказов: {len(orders_filtered)} из {len(orders_df)}")
-            self.metrics['records_processed']['orders_filtered'] = len(orders_filtered)
-            
-            # джойним заказы с магазинами
-            self.logger.info("Объединение заказов с магазинами")
-            merged = orders_filtered.merge(
-                stores_df[['id', 'name', 'city']], 
-                left_on='store_id', 
-                right_on='id',
-                how='inner'
+            result, stats = self.engine.transform(
+                stores_df, users_df, orders_df, self.target_year, self.top_n, self.profiler
             )
-            self.logger.info(f"Объединено записей: {len(merged)}")
-            
-            # группируем по городу и магазину , считаем сумму
-            self.logger.info("Группировка по городу и магазину")
-            grouped = merged.groupby(['city', 'name'])['amount'].sum().reset_index()
-            grouped.columns = ['city', 'store_name', 'target_amount']
-            grouped = grouped.sort_values(['city', 'target_amount'], ascending=[True, False])
-            
-            # берем топ-3 магазина в каждом городе
-            self.logger.info("Шаг 5: Выбор топ-3 магазинов для каждого города...")
-            result = grouped.groupby('city').head(3).reset_index(drop=True)
+
+            self.logger.info(f"Пользователи {self.target_year} года: {stats['users_year']} из {len(users_df)}")
+            self.metrics['records_processed'][f'users_{self.target_year}'] = stats['users_year']
+            self.logger.info(f"Найдено заказов: {stats['orders_filtered']}")
+            self.metrics['records_processed']['orders_filtered'] = stats['orders_filtered']
+            self.logger.info(f"Объединено записей: {stats['orders_joined']}")
             self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
             
-            # Выводим статистику по городам
-            self.logger.info("\nСтатистика по городам:")
-            for city in result['city'].unique():
-                city_data = result[result['city'] == city]
-                self.logger.info(f"  {city}: {len(city_data)} магазинов, "
-                               f"общая сумма топ-3: {city_data['target_amount'].sum():,.2f} руб.")
+            self._log_city_stats(result)
             
+            # суммы всех групп - для кеша (другой top_n без пересчета)
+            self.aggregates = stats.get('groups')
             self.metrics['result_records'] = len(result)
             return result
             
@@ -134,20 +415,118 @@ class StoreAnalyticsETL:
             self.logger.error(f"Ошибка при обработке данных: {e}")
             raise
     
-    def load(self, result_df):
+    def transform_reports(self, stores_df, users_df, orders):
+        # основной топ-N - один из ReportSpec, он считается вместе с отчетами за один проход по заказам
+        # orders - DataFrame (уже проверен) или путь к parquet (батчи проверяются по ходу)
+        # users_df - все пользователи: у отчетов может быть свой год или его может не быть
+
+        self.logger.info(f"\nОбработка данных и отчеты {[spec.name for spec in self.reports]} (общий проход)...")
+        from reports import ReportRunner, ReportSpec
+
+        try:
+            main_spec = ReportSpec(MAIN_REPORT, group_by=('city', 'store'), measure='sum', top_n=self.top_n,
+                                   target_year=self.target_year, column='target_amount')
+            validator = None if isinstance(orders, pd.DataFrame) else self.validator
+            with self.profiler.stage('reports') as stage:
+                runner = ReportRunner(stores_df, users_df)
+                reports = runner.run([main_spec, *self.reports], orders, batch_size=self.batch_size,
+                                     validator=validator)
+                stage['rows'] = runner.rows
+            result = reports.pop(MAIN_REPORT)
+
+            users_year = int((users_df['created_at'].dt.year == self.target_year).sum())
+            self.metrics['records_processed'][f'users_{self.target_year}'] = users_year
+            self.logger.info(f"✓ Итоговых записей в результате: {len(result)}")
+            self._log_city_stats(result)
+            self.save_reports(reports)
+
+            self.metrics['result_records'] = len(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при обработке данных: {e}")
+            raise
+
+    def run_reports(self):
+        # отчеты отдельным проходом по orders.parquet - для режимов, где основной топ-N
+        # считается не по батчам заказов (parallel, incremental, external)
+        # пользователи читаются все: у отчетов может быть свой год или его может не быть
+        self.logger.info(f"\nОтчеты: {[spec.name for spec in self.reports]} (отдельный проход, режим {self.mode})")
+        from reports import ReportRunner
 
-        # сохранение в Parquet
+        try:
+            with self.profiler.stage('reports') as stage:
+                stores_df = pd.read_parquet(self.input_dir / 'stores.parquet', columns=STORES_COLUMNS)
+                users_df = pd.read_parquet(self.input_dir / 'users.parquet', columns=USERS_COLUMNS)
+                # те же проверки, что у основного прохода, но отдельным валидатором:
+                # нарушения уже посчитаны основным проходом и второй раз в отчет не попадают
+                validator = self.validator.fresh() if self.validator is not None else None
+                if validator is not None:
+                    stores_df = validator.validate('stores', stores_df)
+                    users_df = validator.validate('users', users_df)
+                    validator.set_references(stores_df, users_df)
+                runner = ReportRunner(stores_df, users_df)
+                reports = runner.run(self.reports, self.input_dir / 'orders.parquet', batch_size=self.batch_size,
+                                     validator=validator)
+                stage['rows'] = runner.rows
+            return self.save_reports(reports)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при расчете отчетов: {e}")
+            raise
+
+    def save_reports(self, reports):
+        # отчеты в output_dir/reports/<название>.parquet
+        reports_dir = self.output_dir / 'reports'
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        for name, report in reports.items():
+            report.to_parquet(reports_dir / f'{name}.parquet', index=False)
+            self.logger.info(f"Отчет {name}: {len(report)} строк")
+        self.metrics['reports'] = {name: len(report) for name, report in reports.items()}
+        return reports
+
+    def _log_city_stats(self, result):
+        # Выводим статистику по городам
+        self.logger.info("\nСтатистика по городам:")
+        stats = result.groupby('city', observed=True, sort=False)['target_amount'].agg(['size', 'sum'])
+        for city, (stores, total) in stats.iterrows():
+            self.logger.info(f"  {city}: {int(stores)} магазинов, "
+                           f"общая сумма топ-{self.top_n}: {total:,.2f} руб.")
+
+    def load(self, result_df, extra_sinks=()):
+
+        # сохранение в Parquet и csv: одно преобразование в Arrow, запись атомарная
+        # extra_sinks - дополнительные приемники (например S3ParquetSink в режиме s3)
         
         self.logger.info("\n[Сохранение результата")
         
         try:
             output_path = self.output_dir / 'result.parquet'
-            result_df.to_parquet(output_path, index=False, engine='pyarrow')
-            self.logger.info(f"Результат сохранен: {output_path}")
-            
-            # + в csv
             csv_path = self.output_dir / 'result.csv'
-            result_df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+            sinks = [
+                ParquetFileSink(output_path, **self.parquet_options),
+                CsvFileSink(csv_path),
+                *extra_sinks,
+            ]
+            partitioned = self.output_config.get('partitioned', {})
+            if partitioned.get('enabled'):
+                from partitioned import PartitionedParquetSink
+
+                run_date = (self.metrics['start_time'] or datetime.now()).date()
+                sinks.append(PartitionedParquetSink(
+                    self.output_dir / 'result_partitioned',
+                    run_date=run_date,
+                    sort_by=partitioned.get('sort_by', 'store_name'),
+                    bloom_filter=partitioned.get('bloom_filter', False),
+                    **self.parquet_options
+                ))
+            ResultWriter(sinks, profiler=self.profiler).write(result_df)
+            self.logger.info(f"Результат сохранен: {output_path}, {csv_path}")
+
+            # отбракованные строки, если включен карантин
+            if self.validator is not None:
+                for path in self.validator.write_quarantine(self.output_dir / 'quarantine'):
+                    self.logger.info(f"Карантин: {path}")
 
         except Exception as e:
             self.logger.error(f"Ошибка при сохранении результата: {e}")
@@ -165,8 +544,15 @@ class StoreAnalyticsETL:
             'end_time': self.metrics['end_time'].isoformat(),
             'duration_seconds': self.metrics['duration_seconds'],
             'records_processed': self.metrics['records_processed'],
-            'result_records': self.metrics['result_records']
+            'result_records': self.metrics['result_records'],
+            'stages': self.profiler.stages
         }
+        if 'reports' in self.metrics:
+            metrics_to_save['reports'] = self.metrics['reports']
+        if 'external' in self.metrics:
+            metrics_to_save['external'] = self.metrics['external']
+        if self.validator is not None:
+            metrics_to_save['validation'] = self.validator.report.to_dict()
         
         metrics_path = self.log_dir / f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(metrics_path, 'w', encoding='utf-8') as f:
@@ -177,10 +563,63 @@ class StoreAnalyticsETL:
     
     def run(self):
         # весь процесс (extract transform load)
+        profile_path = None
+        if self.profile:
+            profile_path = self.log_dir / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"
+
+        with self.log_to_file(), cprofile_to(profile_path):
+            result_df = self._run()
+
+        if profile_path is not None:
+            self.logger.info(f"cProfile сохранен: {profile_path}")
+        return result_df
+
+    def _run(self):
         try:
-            stores_df, users_df, orders_df = self.extract()
-            result_df = self.transform(stores_df, users_df, orders_df)
+            shared_scan = bool(self.reports) and self.mode in ('full', 'streaming')
+            if shared_scan and self.mode == 'streaming':
+                # основной топ-N и отчеты одним проходом по батчам заказов
+                stores_df, users_df, _ = self.extract_streaming(all_users=True)
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                result_df = self.transform_reports(stores_df, users_df, self.input_dir / 'orders.parquet')
+            elif shared_scan:
+                stores_df, users_df, orders_df = self.extract()
+                stores_df, users_df, orders_df = self.validate(stores_df, users_df, orders_df)
+                result_df = self.transform_reports(stores_df, users_df, orders_df)
+            elif self.mode == 'streaming' and self.engine.scans_files:
+                # план движка сам читает заказы потоково
+                stores_df, users_df, _ = self.extract_streaming()
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                if self.validator is not None:
+                    self.logger.warning(f"Заказы не проверяются: движок {self.engine.name} в streaming "
+                                        f"сканирует orders.parquet сам (проверка - в full или streaming с pandas)")
+                result_df = self.transform(stores_df, users_df, self.input_dir / 'orders.parquet')
+            elif self.mode == 'streaming':
+                stores_df, users_df, orders_batches = self.extract_streaming()
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                result_df = self.transform_streaming(stores_df, users_df, orders_batches)
+            elif self.mode == 'parallel':
+                # заказы читают сами воркеры, здесь только справочники
+                stores_df, users_df, _ = self.extract_streaming()
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                result_df = self.transform_parallel(stores_df, users_df)
+            elif self.mode == 'external':
+                stores_df, users_df, orders_batches = self.extract_streaming()
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                result_df = self.transform_external(stores_df, users_df, orders_batches)
+            elif self.mode == 'incremental':
+                stores_df, users_df, _ = self.extract_streaming()
+                stores_df, users_df, _ = self.validate(stores_df, users_df)
+                result_df = self.transform_incremental(stores_df, users_df)
+            else:
+                stores_df, users_df, orders_df = self.extract()
+                stores_df, users_df, orders_df = self.validate(stores_df, users_df, orders_df)
+                result_df = self.transform(stores_df, users_df, orders_df)
+            if self.validator is not None:
+                self._log_validation()
             self.load(result_df)
+            if self.reports and not shared_scan:
+                self.run_reports()
             self.save_metrics()
         
             return result_df
@@ -0,0 +1,156 @@
+# внешняя агрегация: суммы групп (город, магазин) при числе магазинов и заказов,
+# для которых и хеш-таблица groupby, и отфильтрованные заказы в память не помещаются
+#
+# 1. заказы идут батчами: фильтр по пользователям, store_id -> код группы (StoreDimension),
+#    строки раскладываются по партициям code % partitions и копятся в буферах;
+#    буферы больше половины бюджета памяти сбрасываются в Arrow IPC файлы партиций
+# 2. каждая партиция читается целиком (memory map) и агрегируется отдельно bincount'ом
+#    по локальному коду code // partitions - и массив сумм, и строки партиции в бюджете
+# 3. от партиции остаются только кандидаты - топ-N каждого города, итог - топ-N по кандидатам
+#
+# партиционируем по коду группы, а не по store_id: магазины с одинаковыми (город, название)
+# складываются в одну группу и должны попасть в одну партицию
+# строки группы идут в файл в исходном порядке и суммируются одним bincount'ом,
+# поэтому суммы совпадают с путем в памяти до бита
+
+from pathlib import Path
+import math
+import shutil
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+
+
+SPILL_SCHEMA = pa.schema([('code', pa.int64()), ('amount', pa.float64())])
+# байт на строку в партиции: код + сумма, и копия при склейке батчей
+ROW_BYTES = 2 * (8 + 8)
+
+
+def plan_partitions(rows, memory_budget, max_partitions=256):
+    # сколько партиций нужно, чтобы одна партиция из rows заказов уложилась в бюджет
+    partitions = math.ceil(rows * ROW_BYTES / max(memory_budget, 1))
+    return min(max(partitions, 1), max_partitions)
+
+
+class ExternalAggregator:
+    # spill по партициям и агрегация партиций по одной, используется как контекстный менеджер:
+    # каталог со spill-файлами удаляется на выходе, в том числе при ошибке
+
+    def __init__(self, dimension, eligible, memory_budget, spill_dir=None, partitions=1):
+        self.dimension = dimension
+        self.eligible = eligible
+        self.memory_budget = memory_budget
+        self.partitions = partitions
+        self.spill_root = spill_dir
+        self.spill_dir = None
+
+        self.buffers = [[] for _ in range(partitions)]
+        self.buffered = 0
+        self.writers = {}
+        self.rows = 0
+        self.stats = {'partitions': partitions, 'spills': 0, 'spilled_rows': 0, 'spilled_bytes': 0,
+                      'max_partition_rows': 0, 'candidates': 0}
+
+    def __enter__(self):
+        if self.spill_root is not None:
+            Path(self.spill_root).mkdir(parents=True, exist_ok=True)
+        self.spill_dir = Path(tempfile.mkdtemp(prefix='spill_', dir=self.spill_root))
+        return self
+
+    def __exit__(self, *exc):
+        self._close_writers()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def update(self, orders_batch):
+        # orders_batch - DataFrame с колонками user_id, store_id, amount
+        mask = self.eligible.contains(orders_batch['user_id'])
+        self.rows += int(mask.sum())
+        codes = self.dimension.codes(orders_batch['store_id'].to_numpy()[mask])
+        amounts = orders_batch['amount'].to_numpy(dtype=np.float64)[mask]
+
+        # заказы без магазина в справочнике отбрасываются, как inner join
+        known = codes >= 0
+        codes, amounts = codes[known], amounts[known]
+        if not len(codes):
+            return
+
+        # стабильная сортировка по партиции сохраняет порядок строк внутри группы
+        partition = codes % self.partitions
+        order = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+        codes, amounts = codes[order], amounts[order]
+        for index in range(self.partitions):
+            start, end = bounds[index], bounds[index + 1]
+            if start < end:
+                self.buffers[index].append((codes[start:end], amounts[start:end]))
+        self.buffered += codes.nbytes + amounts.nbytes
+
+        if self.buffered >= self.memory_budget // 2:
+            self.spill()
+
+    def spill(self):
+        # буферы всех партиций - в их IPC файлы
+        for index, buffer in enumerate(self.buffers):
+            if not buffer:
+                continue
+            writer = self.writers.get(index)
+            if writer is None:
+                writer = pa.ipc.new_stream(str(self._path(index)), SPILL_SCHEMA)
+                self.writers[index] = writer
+            batch = pa.record_batch([np.concatenate([codes for codes, _ in buffer]),
+                                     np.concatenate([amounts for _, amounts in buffer])], schema=SPILL_SCHEMA)
+            writer.write_batch(batch)
+            self.stats['spilled_rows'] += batch.num_rows
+            buffer.clear()
+        if self.buffered:
+            self.stats['spills'] += 1
+        self.buffered = 0
+
+    def top_n(self, n=3):
+        # агрегация партиций по одной, кандидаты со всех партиций, итоговый топ-N
+        self.spill()
+        self._close_writers()
+
+        candidates, amounts = [], []
+        for index in range(self.partitions):
+            path = self._path(index)
+            if not path.exists():
+                continue
+            self.stats['spilled_bytes'] += path.stat().st_size
+            codes, totals = self._aggregate_partition(index, path)
+            selected = self.dimension.top_codes(codes, totals[codes // self.partitions], n=n)
+            candidates.append(selected)
+            amounts.append(totals[selected // self.partitions])
+            path.unlink()
+
+        totals = np.zeros(self.dimension.num_groups, dtype=np.float64)
+        counts = np.zeros(self.dimension.num_groups, dtype=np.int64)
+        if candidates:
+            candidates = np.concatenate(candidates)
+            totals[candidates] = np.concatenate(amounts)
+            counts[candidates] = 1
+            self.stats['candidates'] = len(candidates)
+        return self.dimension.top_n(totals, counts, n=n)
+
+    def _aggregate_partition(self, index, path):
+        # коды групп партиции (по возрастанию) и суммы по локальному коду
+        size = math.ceil(self.dimension.num_groups / self.partitions)
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_stream(source).read_all()
+            local = table.column('code').to_numpy() // self.partitions
+            totals = np.bincount(local, weights=table.column('amount').to_numpy(), minlength=size)
+            counts = np.bincount(local, minlength=size)
+            self.stats['max_partition_rows'] = max(self.stats['max_partition_rows'], table.num_rows)
+
+        present = np.flatnonzero(counts > 0)
+        return present * self.partitions + index, totals
+
+    def _path(self, index):
+        return self.spill_dir / f'part-{index:05}.arrow'
+
+    def _close_writers(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
@@ -0,0 +1,154 @@
+# инкрементальный режим: суммы по магазинам + watermark'и хранятся между запусками
+#
+# предполагается, что id заказов и пользователей растут: новые записи получают id больше старых
+# новые заказы - id > orders_watermark, новые пользователи - id > users_watermark
+# для новых подходящих пользователей досчитываются их старые заказы (поздние регистрации)
+# вместе с суммами хранится отпечаток уже учтенных данных: md5 сжатых страниц row group'ов
+# заказов до watermark'а (читаются байты, без распаковки) и id подходящих пользователей до watermark'а;
+# если файлы перегенерированы с теми же id (python src/main.py generate), отпечаток другой
+# и суммы считаются заново
+
+import hashlib
+import json
+import logging
+
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from aggregation import StoreAggregator
+from dimensions import EligibleUsers
+
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'etl_state.json'
+ORDERS_COLUMNS = ['id', 'user_id', 'store_id', 'amount']
+
+
+class IncrementalAggregator:
+    # StoreAggregator, который сохраняется в файл вместе с watermark'ами
+
+    def __init__(self, state_path, target_year=2025):
+        self.state_path = state_path
+        self.target_year = target_year
+        self.aggregator = StoreAggregator()
+        self.orders_watermark = 0
+        self.users_watermark = 0
+        self.identity = None
+        self._load()
+
+    def _load(self):
+        if not self.state_path.exists():
+            return
+
+        with open(self.state_path, encoding='utf-8') as f:
+            state = json.load(f)
+
+        if state.get('target_year') != self.target_year:
+            logger.info("Год в состоянии не совпадает - полный пересчет")
+            return
+
+        self.orders_watermark = state['orders_watermark']
+        self.users_watermark = state['users_watermark']
+        self.identity = state.get('identity')
+        self.aggregator.rows = state['rows']
+        self.aggregator.sums = {int(store_id): amount for store_id, amount in state['sums'].items()}
+
+    def reset(self):
+        self.aggregator = StoreAggregator()
+        self.orders_watermark = 0
+        self.users_watermark = 0
+        self.identity = None
+
+    def save(self):
+        # атомарная замена: при падении остается старое состояние
+        state = {
+            'target_year': self.target_year,
+            'orders_watermark': self.orders_watermark,
+            'users_watermark': self.users_watermark,
+            'identity': self.identity,
+            'rows': self.aggregator.rows,
+            'sums': {str(store_id): float(amount) for store_id, amount in self.aggregator.sums.items()},
+        }
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        tmp_path.replace(self.state_path)
+
+    def update(self, users_df, orders_path, validator=None):
+        # users_df - пользователи целевого года (id, created_at)
+        # validator - DataValidator: проверяются только прочитанные в этом запуске заказы
+        # возвращает статистику: сколько заказов/пользователей обработано в этом запуске
+
+        orders_file = pq.ParquetFile(orders_path)
+        user_ids = users_df['id'].to_numpy()
+        if self.orders_watermark or self.users_watermark:
+            identity = _identity(orders_path, orders_file, self.orders_watermark, user_ids, self.users_watermark)
+            if identity is None or identity != self.identity:
+                # файлы пересозданы или изменены до watermark'а - старое состояние к ним не относится
+                logger.info("Учтенные данные изменились - полный пересчет")
+                self.reset()
+
+        new_user_ids = user_ids[user_ids > self.users_watermark]
+        stats = {'users_new': len(new_user_ids), 'orders_new': 0, 'orders_backfill': 0}
+
+        # заказы новых пользователей, пришедшие раньше них (уже за watermark'ом)
+        if len(new_user_ids) and self.orders_watermark:
+            backfill = pq.read_table(
+                orders_path, columns=ORDERS_COLUMNS,
+                filters=[('id', '<=', self.orders_watermark), ('user_id', '>', self.users_watermark)]
+            ).to_pandas()
+            if validator is not None:
+                backfill = validator.validate_orders(backfill)
+            backfill = backfill[EligibleUsers(new_user_ids).contains(backfill['user_id'])]
+            self.aggregator.update(backfill)
+            stats['orders_backfill'] = len(backfill)
+
+        # новые заказы всех подходящих пользователей, старые row group'ы отсекаются по статистике
+        new_orders = pq.read_table(
+            orders_path, columns=ORDERS_COLUMNS, filters=[('id', '>', self.orders_watermark)]
+        )
+        if new_orders.num_rows:
+            self.orders_watermark = max(self.orders_watermark, pc.max(new_orders.column('id')).as_py())
+        new_orders = new_orders.to_pandas()
+        if validator is not None:
+            new_orders = validator.validate_orders(new_orders)
+        new_orders = new_orders[EligibleUsers(user_ids).contains(new_orders['user_id'])]
+        self.aggregator.update(new_orders)
+        stats['orders_new'] = len(new_orders)
+
+        if len(user_ids):
+            self.users_watermark = max(self.users_watermark, int(user_ids.max()))
+        self.identity = _identity(orders_path, orders_file, self.orders_watermark, user_ids, self.users_watermark)
+        return stats
+
+    def top_n(self, stores_df, n=3):
+        return self.aggregator.top_n(stores_df, n=n)
+
+
+def _identity(orders_path, orders_file, orders_watermark, user_ids, users_watermark):
+    # отпечаток учтенного: сжатые байты колонок row group'ов заказов целиком до watermark'а
+    # и id подходящих пользователей до watermark'а; None - в файле нет статистики id
+    # row group, в который дописали новые заказы, дает другой отпечаток - это просто полный пересчет
+    metadata = orders_file.metadata
+    indexes = [orders_file.schema_arrow.get_field_index(column) for column in ORDERS_COLUMNS]
+    digest = hashlib.md5()
+    with open(orders_path, 'rb') as f:
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            stats = row_group.column(indexes[0]).statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            if stats.max > orders_watermark:
+                continue
+            digest.update(str(row_group.num_rows).encode())
+            for index in indexes:
+                column = row_group.column(index)
+                offset = column.dictionary_page_offset if column.has_dictionary_page else column.data_page_offset
+                f.seek(offset)
+                digest.update(f.read(column.total_compressed_size))
+
+    users = np.sort(np.asarray(user_ids, dtype=np.int64))
+    digest.update(users[users <= users_watermark].tobytes())
+    return digest.hexdigest()
@@ -1,125 +1,88 @@
 # main file
+# точка входа: python src/main.py <команда>, без команды - run с параметрами из окружения
+# модуль импортирует только stdlib и config: pandas / pyarrow нужны с первого расчета,
+# boto3 - только в s3 режиме, поэтому они импортируются там, где используются
 
+import argparse
 import os
-import pandas as pd
+import sys
+import time
 from pathlib import Path
 import logging
-import boto3
-from botocore.exceptions import ClientError
+from datetime import datetime
+
+from config import load_config, setup_logging
 
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
-class S3Handler:
-    # работа с minio, s3
-    def __init__(self, endpoint, access_key, secret_key, bucket_name):
-        self.endpoint = endpoint
-        self.bucket_name = bucket_name
-        
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=endpoint,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name='us-east-1' 
-        )
-        
-        logger.info(f"S3 клиент создан для {endpoint}")
-        
-    def ensure_bucket_exists(self):
-        # создание бакета
-        try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-            logger.info(f"Bucket '{self.bucket_name}' уже существует")
-        except ClientError:
-            self.s3_client.create_bucket(Bucket=self.bucket_name)
-            logger.info(f"Bucket '{self.bucket_name}' создан")
-    
-    def upload_file(self, local_path, s3_key):
-        # Загрузка в s3
-        try:
-            self.s3_client.upload_file(str(local_path), self.bucket_name, s3_key)
-            logger.info(f"Загружено в S3: {s3_key}")
-        except Exception as e:
-            logger.error(f"Ошибка загрузки {local_path} в S3: {e}")
-            raise
-    
-    def download_file(self, s3_key, local_path):
-        # выгрузка из S3
-        try:
-            local_path.parent.mkdir(parents=True, exist_ok=True)
-            self.s3_client.download_file(self.bucket_name, s3_key, str(local_path))
-            logger.info(f"Скачано из S3: {s3_key} в {local_path}")
-        except Exception as e:
-            logger.error(f"Ошибка скачивания {s3_key} из S3: {e}")
-            raise
-    
-    def read_parquet_from_s3(self, s3_key):
-        # parquet из s3 в df
-        try:
-            import tempfile
-            import os
-            
-            #  cкачиваем во временный файл
-            with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
-                self.s3_client.download_fileobj(self.bucket_name, s3_key, tmp)
-                tmp_path = tmp.name
-            
-            df = pd.read_parquet(tmp_path)
-            os.remove(tmp_path)
-            
-            logger.info(f"Прочитано из S3: {s3_key}, строк: {len(df)}")
-            return df
-        except Exception as e:
-            logger.error(f"Ошибка чтения {s3_key} из S3: {e}")
-            raise
-    
-    def write_parquet_to_s3(self, df, s3_key):
-        # запись df в parquet в S3
-
-        try:
-            # Сохраняем во временный файл
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
-                df.to_parquet(tmp.name, index=False, engine='pyarrow')
-                tmp_path = tmp.name
-            
-            # загружаем в S3
-            self.upload_file(tmp_path, s3_key)
-            os.remove(tmp_path)
-            
-            logger.info(f"Записано в S3: {s3_key}, строк: {len(df)}")
-        except Exception as e:
-            logger.error(f"Ошибка записи в S3 {s3_key}: {e}")
-            raise
+def __getattr__(name):
+    # S3Handler переехал в s3_handler.py, from main import S3Handler продолжает работать
+    if name == 'S3Handler':
+        from s3_handler import S3Handler
+        return S3Handler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class ETLRunner:
     # режимы запуска
     
-    def __init__(self, run_mode='local'):
-    # режимы запуска с3 ил или локально
+    def __init__(self, run_mode='local', etl_mode='full', workers=None, profile=False, trace_memory=False,
+                 engine=None):
+    # режимы запуска с3 ил или локально, parallel - локально в пуле процессов
+    # etl_mode - режим чтения в StoreAnalyticsETL (full / streaming / parallel / incremental / external)
+    # profile / trace_memory - cProfile дамп и tracemalloc по этапам
+    # engine - движок transform (pandas / arrow), по умолчанию etl.engine из конфига
+    # год, N и дополнительные отчеты берутся из секции etl конфига
         self.run_mode = run_mode
+        self.etl_mode = 'parallel' if run_mode == 'parallel' else etl_mode
+        self.workers = workers
+        self.profile = profile
+        self.trace_memory = trace_memory
+        etl_config = load_config().get('etl', {})
+        self.engine = engine or etl_config.get('engine', 'pandas')
+        self.target_year = etl_config.get('target_year', 2025)
+        self.top_n = etl_config.get('top_n', 3)
+        self.reports = etl_config.get('reports') or []
+        self.output = etl_config.get('output')
+        self.microbatch = etl_config.get('microbatch', {})
+        self.external = etl_config.get('external')
+        # проверка данных (etl.validation): enabled - правила моделей, quarantine - плохие строки в карантин
+        validation = etl_config.get('validation') or {}
+        self.validate = validation.get('enabled', True)
+        self.quarantine = validation.get('quarantine', False)
         self.s3_handler = None
+        self.etl = None
+
+        # кеш результатов по отпечатку входных файлов, ETL_CACHE=0 - отключить
+        cache_config = etl_config.get('cache', {})
+        self.cache = None
+        if cache_config.get('enabled') and os.getenv('ETL_CACHE', '1') != '0':
+            from result_cache import ResultCache
+            self.cache = ResultCache(
+                Path(cache_config.get('dir', './cache')),
+                max_entries=cache_config.get('max_entries', 32),
+                max_bytes=int(cache_config.get('max_size_mb', 512) * 1024 * 1024)
+            )
         
         if run_mode == 's3':
             self._setup_s3()
     
     def _setup_s3(self):
+        from s3_handler import S3Handler
+
         endpoint = os.getenv('S3_ENDPOINT', 'http://minio:9000')
         access_key = os.getenv('S3_ACCESS_KEY', 'minioadmin')
         secret_key = os.getenv('S3_SECRET_KEY', 'minioadmin')
         bucket_name = os.getenv('S3_BUCKET', 'etl-data')
+        io_mode = os.getenv('S3_IO_MODE', 'memory')
+        transfer = load_config().get('s3', {}).get('transfer', {})
         
-        logger.info(f"Настройка S3: endpoint={endpoint}, bucket={bucket_name}")
+        logger.info(f"Настройка S3: endpoint={endpoint}, bucket={bucket_name}, io={io_mode}")
         
-        self.s3_handler = S3Handler(endpoint, access_key, secret_key, bucket_name)
+        self.s3_handler = S3Handler(endpoint, access_key, secret_key, bucket_name,
+                                    io_mode=io_mode, transfer=transfer)
         self.s3_handler.ensure_bucket_exists()
     
     def run_local_mode(self):
@@ -129,61 +92,335 @@ class ETLRunner:
         etl = StoreAnalyticsETL(
             input_dir='./data/input',
             output_dir='./data/output',
-            log_dir='./logs'
+            log_dir='./logs',
+            mode=self.etl_mode,
+            workers=self.workers,
+            profile=self.profile,
+            trace_memory=self.trace_memory,
+            engine=self.engine,
+            validate=self.validate,
+            quarantine=self.quarantine,
+            target_year=self.target_year,
+            top_n=self.top_n,
+            reports=self.reports,
+            output=self.output,
+            external=self.external
         )
         
+        self.etl = etl
         result = etl.run()
         return result
     
     def run_s3_mode(self):
         # с3
-        try:
-            logger.info("\nзагрузка входных данных в S3...")
-            local_input_dir = Path('./data/input')
-            if local_input_dir.exists():
-                for file_name in ['stores.parquet', 'users.parquet', 'orders.parquet']:
-                    local_file = local_input_dir / file_name
-                    if local_file.exists():
-                        self.s3_handler.upload_file(local_file, f'input/{file_name}')
-            
-            logger.info("\nЧтение данных из S3")
-            stores_df = self.s3_handler.read_parquet_from_s3('input/stores.parquet')
-            users_df = self.s3_handler.read_parquet_from_s3('input/users.parquet')
-            orders_df = self.s3_handler.read_parquet_from_s3('input/orders.parquet')
-            
-            logger.info("\nПреобразование данны")
-            from etl_process import StoreAnalyticsETL
+        import pandas as pd
+        from dtypes import optimize_dtypes
+        from etl_process import StoreAnalyticsETL, STORES_COLUMNS, USERS_COLUMNS, ORDERS_COLUMNS
+        from s3_sync import InputSync
+        from writers import S3ParquetSink
+
+        # объект нужен для transform и метрик, передачи в S3 пишутся в его профайлер
+        etl = StoreAnalyticsETL(
+            input_dir='./data/input',
+            output_dir='./data/output',
+            log_dir='./logs',
+            trace_memory=self.trace_memory,
+            engine=self.engine,
+            validate=self.validate,
+            quarantine=self.quarantine,
+            target_year=self.target_year,
+            top_n=self.top_n,
+            reports=self.reports,
+            output=self.output
+        )
+        etl.metrics['start_time'] = datetime.now()
+        self.etl = etl
+        self.s3_handler.profiler = etl.profiler
+
+        with etl.log_to_file():
+            try:
+                logger.info("\nсинхронизация входных данных с S3...")
+
+                file_names = ['stores.parquet', 'users.parquet', 'orders.parquet']
+                local_input_dir = Path('./data/input')
+                synced = {}
+                if local_input_dir.exists():
+                    synced = InputSync(self.s3_handler, local_input_dir).sync(file_names)
+
+                # только нужные колонки, фильтр по году - на уровне row group'ов
+                # (с отчетами пользователи нужны все: у отчетов может быть свой год)
+                read_args = {
+                    'stores.parquet': {'columns': STORES_COLUMNS},
+                    'users.parquet': {
+                        'columns': USERS_COLUMNS,
+                        'filters': None if self.reports else StoreAnalyticsETL._year_filter('created_at',
+                                                                                             self.target_year)
+                    },
+                    'orders.parquet': {'columns': sorted(set(ORDERS_COLUMNS).union(
+                        *(spec.order_columns for spec in etl.reports)))},
+                }
+
+                # после синхронизации локальная копия совпадает с S3 - читаем ее
+                frames = {}
+                for file_name in file_names:
+                    if file_name in synced:
+                        local_file = local_input_dir / file_name
+                        with etl.profiler.stage(f'read_{file_name.split(".")[0]}',
+                                                nbytes=local_file.stat().st_size) as stage:
+                            frames[file_name] = pd.read_parquet(local_file, **read_args[file_name])
+                            stage['rows'] = len(frames[file_name])
+                logger.info(f"Прочитано локально (совпадает с S3): {sorted(frames)}")
+
+                missing = [file_name for file_name in file_names if file_name not in frames]
+                if missing:
+                    logger.info(f"\nЧтение данных из S3: {missing}")
+                remote = self.s3_handler.read_many_parquet({
+                    f'input/{file_name}': read_args[file_name] for file_name in missing
+                })
+                for s3_key, df in remote.items():
+                    frames[s3_key.split('/', 1)[1]] = df
+
+                stores_df = frames['stores.parquet']
+                users_df = frames['users.parquet']
+                orders_df = frames['orders.parquet']
             
-            # временный объект только для transform
-            etl = StoreAnalyticsETL()
-            result_df = etl.transform(stores_df, users_df, orders_df)
+                for file_name, df in frames.items():
+                    optimize_dtypes(df)
+                    etl.metrics['records_processed'][file_name.split('.')[0]] = len(df)
+
+                # пользователи отфильтрованы по году - ссылку заказ -> пользователь не проверяем
+                stores_df, users_df, orders_df = etl.validate(stores_df, users_df, orders_df,
+                                                              users_complete=bool(self.reports))
+                if etl.validator is not None:
+                    etl._log_validation()
+
+                logger.info("\nПреобразование данны")
+                if self.reports:
+                    # основной топ-N и отчеты одним проходом по заказам, отчеты - еще и в S3
+                    result_df = etl.transform_reports(stores_df, users_df, orders_df)
+                    self.s3_handler.upload_many([
+                        (etl.output_dir / 'reports' / f'{name}.parquet', f'output/reports/{name}.parquet')
+                        for name in etl.metrics['reports']
+                    ])
+                else:
+                    result_df = etl.transform(stores_df, users_df, orders_df)
         
-            logger.info("\nСохранение результата в S3")
-            self.s3_handler.write_parquet_to_s3(result_df, 'output/result.parquet')
-            logger.info("\nСохранение результата локально...")
-            output_dir = Path('./data/output')
-            output_dir.mkdir(parents=True, exist_ok=True)
-            result_df.to_parquet(output_dir / 'result.parquet', index=False)
-            result_df.to_csv(output_dir / 'result.csv', index=False, encoding='utf-8-sig')
-            logger.info(f"Результат сохранен в {output_dir}")  
-            return result_df
+                # одно преобразование в Arrow на S3, локальный parquet и csv
+                logger.info("\nСохранение результата в S3 и локально...")
+                etl.load(result_df, extra_sinks=[S3ParquetSink(
+                    self.s3_handler.s3_client, self.s3_handler.bucket_name, 'output/result.parquet',
+                    **etl.parquet_options
+                )])
+                etl.save_metrics()
+                logger.info(f"Результат сохранен в {etl.output_dir}")  
+                return result_df
             
-        except Exception as e:
-            logger.error(f"Ошибка в S3 режиме: {e}")
-            raise
+            except Exception as e:
+                logger.error(f"Ошибка в S3 режиме: {e}")
+                raise
     
     def run(self):
-    # запуск
+    # запуск; с включенным кешем повторный запуск на тех же входах обходится без ETL
+        if self.cache is None or not self._cacheable():
+            return self._run_etl()
+        from engines import top_n_from_groups
+
+        started = time.perf_counter()
+        fingerprints = self._input_fingerprints()
+        params = {'target_year': self.target_year, 'top_n': self.top_n, 'reports': self.reports,
+                  'quarantine': self._quarantine()}
+        result_key = self.cache.key(fingerprints, params)
+        aggregates_key = self._aggregates_key(fingerprints, self.target_year)
+
+        result = self.cache.get(result_key)
+        if result is None:
+            groups = self.cache.get(aggregates_key, kind='aggregates')
+            if groups is not None:
+                result = top_n_from_groups(groups, self.top_n)
+                self.cache.put(result_key, result)
+
+        if result is not None:
+            self._publish(result)
+            logger.info(f"Результат из кеша {result_key}: {len(result)} строк "
+                        f"за {(time.perf_counter() - started) * 1000:.1f} мс")
+            return result
+
+        result = self._run_etl()
+        self.cache.put(result_key, result)
+        if self.etl is not None and self.etl.aggregates is not None:
+            self.cache.put(aggregates_key, self.etl.aggregates, kind='aggregates')
+        return result
+
+    def watch(self, stop=None, max_cycles=None, **options):
+        # micro-batch: новые части заказов -> суммы в памяти -> result.parquet по расписанию
+        # options переопределяют etl.microbatch из конфига (poll_interval, publish_interval, ...)
+        from etl_process import StoreAnalyticsETL
+        from microbatch import LocalPartSource, MicroBatchETL, S3PartSource
+        from writers import S3ParquetSink
+
+        config = {**self.microbatch, **{key: value for key, value in options.items() if value is not None}}
+        input_dir = Path('./data/input')
+        etl = StoreAnalyticsETL(
+            input_dir=input_dir,
+            output_dir='./data/output',
+            log_dir='./logs',
+            engine=self.engine,
+            validate=self.validate,
+            quarantine=self.quarantine,
+            target_year=self.target_year,
+            top_n=self.top_n,
+            output=self.output
+        )
+        self.etl = etl
+
+        parts = config.get('parts', 'orders')
+        extra_sinks = []
+        if self.run_mode == 's3':
+            # справочники - локальная копия, без нее скачиваются один раз
+            for file_name in ('stores.parquet', 'users.parquet'):
+                if not (input_dir / file_name).exists():
+                    self.s3_handler.download_file(f'input/{file_name}', input_dir / file_name)
+            source = S3PartSource(self.s3_handler, prefix=f'input/{parts}/')
+            extra_sinks.append(S3ParquetSink(self.s3_handler.s3_client, self.s3_handler.bucket_name,
+                                             'output/result.parquet', **etl.parquet_options))
+        else:
+            source = LocalPartSource(input_dir / parts, batch_size=etl.batch_size)
+
+        microbatch = MicroBatchETL(
+            etl, source, extra_sinks,
+            poll_interval=config.get('poll_interval', 1.0),
+            publish_interval=config.get('publish_interval', 5.0),
+            max_files_per_cycle=config.get('max_files_per_cycle', 16),
+            max_pending=config.get('max_pending', 256)
+        )
+        with etl.log_to_file():
+            logger.info(f"Micro-batch: части {source.__class__.__name__} '{parts}', "
+                        f"публикация раз в {microbatch.publish_interval} с")
+            microbatch.run(stop=stop, max_cycles=max_cycles)
+        return microbatch
+
+    def _cacheable(self):
+        # из кеша восстанавливается только result.*: отчеты, секции result_partitioned
+        # и файлы карантина пишет лишь сам ETL
+        partitioned = (self.output or {}).get('partitioned', {})
+        return not self.reports and not partitioned.get('enabled') and not self._quarantine()
+
+    def _aggregates_key(self, fingerprints, target_year):
+        # суммы групп не зависят от N и отчетов; карантин убирает плохие заказы из сумм
+        return self.cache.key(fingerprints, {'target_year': target_year, 'quarantine': self._quarantine()})
+
+    def _quarantine(self):
+        return bool(self.validate and self.quarantine)
+
+    def _run_etl(self):
         if self.run_mode == 's3':
             return self.run_s3_mode()
         else:
             return self.run_local_mode()
 
+    def _input_fingerprints(self):
+        # в s3 режиме локальные файлы синхронизируются в бакет, поэтому источник - они;
+        # без локальной копии - ETag'и объектов
+        from result_cache import parquet_fingerprint, s3_fingerprint
+
+        file_names = ['stores.parquet', 'users.parquet', 'orders.parquet']
+        local_input_dir = Path('./data/input')
+        if self.run_mode == 's3' and not local_input_dir.exists():
+            return {
+                file_name: s3_fingerprint(self.s3_handler.s3_client, self.s3_handler.bucket_name,
+                                          f'input/{file_name}')
+                for file_name in file_names
+            }
+        return {file_name: parquet_fingerprint(local_input_dir / file_name) for file_name in file_names}
+
+    def _publish(self, result):
+        # результат из кеша записывается в те же места, что и после ETL:
+        # файлы в data/output могли остаться от запуска с другими параметрами
+        from writers import CsvFileSink, ParquetFileSink, ResultWriter, S3ParquetSink, parquet_options
+
+        output_dir = Path('./data/output')
+        options = parquet_options(self.output)
+        sinks = [ParquetFileSink(output_dir / 'result.parquet', **options), CsvFileSink(output_dir / 'result.csv')]
+        if self.s3_handler is not None:
+            sinks.append(S3ParquetSink(self.s3_handler.s3_client, self.s3_handler.bucket_name,
+                                       'output/result.parquet', **options))
+        ResultWriter(sinks).write(result)
+
+
+def build_parser():
+    # значения по умолчанию - из переменных окружения, как у прежнего запуска без аргументов
+    parser = argparse.ArgumentParser(description='ETL: топ-N магазинов по городам')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    run = commands.add_parser('run', help='один запуск ETL (по умолчанию)')
+    serve = commands.add_parser('serve', help='постоянный сервис с HTTP API')
+    watch = commands.add_parser('watch', help='micro-batch: досчет новых частей заказов')
+    for command in (run, serve, watch):
+        command.add_argument('--mode', choices=['local', 's3', 'parallel'], default=os.getenv('RUN_MODE', 'local'))
+        command.add_argument('--etl-mode', choices=['full', 'streaming', 'parallel', 'incremental', 'external'],
+                             default=os.getenv('ETL_MODE', 'full'))
+        command.add_argument('--engine', choices=['pandas', 'arrow'], default=os.getenv('ETL_ENGINE'),
+                             help='по умолчанию etl.engine из конфига')
+        command.add_argument('--workers', type=int, default=int(os.getenv('ETL_WORKERS', '0')) or None)
+        command.add_argument('--profile', action='store_true', default=os.getenv('ETL_PROFILE', '0') == '1')
+        command.add_argument('--trace-memory', action='store_true',
+                             default=os.getenv('ETL_TRACE_MEMORY', '0') == '1')
+    serve.add_argument('--host', default=os.getenv('ETL_SERVICE_HOST', '127.0.0.1'))
+    serve.add_argument('--port', type=int, default=int(os.getenv('ETL_SERVICE_PORT', '8080')))
+    watch.add_argument('--poll-interval', type=float, default=None, help='по умолчанию etl.microbatch')
+    watch.add_argument('--publish-interval', type=float, default=None)
+    watch.add_argument('--max-cycles', type=int, default=None, help='остановиться после N циклов')
+
+    # аргументы этих команд разбирают сами скрипты, --help тоже их
+    commands.add_parser('generate', add_help=False, help='генерация тестовых данных (data_generator.py)')
+    benchmark = commands.add_parser('benchmark', add_help=False, help='бенчмарки: etl (bench/run_bench.py) '
+                                                      'или startup (bench/startup_bench.py)')
+    benchmark.add_argument('kind', choices=['etl', 'startup'])
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    # без команды - run, python src/main.py работает как раньше
+    if not argv or argv[0].startswith('-') and argv[0] not in ('-h', '--help'):
+        argv = ['run', *argv]
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ('generate', 'benchmark'):
+        parser.error(f"неизвестные аргументы: {' '.join(extra)}")
+
+    if args.command == 'generate':
+        from data_generator import main as generate
+        return generate(extra, output_dir='./data/input')
+
+    if args.command == 'benchmark':
+        sys.path.insert(0, str(Path(__file__).parent.parent / 'bench'))
+        if args.kind == 'startup':
+            from startup_bench import main as benchmark
+        else:
+            from run_bench import main as benchmark
+        return benchmark(extra)
+
+    setup_logging()
+    logger.info(f"Запуск приложения в режиме: {args.mode} ({args.etl_mode})")
+    runner = ETLRunner(run_mode=args.mode, etl_mode=args.etl_mode, workers=args.workers,
+                       profile=args.profile, trace_memory=args.trace_memory, engine=args.engine)
+
+    if args.command == 'watch':
+        try:
+            return runner.watch(max_cycles=args.max_cycles, poll_interval=args.poll_interval,
+                                publish_interval=args.publish_interval)
+        except KeyboardInterrupt:
+            return None
+
+    # ETL_SERVE=1 - то же, что команда serve (для docker-compose)
+    if args.command == 'serve' or os.getenv('ETL_SERVE', '0') == '1':
+        from service import serve
+        host = getattr(args, 'host', os.getenv('ETL_SERVICE_HOST', '127.0.0.1'))
+        port = getattr(args, 'port', int(os.getenv('ETL_SERVICE_PORT', '8080')))
+        return serve(runner, host=host, port=port)
+    return runner.run()
+
 
 if __name__ == '__main__':
-    run_mode = os.getenv('RUN_MODE', 'local')
-    
-    logger.info(f"Запуск приложения в режиме: {run_mode}")
-    runner = ETLRunner(run_mode=run_mode)
-    result = runner.run()
-    
\ No newline at end of file
+    main()
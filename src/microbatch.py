@@ -0,0 +1,281 @@
+# режим micro-batch: новые part-файлы заказов досчитываются в суммы по магазинам в памяти,
+# result.parquet переписывается раз в publish_interval секунд, а не ночным запуском
+#
+# части ищутся опросом: локально - data/input/orders/*.parquet, в S3 - ключи под input/orders/
+# (inotify без внешних зависимостей недоступен, а листинг каталога - доли миллисекунды)
+# orders.parquet, если есть, - база, она учитывается при старте
+# новые пользователи или магазины (изменился users/stores.parquet) - пересчет всех частей заново:
+# заказы старых частей могут относиться к только что зарегистрированным пользователям
+#
+# backpressure: в очереди не больше max_pending частей, остальные ждут в каталоге / бакете
+# и подхватываются следующими опросами; за цикл досчитывается не больше max_files_per_cycle,
+# публикация не чаще publish_interval, сколько бы частей ни пришло
+#
+# карантин: плохие строки, накопленные с прошлой публикации, пишутся при публикации в
+# quarantine/<таблица>-<время>.parquet и из памяти убираются; при пересчете всех частей
+# файлы этого процесса удаляются и строки попадают в карантин заново, уже по новым справочникам
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import logging
+import time
+
+import pyarrow.parquet as pq
+
+from aggregation import StoreAggregator
+from dimensions import EligibleUsers, StoreDimension
+from profiling import StageProfiler
+from result_cache import parquet_fingerprint
+from writers import AtomicFile, CsvFileSink, ParquetFileSink, ResultWriter
+
+
+logger = logging.getLogger(__name__)
+
+PART_COLUMNS = ['user_id', 'store_id', 'amount']
+STATUS_FILE = 'microbatch_status.json'
+PARQUET_MAGIC = b'PAR1'
+
+
+@dataclass(frozen=True)
+class Part:
+    # одна часть заказов: путь или ключ S3, время появления для очереди и lag
+    name: str
+    size: int
+    modified: float
+
+
+class LocalPartSource:
+    # part-файлы в каталоге; скрытые (.name / _name) - недописанные временные файлы
+
+    def __init__(self, parts_dir, batch_size=1_000_000):
+        self.parts_dir = parts_dir
+        self.batch_size = batch_size
+
+    def list(self):
+        if not self.parts_dir.exists():
+            return []
+        parts = []
+        for path in self.parts_dir.glob('*.parquet'):
+            if path.name.startswith(('.', '_')) or not _complete_parquet(path):
+                continue
+            stat = path.stat()
+            parts.append(Part(str(path), stat.st_size, stat.st_mtime))
+        return parts
+
+    def read(self, part):
+        parts_file = pq.ParquetFile(part.name)
+        for batch in parts_file.iter_batches(batch_size=self.batch_size, columns=PART_COLUMNS):
+            yield batch.to_pandas()
+
+
+class S3PartSource:
+    # ключи под префиксом; объект в S3 появляется целиком, проверять запись не нужно
+
+    def __init__(self, s3_handler, prefix='input/orders/'):
+        self.s3_handler = s3_handler
+        self.prefix = prefix
+
+    def list(self):
+        paginator = self.s3_handler.s3_client.get_paginator('list_objects_v2')
+        parts = []
+        for page in paginator.paginate(Bucket=self.s3_handler.bucket_name, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                name = item['Key'].rsplit('/', 1)[-1]
+                if not name.endswith('.parquet') or name.startswith(('.', '_')):
+                    continue
+                parts.append(Part(item['Key'], item['Size'], item['LastModified'].timestamp()))
+        return parts
+
+    def read(self, part):
+        yield self.s3_handler.read_parquet_from_s3(part.name, columns=PART_COLUMNS)
+
+
+class MicroBatchETL:
+    # суммы по магазинам в памяти поверх StoreAnalyticsETL (справочники, проверка, год, N, каталоги)
+
+    def __init__(self, etl, source, extra_sinks=(), poll_interval=1.0, publish_interval=5.0,
+                 max_files_per_cycle=16, max_pending=256):
+        self.etl = etl
+        self.source = source
+        self.extra_sinks = list(extra_sinks)
+        self.poll_interval = poll_interval
+        self.publish_interval = publish_interval
+        self.max_files_per_cycle = max_files_per_cycle
+        self.max_pending = max_pending
+
+        self.aggregator = StoreAggregator()
+        self.started = False
+        self.seen = set()
+        self.done = []
+        self.pending = deque()
+        self.fingerprints = {}
+        self.quarantine_files = []
+        self.dirty = False
+        self.last_publish = None
+        self.stats = {'cycles': 0, 'files': 0, 'bytes': 0, 'rows': 0, 'publishes': 0, 'refolds': 0,
+                      'max_pending': 0, 'lag_seconds': 0.0}
+
+    def start(self):
+        # справочники и база orders.parquet; до первой публикации, один раз
+        if self.started:
+            return
+        self._load_dimensions()
+        self._fold_base()
+        self.started = True
+        self.dirty = True
+
+    def run(self, stop=None, max_cycles=None):
+        # stop - threading.Event, max_cycles - для тестов и разовых догонов
+        self.start()
+        cycles = 0
+        try:
+            while not (stop is not None and stop.is_set()):
+                folded = self.cycle()
+                cycles += 1
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
+                # отстаем - следующий цикл сразу, иначе ждем новые части
+                if not folded or not self.pending:
+                    if stop is not None:
+                        stop.wait(self.poll_interval)
+                    else:
+                        time.sleep(self.poll_interval)
+        finally:
+            if self.dirty:
+                self.publish()
+
+    def cycle(self):
+        # опрос, досчет не больше max_files_per_cycle частей, публикация по расписанию
+        self.stats['cycles'] += 1
+        if self._dimensions_changed():
+            self._refold()
+
+        self._poll()
+        folded = 0
+        while self.pending and folded < self.max_files_per_cycle:
+            self._fold(self.pending.popleft())
+            folded += 1
+
+        now = time.monotonic()
+        if self.dirty and (self.last_publish is None or now - self.last_publish >= self.publish_interval):
+            self.publish()
+        return folded
+
+    def publish(self):
+        # атомарная замена result.parquet / result.csv (+ приемники S3) и статус с отставанием
+        result = self.aggregator.top_n(self.stores_df, n=self.etl.top_n, dimension=self.dimension)
+        sinks = [
+            ParquetFileSink(self.etl.output_dir / 'result.parquet', **self.etl.parquet_options),
+            CsvFileSink(self.etl.output_dir / 'result.csv'),
+            *self.extra_sinks,
+        ]
+        ResultWriter(sinks, profiler=StageProfiler()).write(result)
+        self._write_quarantine()
+
+        self.last_publish = time.monotonic()
+        self.dirty = False
+        self.stats['publishes'] += 1
+        status = {
+            'published_at': datetime.now().isoformat(),
+            'result_records': len(result),
+            'pending': len(self.pending),
+            'parts': len(self.done),
+            **self.stats,
+        }
+        if self.etl.validator is not None:
+            status['validation'] = self.etl.validator.report.to_dict()
+        with AtomicFile(self.etl.output_dir / STATUS_FILE) as f:
+            f.write(json.dumps(status, indent=2, ensure_ascii=False).encode('utf-8'))
+        logger.info(f"Опубликовано: {len(result)} строк, частей {len(self.done)}, заказов {self.aggregator.rows}, "
+                    f"в очереди {len(self.pending)}, отставание {self.stats['lag_seconds']:.1f} с")
+        return result
+
+    def _write_quarantine(self):
+        validator = self.etl.validator
+        if validator is None or not validator.quarantined_rows:
+            return
+        suffix = f"-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        for path in validator.write_quarantine(self.etl.output_dir / 'quarantine', suffix=suffix):
+            self.quarantine_files.append(path)
+            logger.info(f"Карантин сохранен: {path}")
+        validator.quarantined_rows.clear()
+
+    def _poll(self):
+        # новые части в порядке появления, очередь не длиннее max_pending
+        free = self.max_pending - len(self.pending)
+        if free <= 0:
+            return
+        new = sorted((part for part in self.source.list() if part.name not in self.seen),
+                     key=lambda part: (part.modified, part.name))
+        if len(new) > free:
+            logger.warning(f"Очередь частей заполнена: ждут {len(new) - free}")
+        for part in new[:free]:
+            self.seen.add(part.name)
+            self.pending.append(part)
+        self.stats['max_pending'] = max(self.stats['max_pending'], len(self.pending))
+
+    def _fold(self, part):
+        rows = 0
+        for batch in self.source.read(part):
+            rows += self._update(batch)
+        self.done.append(part)
+        self.dirty = True
+        self.stats['files'] += 1
+        self.stats['bytes'] += part.size
+        self.stats['rows'] += rows
+        self.stats['lag_seconds'] = round(max(time.time() - part.modified, 0.0), 3)
+
+    def _update(self, batch):
+        if self.etl.validator is not None:
+            batch = self.etl.validator.validate_orders(batch)
+        self.aggregator.update(batch[self.eligible.contains(batch['user_id'])])
+        return len(batch)
+
+    def _fold_base(self):
+        base_path = self.etl.input_dir / 'orders.parquet'
+        if base_path.exists():
+            for batch in self.etl._iter_orders(pq.ParquetFile(base_path)):
+                self.aggregator.update(batch[self.eligible.contains(batch['user_id'])])
+
+    def _refold(self):
+        # справочники изменились - суммы считаются заново по базе и всем частям
+        logger.info("Справочники изменились, пересчет всех частей")
+        # отчет и карантин с нуля: иначе строки уже учтенных частей посчитались бы дважды
+        if self.etl.validator is not None:
+            self.etl.validator = self.etl.validator.fresh()
+        for path in self.quarantine_files:
+            path.unlink(missing_ok=True)
+        self.quarantine_files = []
+        self._load_dimensions()
+        self.aggregator = StoreAggregator()
+        self._fold_base()
+        for part in self.done:
+            for batch in self.source.read(part):
+                self._update(batch)
+        self.dirty = True
+        self.stats['refolds'] += 1
+
+    def _load_dimensions(self):
+        stores_df, users_df = self.etl.extract_dimensions()
+        self.stores_df, users_df, _ = self.etl.validate(stores_df, users_df)
+        self.dimension = StoreDimension(self.stores_df)
+        self.eligible = EligibleUsers.from_users(users_df, self.etl.target_year)
+        self.fingerprints = self._dimension_fingerprints()
+
+    def _dimension_fingerprints(self):
+        return {name: parquet_fingerprint(self.etl.input_dir / name) for name in ('stores.parquet', 'users.parquet')}
+
+    def _dimensions_changed(self):
+        return self._dimension_fingerprints() != self.fingerprints
+
+
+def _complete_parquet(path):
+    # файл дописан: в конце magic parquet (писатель без атомарной замены еще не закончил - нет)
+    try:
+        with open(path, 'rb') as f:
+            f.seek(-4, 2)
+            return f.read(4) == PARQUET_MAGIC
+    except OSError:
+        return False
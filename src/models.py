@@ -3,10 +3,12 @@
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 
-@dataclass
+@dataclass(slots=True)
 class Store:
     # магазин
     id: int
@@ -37,7 +39,7 @@ class Store:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     # юзер
     id: int
@@ -57,8 +59,11 @@ class User:
     def registration_year(self):
         return self.created_at.year
     
+    def is_registered_in(self, year: int) -> bool:
+        return self.registration_year == year
+
     def is_registered_in_2025(self) -> bool:
-        return self.registration_year == 2025
+        return self.is_registered_in(2025)
     
     @classmethod
     def from_dict(cls, data: dict):
@@ -78,7 +83,7 @@ class User:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     # заказ
     id: int
@@ -123,7 +128,7 @@ class Order:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class Result:
     # результат
     city: str
@@ -153,3 +158,188 @@ class Result:
             'target_amount': self.target_amount
         }
 
+
+# колоночные контейнеры: поля лежат в типизированных массивах, а не в объекте на каждую запись
+# виды колонок: int - int64, float - float64, datetime - int64 наносекунды,
+# category - pd.Categorical (коды + словарь), string - pyarrow StringArray
+
+
+class RecordView:
+    # легкая строка-представление батча: только ссылка на батч и номер строки
+    __slots__ = ('_batch', '_index')
+
+    def __init__(self, batch, index):
+        self._batch = batch
+        self._index = index
+
+    def __getattr__(self, name):
+        if name not in self._batch.COLUMNS:
+            raise AttributeError(name)
+        return self._batch.value(name, self._index)
+
+    def to_dict(self):
+        return {name: self._batch.value(name, self._index) for name in self._batch.COLUMNS}
+
+    def to_model(self):
+        # полноценный объект модели с проверками __post_init__
+        return self._batch.MODEL(**self.to_dict())
+
+    def __repr__(self):
+        return f"{type(self._batch).__name__}[{self._index}]({self.to_dict()})"
+
+
+class RecordBatch:
+    # база для OrderBatch / UserBatch
+    COLUMNS = {}
+    MODEL = None
+
+    __slots__ = ('columns',)
+
+    def __init__(self, columns):
+        self.columns = {name: self._coerce(kind, columns[name]) for name, kind in self.COLUMNS.items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"колонки разной длины: {lengths}")
+
+    @staticmethod
+    def _coerce(kind, values):
+        # приведение к типу хранения; без копии, если тип уже подходит
+        if kind == 'int':
+            return np.asarray(values, dtype=np.int64)
+        if kind == 'float':
+            return np.asarray(values, dtype=np.float64)
+        if kind == 'datetime':
+            if isinstance(values, np.ndarray) and values.dtype == np.int64:
+                return values
+            return np.asarray(pd.DatetimeIndex(values).as_unit('ns').asi8)
+        if kind == 'category':
+            return values if isinstance(values, pd.Categorical) else pd.Categorical(values)
+        if isinstance(values, pa.ChunkedArray):
+            values = values.combine_chunks()
+        if not isinstance(values, pa.Array):
+            values = pa.array(values, from_pandas=True)
+        return values.cast(pa.string())
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return RecordView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield RecordView(self, index)
+
+    def value(self, name, index):
+        # одно значение колонки в python-типе
+        values = self.columns[name]
+        kind = self.COLUMNS[name]
+        if kind == 'datetime':
+            return None if values[index] == np.iinfo(np.int64).min else pd.Timestamp(values[index])
+        if kind == 'category':
+            code = values.codes[index]
+            return None if code < 0 else values.categories[code]
+        if kind == 'string':
+            return values[index].as_py()
+        return values[index].item()
+
+    @property
+    def nbytes(self):
+        total = 0
+        for name, values in self.columns.items():
+            if self.COLUMNS[name] == 'category':
+                total += values.codes.nbytes
+            else:
+                total += values.nbytes
+        return total
+
+    @classmethod
+    def from_records(cls, records):
+        # из списка моделей (или dict'ов)
+        rows = [record if isinstance(record, dict) else record.to_dict() for record in records]
+        return cls({name: [row[name] for row in rows] for name in cls.COLUMNS})
+
+    @classmethod
+    def from_pandas(cls, df):
+        return cls({name: df[name].array if cls.COLUMNS[name] == 'category' else df[name]
+                    for name in cls.COLUMNS})
+
+    @classmethod
+    def from_arrow(cls, table):
+        columns = {}
+        for name, kind in cls.COLUMNS.items():
+            column = table.column(name)
+            if kind == 'datetime':
+                column = column.cast(pa.timestamp('ns')).cast(pa.int64()).to_numpy()
+            elif kind in ('int', 'float'):
+                column = column.to_numpy()
+            elif kind == 'category':
+                column = column.to_pandas().array
+            columns[name] = column
+        return cls(columns)
+
+    def to_pandas(self):
+        data = {}
+        for name, kind in self.COLUMNS.items():
+            values = self.columns[name]
+            if kind == 'datetime':
+                values = values.view('datetime64[ns]')
+            elif kind == 'string':
+                values = values.to_pandas()
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        arrays = {}
+        for name, kind in self.COLUMNS.items():
+            values = self.columns[name]
+            if kind == 'datetime':
+                arrays[name] = pa.array(values.view('datetime64[ns]'))
+            elif kind == 'category':
+                arrays[name] = pa.DictionaryArray.from_arrays(
+                    pa.array(values.codes, mask=values.codes < 0), pa.array(values.categories.to_numpy())
+                )
+            elif kind == 'string':
+                arrays[name] = values
+            else:
+                arrays[name] = pa.array(values)
+        return pa.table(arrays)
+
+
+class OrderBatch(RecordBatch):
+    # заказы колонками
+    COLUMNS = {
+        'id': 'int',
+        'amount': 'float',
+        'user_id': 'int',
+        'store_id': 'int',
+        'status': 'category',
+        'created_at': 'datetime',
+    }
+    MODEL = Order
+
+    __slots__ = ()
+
+
+class UserBatch(RecordBatch):
+    # пользователи колонками
+    COLUMNS = {
+        'id': 'int',
+        'name': 'string',
+        'phone': 'string',
+        'created_at': 'datetime',
+    }
+    MODEL = User
+
+    __slots__ = ()
+
+    def registered_in(self, year):
+        # маска пользователей года year, без создания объектов
+        start = pd.Timestamp(year, 1, 1).value
+        end = pd.Timestamp(year + 1, 1, 1).value
+        created_at = self.columns['created_at']
+        return (created_at >= start) & (created_at < end)
@@ -0,0 +1,159 @@
+# параллельный режим: row group'ы orders.parquet агрегируются в пуле процессов
+# задача - row group целиком (его читает воркер) или, если row group'ов меньше чем процессов,
+# диапазон строк row group'а: такой row group один раз читается здесь и кладется в shared memory,
+# воркеры считают свои диапазоны из нее - иначе файл с одним row group'ом шел бы в один процесс
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from dimensions import EligibleUsers
+
+
+ORDERS_COLUMNS = ['user_id', 'store_id', 'amount']
+STAGED_DTYPES = [np.int64, np.int64, np.float64]
+# row group меньше этого на диапазоны не делится - накладные расходы задачи больше выигрыша
+MIN_TASK_ROWS = 100_000
+
+# состояние процесса-воркера, заполняется в _init_worker один раз на процесс
+_worker = {}
+
+
+def _init_worker(shm_name, shape, dtype, dense, dimension, validator):
+    # подключаемся к маске пользователей в shared memory, без копирования в каждую задачу
+    shm = shared_memory.SharedMemory(name=shm_name)
+    backing = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    _worker['shm'] = shm
+    _worker['eligible'] = EligibleUsers.from_backing(backing, dense)
+    _worker['dimension'] = dimension
+    _worker['validator'] = validator
+    _worker['files'] = {}
+
+
+def _aggregate_row_group(orders_path, row_group):
+    # фильтр + частичные суммы по группам магазинов для одного row group
+    files = _worker['files']
+    if orders_path not in files:
+        files[orders_path] = pq.ParquetFile(orders_path)
+
+    table = files[orders_path].read_row_group(row_group, columns=ORDERS_COLUMNS)
+    return _aggregate(*(table.column(column).to_numpy() for column in ORDERS_COLUMNS))
+
+
+def _aggregate_rows(shm_name, rows, start, stop):
+    # то же для диапазона строк row group'а, выложенного в shared memory (_stage)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    columns = _staged_columns(shm, rows)
+    try:
+        return _aggregate(*(column[start:stop] for column in columns))
+    finally:
+        del columns
+        shm.close()
+
+
+def _aggregate(user_ids, store_ids, amounts):
+    # фильтр + частичные суммы по группам магазинов
+    # с проверкой - еще отчет и карантин заказов задачи, они складываются в процессе-родителе
+    checked = None
+    if _worker['validator'] is not None:
+        validator = _worker['validator'].fresh()
+        orders = pd.DataFrame(dict(zip(ORDERS_COLUMNS, (user_ids, store_ids, amounts))))
+        orders = validator.validate_orders(orders)
+        user_ids, store_ids, amounts = (orders[column].to_numpy() for column in ORDERS_COLUMNS)
+        checked = (validator.report, validator.quarantined_rows)
+
+    mask = _worker['eligible'].contains(user_ids)
+    dimension = _worker['dimension']
+    totals, counts = dimension.aggregate(dimension.codes(store_ids[mask]), amounts[mask])
+    return totals, counts, int(mask.sum()), checked
+
+
+def _staged_columns(shm, rows):
+    # user_id, store_id, amount подряд, по 8 байт на значение
+    return [np.ndarray((rows,), dtype=dtype, buffer=shm.buf, offset=index * rows * 8)
+            for index, dtype in enumerate(STAGED_DTYPES)]
+
+
+def _stage(orders_file, row_group):
+    # row group в shared memory для задач-диапазонов
+    table = orders_file.read_row_group(row_group, columns=ORDERS_COLUMNS)
+    shm = shared_memory.SharedMemory(create=True, size=max(table.num_rows * 8 * len(ORDERS_COLUMNS), 1))
+    columns = _staged_columns(shm, table.num_rows)
+    for column, name in zip(columns, ORDERS_COLUMNS):
+        column[:] = table.column(name).to_numpy()
+    del columns
+    return shm
+
+
+def plan_tasks(row_group_rows, workers, min_task_rows=MIN_TASK_ROWS):
+    # (row_group, start, stop) для диапазонов или (row_group, None, None) для row group'а целиком
+    # row group'ы делятся, только если их меньше чем процессов
+    splits = -(-workers // max(len(row_group_rows), 1))
+    tasks = []
+    for row_group, rows in enumerate(row_group_rows):
+        parts = min(splits, rows // min_task_rows) if splits > 1 else 1
+        if parts <= 1:
+            tasks.append((row_group, None, None))
+            continue
+        bounds = np.linspace(0, rows, parts + 1).astype(np.int64)
+        tasks.extend((row_group, int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]))
+    return tasks
+
+
+def aggregate_parallel(orders_path, eligible, dimension, workers=None, min_task_rows=MIN_TASK_ROWS,
+                       validator=None):
+    # частичные суммы считаются по row group'ам (или их диапазонам) в процессах и складываются здесь
+    # validator - DataValidator: заказы проверяются в воркерах, отчеты складываются в него
+    # возвращает (totals, counts, кол-во отфильтрованных заказов)
+
+    orders_path = str(orders_path)
+    orders_file = pq.ParquetFile(orders_path)
+    workers = workers or os.cpu_count() or 1
+    row_group_rows = [orders_file.metadata.row_group(i).num_rows for i in range(orders_file.num_row_groups)]
+    tasks = plan_tasks(row_group_rows, workers, min_task_rows)
+
+    backing = eligible.backing
+    shm = shared_memory.SharedMemory(create=True, size=max(backing.nbytes, 1))
+    # row group'ы задач-диапазонов; их меньше чем процессов, в памяти они держатся до конца
+    staged = {}
+    try:
+        np.ndarray(backing.shape, dtype=backing.dtype, buffer=shm.buf)[:] = backing
+
+        totals = np.zeros(dimension.num_groups, dtype=np.float64)
+        counts = np.zeros(dimension.num_groups, dtype=np.int64)
+        rows = 0
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, max(len(tasks), 1)),
+            initializer=_init_worker,
+            initargs=(shm.name, backing.shape, backing.dtype.str, eligible.dense, dimension,
+                      validator.fresh() if validator is not None else None)
+        ) as pool:
+            futures = []
+            for row_group, start, stop in tasks:
+                if start is None:
+                    futures.append(pool.submit(_aggregate_row_group, orders_path, row_group))
+                    continue
+                if row_group not in staged:
+                    staged[row_group] = _stage(orders_file, row_group)
+                futures.append(pool.submit(_aggregate_rows, staged[row_group].name,
+                                           row_group_rows[row_group], start, stop))
+            # складываем в порядке задач - результат не зависит от планировщика
+            for future in futures:
+                part_totals, part_counts, part_rows, checked = future.result()
+                if checked is not None:
+                    validator.merge(*checked)
+                totals += part_totals
+                counts += part_counts
+                rows += part_rows
+
+        return totals, counts, rows
+    finally:
+        for block in [shm, *staged.values()]:
+            block.close()
+            block.unlink()
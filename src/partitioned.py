@@ -0,0 +1,182 @@
+# секционированный результат: <root>/city=<город>/run_date=<дата>/part-0.parquet + _manifest.json
+# внутри файла строки отсортированы по store_name (sorting_columns), есть min/max статистика,
+# page index и по желанию bloom filter - читатель отбрасывает лишние секции и row group'ы
+
+from datetime import date, datetime
+import hashlib
+import inspect
+import json
+import logging
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from writers import PARQUET_OPTIONS, AtomicFile
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = '_manifest.json'
+PART_FILE = 'part-0.parquet'
+
+# page index, sorting_columns и особенно bloom filter есть только в новых pyarrow (requirements: >=12),
+# неподдерживаемые опции не передаются, файл пишется без них
+WRITER_OPTIONS = set(inspect.signature(pq.ParquetWriter.__init__).parameters)
+if not hasattr(pq, 'SortingColumn'):
+    WRITER_OPTIONS.discard('sorting_columns')
+
+
+def load_manifest(root):
+    path = root / MANIFEST_FILE
+    if not path.exists():
+        return {'files': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def partition_path(city, run_date):
+    # как у pyarrow hive partitioning (segment_encoding='uri'): кириллица и пробелы кодируются
+    return f"city={quote(city, safe='')}/run_date={run_date}"
+
+
+class PartitionedParquetSink:
+    # приемник для ResultWriter: один файл на (город, дата запуска)
+    # секции, которые не изменились с прошлой записи этой даты, не переписываются
+
+    stage = 'write_partitioned'
+
+    def __init__(self, root, run_date=None, sort_by='store_name', bloom_filter=False, **options):
+        self.root = root
+        self.run_date = str(run_date or date.today())
+        self.sort_by = sort_by
+        self.bloom_filter = bloom_filter
+        self.options = {**PARQUET_OPTIONS, **options}
+        self.skipped = 0
+
+        wanted = ['write_page_index'] + ['sorting_columns'] * bool(sort_by) + ['bloom_filter_options'] * bloom_filter
+        missing = [name for name in wanted if name not in WRITER_OPTIONS]
+        if missing:
+            logger.warning(f"pyarrow {pa.__version__} не поддерживает {missing}, секции пишутся без них")
+
+    def write(self, table):
+        table = _decode_dictionaries(table)
+        manifest = load_manifest(self.root)
+        previous = {(item['city'], item['run_date']): item for item in manifest['files']}
+        entries = [item for item in manifest['files'] if item['run_date'] != self.run_date]
+
+        written = 0
+        for city in sorted(pc.unique(table['city']).to_pylist()):
+            part = table.filter(pc.equal(table['city'], city)).drop_columns(['city'])
+            if self.sort_by:
+                part = part.sort_by(self.sort_by)
+            entry = self._entry(city, part)
+
+            old = previous.get((city, self.run_date))
+            if old is not None and old['checksum'] == entry['checksum'] and (self.root / old['path']).exists():
+                entries.append(old)
+                self.skipped += 1
+                continue
+
+            path = self.root / entry['path']
+            with AtomicFile(path) as f:
+                pq.write_table(part, f, **self._write_options(part))
+            entry['bytes'] = path.stat().st_size
+            written += entry['bytes']
+            entries.append(entry)
+
+        # манифест пишется последним: пока он не заменен, читатели видят прежний набор файлов
+        manifest = {
+            'updated_at': datetime.now().isoformat(),
+            'latest_run_date': max(item['run_date'] for item in entries) if entries else None,
+            'files': sorted(entries, key=lambda item: (item['run_date'], item['city'])),
+        }
+        with AtomicFile(self.root / MANIFEST_FILE) as f:
+            f.write(json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+
+        # города, которых больше нет в результате этой даты
+        current = {item['path'] for item in entries}
+        for item in previous.values():
+            if item['run_date'] == self.run_date and item['path'] not in current:
+                (self.root / item['path']).unlink(missing_ok=True)
+        return written
+
+    def _write_options(self, part):
+        options = dict(self.options)
+        if 'write_page_index' in WRITER_OPTIONS:
+            options['write_page_index'] = True
+        if self.sort_by and 'sorting_columns' in WRITER_OPTIONS:
+            options['sorting_columns'] = [pq.SortingColumn(part.schema.get_field_index(self.sort_by))]
+        if self.bloom_filter and 'bloom_filter_options' in WRITER_OPTIONS:
+            options['bloom_filter_options'] = {'store_name': {'ndv': max(part.num_rows, 1), 'fpp': 0.01}}
+        return options
+
+    def _entry(self, city, part):
+        # запись манифеста: путь, число строк, min/max и контрольная сумма содержимого
+        entry = {
+            'city': city,
+            'run_date': self.run_date,
+            'path': f'{partition_path(city, self.run_date)}/{PART_FILE}',
+            'rows': part.num_rows,
+            'checksum': _checksum(part),
+        }
+        for column in ('store_name', 'target_amount'):
+            if column in part.column_names and part.num_rows:
+                bounds = pc.min_max(part[column])
+                entry[f'{column}_min'] = bounds['min'].as_py()
+                entry[f'{column}_max'] = bounds['max'].as_py()
+        return entry
+
+
+def read_partitioned(root, cities=None, run_date='latest', store_names=None, min_amount=None, columns=None):
+    # чтение с отсечением: секции по манифесту (город, дата, min/max),
+    # row group'ы - по статистике parquet через фильтр dataset
+    manifest = load_manifest(root)
+    if run_date == 'latest':
+        run_date = manifest.get('latest_run_date')
+
+    files = []
+    for item in manifest['files']:
+        if run_date is not None and item['run_date'] != str(run_date):
+            continue
+        if cities is not None and item['city'] not in cities:
+            continue
+        if store_names is not None and 'store_name_min' in item and not any(
+                item['store_name_min'] <= name <= item['store_name_max'] for name in store_names):
+            continue
+        if min_amount is not None and item.get('target_amount_max', min_amount) < min_amount:
+            continue
+        files.append(str(root / item['path']))
+
+    if not files:
+        return pd.DataFrame(columns=columns or ['store_name', 'target_amount', 'city', 'run_date'])
+
+    expression = None
+    if store_names is not None:
+        expression = ds.field('store_name').isin(list(store_names))
+    if min_amount is not None:
+        amount = ds.field('target_amount') >= min_amount
+        expression = amount if expression is None else expression & amount
+
+    dataset = ds.dataset(files, format='parquet', partitioning='hive', partition_base_dir=str(root))
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def _decode_dictionaries(table):
+    # сортировка и фильтры pyarrow не работают со словарями - приводим к строкам
+    for index, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(field.type.value_type))
+    return table
+
+
+def _checksum(part):
+    # содержимое секции, без метаданных файла
+    digest = hashlib.sha256()
+    for column in part.column_names:
+        digest.update(column.encode('utf-8'))
+        digest.update(str(part[column].to_pylist()).encode('utf-8'))
+    return digest.hexdigest()
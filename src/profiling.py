@@ -0,0 +1,88 @@
+# замеры по этапам ETL: wall/cpu время, память, скорость
+
+from contextlib import contextmanager
+import cProfile
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def peak_rss_mb():
+    # пиковый RSS процесса
+    # на linux берем VmHWM: ru_maxrss наследуется через fork/exec от родителя
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # ru_maxrss на linux в КБ, на macOS в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+class StageProfiler:
+    # собирает записи по этапам для metrics JSON
+    # trace_memory включает tracemalloc: точнее по памяти, но заметно медленнее
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None, nbytes=None):
+        # rows/bytes можно указать заранее или записать в возвращаемый dict внутри with
+        record = {'stage': name, 'rows': rows, 'bytes': nbytes}
+
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            record['wall_seconds'] = round(wall, 6)
+            record['cpu_seconds'] = round(time.process_time() - cpu_start, 6)
+            record['peak_rss_mb'] = round(peak_rss_mb(), 2)
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                record['tracemalloc_peak_delta_mb'] = round((peak - memory_before) / 1024 / 1024, 3)
+                if started_tracing:
+                    tracemalloc.stop()
+            if record['rows'] is not None and wall > 0:
+                record['rows_per_second'] = round(record['rows'] / wall, 1)
+            if record['bytes'] is not None and wall > 0:
+                record['bytes_per_second'] = round(record['bytes'] / wall, 1)
+
+            with self._lock:
+                self.stages.append(record)
+
+
+@contextmanager
+def cprofile_to(path):
+    # cProfile всего блока с сохранением в файл (смотреть через snakeviz / pstats)
+    if path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
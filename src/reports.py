@@ -0,0 +1,220 @@
+# параметризованные отчеты топ-N: несколько отчетов за один проход по заказам
+# чтение общее (объединение нужных колонок), фильтры общие: маска пользователей года
+# и коды магазинов считаются один раз на батч для всех отчетов, которым они нужны
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from dimensions import EligibleUsers, StoreDimension
+from dtypes import read_dictionary
+
+
+DIMENSIONS = ('city', 'store', 'status', 'month')
+MEASURES = ('sum', 'count', 'mean')
+
+# колонка заказов, из которой берется измерение, и имя колонки в отчете
+DIMENSION_SOURCES = {'city': 'store_id', 'store': 'store_id', 'status': 'status', 'month': 'created_at'}
+DIMENSION_NAMES = {'city': 'city', 'store': 'store_name', 'status': 'status', 'month': 'month'}
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    # отчет: группировка, мера по amount, фильтры и топ-N
+    name: str
+    group_by: tuple = ('city', 'store')
+    measure: str = 'sum'
+    top_n: Optional[int] = None        # топ-N внутри первого измерения (или всего, если оно одно)
+    target_year: Optional[int] = None  # год регистрации пользователя, None - все пользователи
+    date_from: Optional[str] = None    # период заказов [date_from, date_to)
+    date_to: Optional[str] = None
+    column: Optional[str] = None       # имя колонки меры, по умолчанию <measure>_amount
+
+    def __post_init__(self):
+        object.__setattr__(self, 'group_by', tuple(self.group_by))
+        if not self.name or not self.name.strip():
+            raise ValueError("Название отчета пустое")
+        if not self.group_by:
+            raise ValueError("Не задана группировка")
+        unknown = set(self.group_by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Неизвестные измерения: {sorted(unknown)}, доступны: {DIMENSIONS}")
+        if self.measure not in MEASURES:
+            raise ValueError(f"Неизвестная мера: {self.measure}, доступны: {MEASURES}")
+        if self.top_n is not None and self.top_n <= 0:
+            raise ValueError("top_n должен быть больше нуля")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+    @property
+    def value_column(self):
+        return self.column or f'{self.measure}_amount'
+
+    @property
+    def order_columns(self):
+        # какие колонки заказов нужны отчету
+        columns = {'amount'} | {DIMENSION_SOURCES[dim] for dim in self.group_by}
+        if self.target_year is not None:
+            columns.add('user_id')
+        if self.date_from is not None or self.date_to is not None:
+            columns.add('created_at')
+        return columns
+
+
+class ReportRunner:
+    # считает набор ReportSpec за одно чтение orders
+
+    def __init__(self, stores_df, users_df):
+        # users_df - все пользователи (id, created_at): у отчетов могут быть разные годы
+        self.dimension = StoreDimension(stores_df)
+        self.users_df = users_df
+        self._eligible = {}
+        self._statuses = {}
+
+    def run(self, specs, orders, batch_size=1_000_000, validator=None):
+        # orders - путь к parquet (читается батчами) или DataFrame
+        # validator - DataValidator: каждый батч проверяется до агрегации
+        # возвращает {название: DataFrame}
+        columns = sorted(set().union(*(spec.order_columns for spec in specs)))
+        partials = {spec.name: [] for spec in specs}
+        rows = 0
+
+        for batch in self._batches(orders, columns, batch_size):
+            rows += len(batch)
+            if validator is not None:
+                batch = validator.validate_orders(batch)
+            shared = {}
+            for spec in specs:
+                partial = self._aggregate(spec, batch, shared)
+                if len(partial):
+                    partials[spec.name].append(partial)
+
+        self.rows = rows
+        return {spec.name: self._finish(spec, partials[spec.name]) for spec in specs}
+
+    @staticmethod
+    def _batches(orders, columns, batch_size):
+        if isinstance(orders, pd.DataFrame):
+            yield orders[columns]
+            return
+        orders_file = pq.ParquetFile(orders, read_dictionary=read_dictionary('orders', columns))
+        for batch in orders_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+    def _shared(self, shared, key, compute):
+        # маски и коды, общие для отчетов в пределах батча
+        if key not in shared:
+            shared[key] = compute()
+        return shared[key]
+
+    def _eligible_users(self, year):
+        if year not in self._eligible:
+            self._eligible[year] = EligibleUsers.from_users(self.users_df, year)
+        return self._eligible[year]
+
+    def _mask(self, spec, batch, shared):
+        mask = np.ones(len(batch), dtype=bool)
+        if spec.target_year is not None:
+            mask &= self._shared(shared, ('year', spec.target_year),
+                                 lambda: self._eligible_users(spec.target_year).contains(batch['user_id']))
+        if spec.date_from is not None or spec.date_to is not None:
+            mask &= self._shared(shared, ('period', spec.date_from, spec.date_to),
+                                 lambda: _period_mask(batch['created_at'], spec.date_from, spec.date_to))
+        for dim in spec.group_by:
+            if dim in ('city', 'store'):
+                # как inner join с магазинами: заказы неизвестных магазинов не учитываются
+                mask &= self._codes('store', batch, shared) >= 0
+        return mask
+
+    def _codes(self, dim, batch, shared):
+        # целочисленные коды измерения для строк батча
+        if dim == 'store':
+            return self._shared(shared, 'store', lambda: self.dimension.codes(batch['store_id']))
+        if dim == 'city':
+            def compute():
+                stores = self._codes('store', batch, shared)
+                return np.where(stores >= 0, self.dimension.cities.codes[stores], -1)
+            return self._shared(shared, 'city', compute)
+        if dim == 'status':
+            return self._shared(shared, 'status', lambda: self._status_codes(batch['status']))
+        return self._shared(shared, 'month', lambda: _month_codes(batch['created_at']))
+
+    def _status_codes(self, statuses):
+        # коды статусов, единые для всех батчей
+        codes, uniques = pd.factorize(statuses, use_na_sentinel=False)
+        mapping = np.array([self._statuses.setdefault(value, len(self._statuses)) for value in uniques],
+                           dtype=np.int64)
+        return mapping[codes]
+
+    def _aggregate(self, spec, batch, shared):
+        # частичные суммы и количества батча по кодам измерений
+        mask = self._mask(spec, batch, shared)
+        frame = pd.DataFrame({dim: self._codes(dim, batch, shared)[mask] for dim in spec.group_by})
+        frame['amount'] = batch['amount'].to_numpy(dtype=np.float64)[mask]
+        return frame.groupby(list(spec.group_by), sort=False)['amount'].agg(['sum', 'count'])
+
+    def _finish(self, spec, partials):
+        names = [DIMENSION_NAMES[dim] for dim in spec.group_by]
+        if not partials:
+            return pd.DataFrame(columns=names + [spec.value_column])
+
+        groups = pd.concat(partials).groupby(level=list(range(len(spec.group_by))), sort=False).sum()
+        if spec.measure == 'sum':
+            values = groups['sum'].to_numpy(dtype=np.float64)
+        elif spec.measure == 'count':
+            values = groups['count'].to_numpy(dtype=np.int64)
+        else:
+            values = groups['sum'].to_numpy(dtype=np.float64) / groups['count'].to_numpy()
+
+        keys = groups.index.to_frame(index=False)
+        result = pd.DataFrame({
+            DIMENSION_NAMES[dim]: self._decode(dim, keys[dim].to_numpy()) for dim in spec.group_by
+        })
+        result[spec.value_column] = values
+        return _order(result, names, spec)
+
+    def _decode(self, dim, codes):
+        # коды обратно в значения
+        if dim == 'city':
+            return self.dimension.cities.categories.to_numpy()[codes]
+        if dim == 'store':
+            return np.asarray(self.dimension.names)[codes]
+        if dim == 'status':
+            return np.array(list(self._statuses), dtype=object)[codes]
+        return codes.astype('datetime64[M]').astype(str)
+
+
+def _period_mask(created_at, date_from, date_to):
+    mask = np.ones(len(created_at), dtype=bool)
+    if date_from is not None:
+        mask &= (created_at >= pd.Timestamp(date_from)).to_numpy()
+    if date_to is not None:
+        mask &= (created_at < pd.Timestamp(date_to)).to_numpy()
+    return mask
+
+
+def _month_codes(created_at):
+    # месяцев от 1970-01
+    return created_at.to_numpy().astype('datetime64[M]').astype(np.int64)
+
+
+def _order(result, names, spec):
+    # первое измерение по алфавиту, внутри по убыванию меры, при равенстве - по остальным измерениям;
+    # для group_by=(city, store), sum, top_n=3 это ровно основной результат ETL
+    value = spec.value_column
+    result = result.sort_values(names, kind='stable')
+    if spec.top_n is not None:
+        if len(names) > 1:
+            result = result.sort_values([names[0], value], ascending=[True, False], kind='stable')
+            result = result[result.groupby(names[0], sort=False).cumcount() < spec.top_n]
+        else:
+            result = result.sort_values(value, ascending=False, kind='stable').head(spec.top_n)
+
+    for name in names:
+        result[name] = pd.Categorical(result[name].to_numpy())
+    return result.reset_index(drop=True)
@@ -0,0 +1,151 @@
+# кеш результатов ETL по содержимому входа: ключ = отпечаток входных parquet + параметры расчета
+# отпечаток файла - md5 всего содержимого; md5 хранится рядом с файлом по (size, mtime_ns),
+# поэтому большой файл перечитывается только после изменения
+# в кеше лежат результат и суммы всех групп (city, name): другой top_n считается из них без ETL
+
+from datetime import datetime
+import hashlib
+import json
+import shutil
+import time
+
+import pandas as pd
+
+from writers import AtomicFile
+
+
+INDEX_FILE = 'index.json'
+# md5 файлов каталога: {имя: {size, mtime_ns, md5}}, общий с InputSync
+CHECKSUM_FILE = '.checksums.json'
+# меняется, если меняется смысл результата при тех же входных данных
+CACHE_VERSION = 1
+
+
+def file_md5(path, state):
+    # md5 файла, пересчитывается только если поменялись размер или mtime; state обновляется
+    stat = path.stat()
+    cached = state.get(path.name)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['md5']
+
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            md5.update(chunk)
+
+    state[path.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'md5': md5.hexdigest()}
+    return md5.hexdigest()
+
+
+def load_checksums(directory):
+    try:
+        with open(directory / CHECKSUM_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def parquet_fingerprint(path):
+    # md5 содержимого: footer parquet не меняется, если значения переставлены без смены размеров страниц
+    state = load_checksums(path.parent)
+    cached = state.get(path.name)
+    checksum = file_md5(path, state)
+    if state.get(path.name) is not cached:
+        try:
+            with AtomicFile(path.parent / CHECKSUM_FILE) as f:
+                f.write(json.dumps(state, indent=2).encode('utf-8'))
+        except OSError:
+            # каталог только для чтения - md5 просто посчитается заново в следующий раз
+            pass
+    return checksum
+
+
+def s3_fingerprint(s3_client, bucket_name, s3_key):
+    # для S3 - ETag и размер из HEAD
+    head = s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+    return hashlib.sha256(f"{head['ETag']}:{head['ContentLength']}".encode()).hexdigest()
+
+
+class ResultCache:
+    # каталог <cache_dir>/<ключ>/<kind>.parquet + index.json с временем доступа и размером
+    # вытеснение LRU: по числу записей и суммарному размеру
+
+    def __init__(self, cache_dir, max_entries=32, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self._load_index()
+
+    @staticmethod
+    def key(fingerprints, params):
+        # fingerprints - {имя входа: отпечаток}, params - параметры, влияющие на результат
+        payload = json.dumps({'version': CACHE_VERSION, 'inputs': fingerprints, 'params': params},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def get(self, key, kind='result'):
+        # DataFrame или None; попадание обновляет время доступа
+        entry = self.index.get(self._entry_name(key, kind))
+        path = self._path(key, kind)
+        if entry is None or not path.exists():
+            return None
+
+        df = pd.read_parquet(path)
+        entry['last_access'] = time.time()
+        entry['hits'] = entry.get('hits', 0) + 1
+        self._save_index()
+        return df
+
+    def put(self, key, df, kind='result'):
+        path = self._path(key, kind)
+        with AtomicFile(path) as f:
+            df.to_parquet(f, index=False)
+
+        self.index[self._entry_name(key, kind)] = {
+            'key': key,
+            'kind': kind,
+            'bytes': path.stat().st_size,
+            'created_at': datetime.now().isoformat(),
+            'last_access': time.time(),
+            'hits': 0,
+        }
+        self._evict()
+        self._save_index()
+
+    @property
+    def total_bytes(self):
+        return sum(entry['bytes'] for entry in self.index.values())
+
+    def _evict(self):
+        # самые давно использованные записи, пока не влезем в лимиты
+        by_access = sorted(self.index, key=lambda name: self.index[name]['last_access'])
+        while by_access and (len(self.index) > self.max_entries or self.total_bytes > self.max_bytes):
+            name = by_access.pop(0)
+            entry = self.index.pop(name)
+            self._path(entry['key'], entry['kind']).unlink(missing_ok=True)
+            key_dir = self.cache_dir / entry['key']
+            if key_dir.exists() and not any(key_dir.iterdir()):
+                shutil.rmtree(key_dir, ignore_errors=True)
+
+    def _path(self, key, kind):
+        return self.cache_dir / key / f'{kind}.parquet'
+
+    @staticmethod
+    def _entry_name(key, kind):
+        return f'{key}/{kind}'
+
+    def _load_index(self):
+        path = self.cache_dir / INDEX_FILE
+        if not path.exists():
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # поврежденный индекс - кеш просто начинается заново
+            return {}
+
+    def _save_index(self):
+        with AtomicFile(self.cache_dir / INDEX_FILE) as f:
+            f.write(json.dumps(self.index, indent=2, ensure_ascii=False).encode('utf-8'))
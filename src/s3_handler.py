@@ -0,0 +1,184 @@
+# работа с S3 / MinIO: клиент с пулом соединений, чтение и запись parquet, параллельные передачи
+# отдельный модуль, чтобы boto3 импортировался только в s3 режиме
+
+import os
+from pathlib import Path
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from s3_io import S3RangeReader, S3MultipartWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+# значения по умолчанию для s3.transfer из config.yaml
+DEFAULT_TRANSFER = {
+    'max_workers': 8,
+    'max_pool_connections': 32,
+    'multipart_threshold_mb': 16,
+    'multipart_chunksize_mb': 8,
+    'max_concurrency': 4,
+}
+
+
+class S3Handler:
+    # работа с minio, s3
+    def __init__(self, endpoint, access_key, secret_key, bucket_name, io_mode='memory', transfer=None):
+        # io_mode: 'memory' - чтение/запись через буферы в памяти, 'tempfile' - через временные файлы
+        # transfer: настройки параллельных передач (s3.transfer в config.yaml)
+        self.endpoint = endpoint
+        self.bucket_name = bucket_name
+        self.io_mode = io_mode
+        # StageProfiler из etl_process, если задан - каждая передача пишется в метрики
+        self.profiler = None
+        
+        transfer = {**DEFAULT_TRANSFER, **(transfer or {})}
+        self.max_workers = transfer['max_workers']
+        self.transfer_config = TransferConfig(
+            multipart_threshold=transfer['multipart_threshold_mb'] * 1024 * 1024,
+            multipart_chunksize=transfer['multipart_chunksize_mb'] * 1024 * 1024,
+            max_concurrency=transfer['max_concurrency']
+        )
+        
+        # пул соединений должен покрывать все потоки: объекты x части одного объекта
+        self.s3_client = boto3.client(
+            's3',
+            endpoint_url=endpoint,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name='us-east-1',
+            config=Config(max_pool_connections=transfer['max_pool_connections'])
+        )
+        
+        logger.info(f"S3 клиент создан для {endpoint}")
+    
+    def _stage(self, name, **kwargs):
+        if self.profiler is None:
+            return nullcontext({})
+        return self.profiler.stage(name, **kwargs)
+        
+    def ensure_bucket_exists(self):
+        # создание бакета
+        try:
+            self.s3_client.head_bucket(Bucket=self.bucket_name)
+            logger.info(f"Bucket '{self.bucket_name}' уже существует")
+        except ClientError:
+            self.s3_client.create_bucket(Bucket=self.bucket_name)
+            logger.info(f"Bucket '{self.bucket_name}' создан")
+    
+    def upload_file(self, local_path, s3_key, metadata=None):
+        # Загрузка в s3
+        try:
+            extra_args = {'Metadata': metadata} if metadata else None
+            with self._stage(f's3_upload:{s3_key}', nbytes=Path(local_path).stat().st_size):
+                self.s3_client.upload_file(str(local_path), self.bucket_name, s3_key,
+                                           ExtraArgs=extra_args, Config=self.transfer_config)
+            logger.info(f"Загружено в S3: {s3_key}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки {local_path} в S3: {e}")
+            raise
+    
+    def download_file(self, s3_key, local_path):
+        # выгрузка из S3
+        try:
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            self.s3_client.download_file(self.bucket_name, s3_key, str(local_path),
+                                         Config=self.transfer_config)
+            logger.info(f"Скачано из S3: {s3_key} в {local_path}")
+        except Exception as e:
+            logger.error(f"Ошибка скачивания {s3_key} из S3: {e}")
+            raise
+    
+    def read_parquet_from_s3(self, s3_key, columns=None, filters=None):
+        # parquet из s3 в df
+        # columns/filters - проекция и фильтр, в режиме memory читаются только нужные куски объекта
+        try:
+            if self.io_mode == 'memory':
+                reader = S3RangeReader(self.s3_client, self.bucket_name, s3_key)
+                with self._stage(f's3_read:{s3_key}') as stage:
+                    df = pq.read_table(reader, columns=columns, filters=filters).to_pandas()
+                    stage['rows'] = len(df)
+                    stage['bytes'] = reader.bytes_read
+                logger.info(f"Прочитано из S3: {s3_key}, строк: {len(df)}, "
+                            f"GET запросов: {reader.requests}, байт: {reader.bytes_read} из {reader.size}")
+                return df
+
+            import tempfile
+            
+            #  cкачиваем во временный файл
+            with self._stage(f's3_read:{s3_key}') as stage:
+                with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
+                    self.s3_client.download_fileobj(self.bucket_name, s3_key, tmp,
+                                                    Config=self.transfer_config)
+                    tmp_path = tmp.name
+                
+                stage['bytes'] = os.path.getsize(tmp_path)
+                df = pd.read_parquet(tmp_path, columns=columns, filters=filters)
+                stage['rows'] = len(df)
+                os.remove(tmp_path)
+            
+            logger.info(f"Прочитано из S3: {s3_key}, строк: {len(df)}")
+            return df
+        except Exception as e:
+            logger.error(f"Ошибка чтения {s3_key} из S3: {e}")
+            raise
+    
+    def write_parquet_to_s3(self, df, s3_key):
+        # запись df в parquet в S3
+
+        try:
+            if self.io_mode == 'memory':
+                # parquet пишется сразу в multipart upload, без файла на диске
+                with self._stage(f's3_write:{s3_key}', rows=len(df)) as stage:
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    with S3MultipartWriter(self.s3_client, self.bucket_name, s3_key) as sink:
+                        pq.write_table(table, sink)
+                    stage['bytes'] = sink.bytes_written
+                logger.info(f"Записано в S3: {s3_key}, строк: {len(df)}, байт: {sink.bytes_written}")
+                return
+
+            # Сохраняем во временный файл
+            import tempfile
+            with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
+                df.to_parquet(tmp.name, index=False, engine='pyarrow')
+                tmp_path = tmp.name
+            
+            # загружаем в S3
+            self.upload_file(tmp_path, s3_key)
+            os.remove(tmp_path)
+            
+            logger.info(f"Записано в S3: {s3_key}, строк: {len(df)}")
+        except Exception as e:
+            logger.error(f"Ошибка записи в S3 {s3_key}: {e}")
+            raise
+
+
+    def upload_many(self, files):
+        # параллельная загрузка: files - список (local_path, s3_key) или (local_path, s3_key, metadata)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self.upload_file, *item) for item in files]
+            for future in futures:
+                future.result()
+
+    def read_many_parquet(self, requests):
+        # параллельное чтение нескольких parquet
+        # requests - список ключей или dict {s3_key: {'columns': ..., 'filters': ...}}
+        # возвращает dict {s3_key: DataFrame}
+        if not isinstance(requests, dict):
+            requests = {s3_key: {} for s3_key in requests}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                s3_key: pool.submit(self.read_parquet_from_s3, s3_key, **kwargs)
+                for s3_key, kwargs in requests.items()
+            }
+            return {s3_key: future.result() for s3_key, future in futures.items()}
@@ -0,0 +1,154 @@
+# файловые объекты поверх S3: чтение ranged GET'ами и запись multipart upload'ом
+# позволяют pyarrow работать с объектами в S3 без временных файлов на диске
+
+import io
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# минимальный размер части multipart upload в S3 - 5 МБ (кроме последней)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3RangeReader(io.RawIOBase):
+    # seekable файл для чтения: каждый read - ranged GET нужного куска объекта
+    # pyarrow сам читает footer parquet и только нужные row group'ы и колонки
+
+    def __init__(self, s3_client, bucket, key, size=None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        if size is None:
+            size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.size = size
+        self.position = 0
+        self.requests = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Неизвестный whence: {whence}")
+
+        if position < 0:
+            raise ValueError("Позиция меньше нуля")
+        self.position = position
+        return position
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+
+        end = self.position + length - 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-{end}'
+        )
+        data = response['Body'].read()
+
+        buffer[:len(data)] = data
+        self.position += len(data)
+        self.requests += 1
+        self.bytes_read += len(data)
+        return len(data)
+
+
+class S3MultipartWriter(io.RawIOBase):
+    # файл для записи: данные уходят в S3 частями по part_size через multipart upload
+    # маленький объект (меньше одной части) загружается одним put_object
+    # при ошибке внутри with upload отменяется, объект не появляется
+
+    def __init__(self, s3_client, bucket, key, part_size=8 * 1024 * 1024):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        data = memoryview(data).cast('B')
+        self.buffer += data
+        self.bytes_written += len(data)
+
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+            self.upload_id = response['UploadId']
+
+        number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=body
+        )
+        self.parts.append({'PartNumber': number, 'ETag': response['ETag']})
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+            else:
+                if self.buffer:
+                    self._upload_part(bytes(self.buffer))
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                    MultipartUpload={'Parts': self.parts}
+                )
+            self.buffer = bytearray()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            super().close()
+
+    def abort(self):
+        # отмена незавершенного multipart upload
+        if self.upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+                )
+            except Exception as e:
+                logger.error(f"Не удалось отменить upload {self.key}: {e}")
+            self.upload_id = None
+        self.buffer = bytearray()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            super().close()
+            return False
+        self.close()
+        return False
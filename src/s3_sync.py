@@ -0,0 +1,77 @@
+# синхронизация входных файлов с S3: грузим только то, что изменилось
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import logging
+
+from botocore.exceptions import ClientError
+
+from result_cache import CHECKSUM_FILE, file_md5, load_checksums
+
+
+logger = logging.getLogger(__name__)
+
+# тот же файл, что у отпечатков кеша результатов: md5 считается один раз на оба
+STATE_FILE = CHECKSUM_FILE
+
+
+class InputSync:
+    # сравнивает md5 локального файла с md5 объекта в S3 (metadata или ETag)
+    # md5 локальных файлов кешируется по (size, mtime), чтобы не перечитывать большие файлы
+
+    def __init__(self, s3_handler, local_dir, prefix='input/'):
+        self.s3_handler = s3_handler
+        self.local_dir = Path(local_dir)
+        self.prefix = prefix
+        self.state_path = self.local_dir / STATE_FILE
+        self.state = self._load_state()
+
+    def _load_state(self):
+        return load_checksums(self.local_dir)
+
+    def _save_state(self):
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        tmp_path.replace(self.state_path)
+
+    def local_checksum(self, path):
+        # md5 файла, пересчитывается только если поменялись размер или mtime
+        return file_md5(path, self.state)
+
+    def remote_checksum(self, s3_key):
+        # md5 объекта: из metadata (пишем при загрузке) или из ETag обычной загрузки
+        try:
+            head = self.s3_handler.s3_client.head_object(Bucket=self.s3_handler.bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+        if 'md5' in head.get('Metadata', {}):
+            return head['Metadata']['md5']
+        etag = head['ETag'].strip('"')
+        # у multipart ETag вида <hash>-<parts>, это не md5
+        return None if '-' in etag else etag
+
+    def sync(self, file_names):
+        # загружает изменившиеся файлы, возвращает {имя файла: True если загружался}
+        paths = [self.local_dir / name for name in file_names if (self.local_dir / name).exists()]
+
+        with ThreadPoolExecutor(max_workers=self.s3_handler.max_workers) as pool:
+            local = list(pool.map(self.local_checksum, paths))
+            remote = list(pool.map(self.remote_checksum, [self.prefix + path.name for path in paths]))
+
+        changed = []
+        status = {}
+        for path, local_md5, remote_md5 in zip(paths, local, remote):
+            status[path.name] = local_md5 != remote_md5
+            if status[path.name]:
+                changed.append((path, self.prefix + path.name, {'md5': local_md5}))
+            else:
+                logger.info(f"Без изменений, пропускаем загрузку: {path.name}")
+
+        self.s3_handler.upload_many(changed)
+        self._save_state()
+        return status
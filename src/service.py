@@ -0,0 +1,281 @@
+# постоянный режим: HTTP API вокруг ETLRunner с теплым состоянием
+# между запросами в памяти остаются клиент S3 с пулом соединений (бакет проверяется один раз),
+# проверенные справочники магазинов и пользователей и суммы групп (city, name) по годам
+# каждый запрос сравнивает отпечатки входных файлов (md5 содержимого / ETag) и перечитывает
+# только изменившиеся; заказы в памяти не держим - они нужны только для пересчета сумм
+# проверка - новым валидатором на каждое чтение, карантин сразу пишется в data/output/quarantine,
+# поэтому отчеты и плохие строки не копятся в памяти процесса
+#
+#   GET  /health                                     - состояние сервиса
+#   GET  /result?top_n=3&target_year=2025&city=...   - топ-N из сумм в памяти, файлы не пишутся
+#   POST /run      {"top_n": 3, "target_year": 2025} - то же + запись result.parquet/csv (и в S3)
+#   POST /refresh                                    - проверить входы и обновить изменившееся
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from dtypes import optimize_dtypes, read_dictionary
+from engines import get_engine, top_n_from_groups
+from etl_process import ORDERS_COLUMNS, STORES_COLUMNS, USERS_COLUMNS
+from profiling import StageProfiler
+from validation import DataValidator
+
+
+logger = logging.getLogger(__name__)
+
+INPUT_COLUMNS = {
+    'stores.parquet': STORES_COLUMNS,
+    'users.parquet': USERS_COLUMNS,
+    'orders.parquet': ORDERS_COLUMNS,
+}
+
+
+class ETLService:
+    # состояние и обработчики запросов, без HTTP - его добавляет serve()
+
+    def __init__(self, runner, input_dir=Path('./data/input')):
+        self.runner = runner
+        self.input_dir = input_dir
+        self.engine = get_engine(runner.engine)
+        self.validator = DataValidator(quarantine=runner._quarantine())
+        self.profiler = StageProfiler()
+        self.fingerprints = {}
+        self.tables = {}
+        self.groups = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+
+    def warm(self):
+        # при старте: справочники и суммы года из конфига
+        with self.lock:
+            self._refresh()
+            self._groups(self.runner.target_year)
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'run_mode': self.runner.run_mode,
+            'engine': self.engine.name,
+            'warm_years': sorted(self.groups),
+        }
+
+    def refresh(self):
+        with self.lock:
+            return {'changed': self._refresh()}
+
+    def query(self, params):
+        # топ-N из теплых сумм, params - параметры запроса (top_n, target_year, city)
+        year, n = self._params(params)
+        with self.lock:
+            changed = self._refresh()
+            groups, source = self._groups(year)
+        result = top_n_from_groups(groups, n)
+        city = params.get('city')
+        if city is not None:
+            result = result[result['city'] == city].reset_index(drop=True)
+        return result, {'source': source, 'changed': changed}
+
+    def run(self, params):
+        # как query, но результат публикуется туда же, куда его пишет ETL
+        result, info = self.query({key: value for key, value in params.items() if key != 'city'})
+        with self.lock:
+            self.runner._publish(result)
+        return result, info
+
+    def _params(self, params):
+        return (_positive_int(params, 'target_year', self.runner.target_year),
+                _positive_int(params, 'top_n', self.runner.top_n))
+
+    def _refresh(self):
+        # сравнивает отпечатки; изменившиеся справочники перечитываются, суммы сбрасываются
+        fingerprints = self.runner._input_fingerprints()
+        changed = sorted(name for name, value in fingerprints.items() if self.fingerprints.get(name) != value)
+        if not changed:
+            return changed
+
+        dimensions = [name for name in changed if name != 'orders.parquet']
+        if dimensions:
+            validator = self.validator.fresh()
+            for name, df in self._read(dimensions).items():
+                self.tables[name] = validator.validate(name.split('.')[0], df)
+            validator.set_references(self.tables['stores.parquet'], self.tables['users.parquet'])
+            self._write_quarantine(validator, [name.split('.')[0] for name in dimensions])
+            self.validator = validator
+        self.groups.clear()
+        self.fingerprints = fingerprints
+        logger.info(f"Обновлены входные данные: {changed}")
+        return changed
+
+    def _groups(self, year):
+        # суммы групп года: из памяти, из кеша результатов или пересчетом по заказам
+        if year in self.groups:
+            return self.groups[year], 'memory'
+
+        cache = self.runner.cache
+        key = self.runner._aggregates_key(self.fingerprints, year) if cache is not None else None
+        groups = cache.get(key, kind='aggregates') if cache is not None else None
+        source = 'cache'
+        if groups is None:
+            _, stats = self.engine.transform(self.tables['stores.parquet'], self.tables['users.parquet'],
+                                             self._orders(), year, self.runner.top_n, self.profiler)
+            groups = stats['groups']
+            source = 'etl'
+            if cache is not None:
+                cache.put(key, groups, kind='aggregates')
+
+        self.groups[year] = groups
+        return groups, source
+
+    def _orders(self):
+        # arrow сканирует локальный файл сам, иначе заказы читаются и проверяются целиком
+        orders_path = self.input_dir / 'orders.parquet'
+        if self.engine.scans_files and orders_path.exists():
+            return orders_path
+        validator = self.validator.fresh()
+        orders = validator.validate_orders(self._read(['orders.parquet'])['orders.parquet'])
+        self._write_quarantine(validator, ['orders'])
+        return orders
+
+    def _write_quarantine(self, validator, tables):
+        # карантин проверенных таблиц заменяется целиком: старый файл мог остаться от прошлых данных
+        if not validator.quarantine:
+            return
+        quarantine_dir = Path('./data/output') / 'quarantine'
+        for table in tables:
+            (quarantine_dir / f'{table}.parquet').unlink(missing_ok=True)
+        for path in validator.write_quarantine(quarantine_dir):
+            logger.info(f"Карантин сохранен: {path}")
+        validator.quarantined_rows.clear()
+
+    def _read(self, file_names):
+        # локальная копия (в s3 режиме сначала синхронизируется с бакетом) или чтение из S3
+        s3_handler = self.runner.s3_handler
+        if self.input_dir.exists():
+            if s3_handler is not None:
+                from s3_sync import InputSync
+                InputSync(s3_handler, self.input_dir).sync(file_names)
+            frames = {
+                file_name: pd.read_parquet(self.input_dir / file_name, columns=INPUT_COLUMNS[file_name],
+                                           read_dictionary=read_dictionary(file_name.split('.')[0],
+                                                                           INPUT_COLUMNS[file_name]))
+                for file_name in file_names
+            }
+        else:
+            remote = s3_handler.read_many_parquet({
+                f'input/{file_name}': {'columns': INPUT_COLUMNS[file_name]} for file_name in file_names
+            })
+            frames = {s3_key.split('/', 1)[1]: df for s3_key, df in remote.items()}
+        return {file_name: optimize_dtypes(df) for file_name, df in frames.items()}
+
+
+def _positive_int(params, name, default):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} должен быть целым числом") from None
+    if value <= 0:
+        raise ValueError(f"{name} должен быть больше нуля")
+    return value
+
+
+def _records(result):
+    return result.astype({'city': str, 'store_name': str}).to_dict(orient='records')
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # self.server.service - ETLService
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/health':
+            self._handle(lambda service: service.health())
+        elif url.path == '/result':
+            self._handle(lambda service: self._result(service.query(params)))
+        else:
+            self._reply(404, {'error': f'Неизвестный путь: {url.path}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == '/run':
+            self._handle(lambda service: self._result(service.run(self._body())))
+        elif url.path == '/refresh':
+            self._handle(lambda service: service.refresh())
+        else:
+            self._reply(404, {'error': f'Неизвестный путь: {url.path}'})
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length))
+        if not isinstance(body, dict):
+            raise ValueError("Тело запроса должно быть JSON объектом")
+        return body
+
+    @staticmethod
+    def _result(answer):
+        result, info = answer
+        return {**info, 'rows': len(result), 'result': _records(result)}
+
+    def _handle(self, handler):
+        service = self.server.service
+        started = time.perf_counter()
+        service.requests += 1
+        try:
+            payload = handler(service)
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception(f"Ошибка обработки {self.command} {self.path}")
+            self._reply(500, {'error': str(e)})
+            return
+        payload['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self._reply(200, payload)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def make_server(service, host='127.0.0.1', port=8080):
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service
+    return server
+
+
+def serve(runner, host='127.0.0.1', port=8080):
+    # прогрев и обработка запросов до Ctrl+C / SIGTERM
+    service = ETLService(runner)
+    started = time.perf_counter()
+    service.warm()
+    logger.info(f"Сервис прогрет за {time.perf_counter() - started:.2f} с, слушает http://{host}:{port}")
+
+    server = make_server(service, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
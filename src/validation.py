@@ -0,0 +1,195 @@
+# проверки из models.py (Store, User, Order, Result), но по целым колонкам, а не по строкам
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from dimensions import EligibleUsers, StoreDimension
+
+
+# сколько id нарушителей сохранять в отчете на каждое правило
+SAMPLE_SIZE = 5
+
+
+def _not_positive(series):
+    # id <= 0 или пусто
+    return ~(series.to_numpy(dtype=np.float64, na_value=np.nan) > 0)
+
+
+def _negative(series):
+    # сумма < 0 или пусто
+    return ~(series.to_numpy(dtype=np.float64, na_value=np.nan) >= 0)
+
+
+def _empty_string(series):
+    # пустая строка, только пробелы или null
+    values = pa.array(series, from_pandas=True)
+    if not pa.types.is_string(values.type) and not pa.types.is_large_string(values.type):
+        values = values.cast(pa.string())
+    empty = pc.equal(pc.utf8_length(pc.utf8_trim_whitespace(values)), 0)
+    return pc.fill_null(empty, True).to_numpy(zero_copy_only=False)
+
+
+def _not_datetime(series):
+    # колонка не datetime - плохие все строки, иначе пустые значения
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        return np.ones(len(series), dtype=bool)
+    return series.isna().to_numpy()
+
+
+# правила: таблица -> [(название, колонка, проверка)], как в __post_init__ моделей
+RULES = {
+    'stores': [
+        ('id_not_positive', 'id', _not_positive),
+        ('name_empty', 'name', _empty_string),
+        ('city_empty', 'city', _empty_string),
+    ],
+    'users': [
+        ('id_not_positive', 'id', _not_positive),
+        ('name_empty', 'name', _empty_string),
+        ('created_at_not_datetime', 'created_at', _not_datetime),
+    ],
+    'orders': [
+        ('id_not_positive', 'id', _not_positive),
+        ('amount_negative', 'amount', _negative),
+        ('user_id_not_positive', 'user_id', _not_positive),
+        ('store_id_not_positive', 'store_id', _not_positive),
+        ('created_at_not_datetime', 'created_at', _not_datetime),
+    ],
+    'result': [
+        ('city_empty', 'city', _empty_string),
+        ('store_name_empty', 'store_name', _empty_string),
+        ('target_amount_negative', 'target_amount', _negative),
+    ],
+}
+
+
+class ValidationReport:
+    # компактный отчет: число нарушений и несколько примеров по каждому правилу
+
+    def __init__(self):
+        self.rows_checked = {}
+        self.violations = {}
+        self.samples = {}
+        self.quarantined = {}
+
+    @property
+    def ok(self):
+        return not any(self.violations.values())
+
+    def add(self, table, rule, bad, ids):
+        key = f'{table}.{rule}'
+        count = int(bad.sum())
+        self.violations[key] = self.violations.get(key, 0) + count
+        if count:
+            samples = self.samples.setdefault(key, [])
+            if len(samples) < SAMPLE_SIZE:
+                found = ids[bad][:SAMPLE_SIZE - len(samples)] if ids is not None else []
+                samples.extend(_plain(value) for value in found)
+
+    def merge(self, other):
+        # отчет другого валидатора (воркер, часть заказов) складывается в этот
+        for table, rows in other.rows_checked.items():
+            self.rows_checked[table] = self.rows_checked.get(table, 0) + rows
+        for key, count in other.violations.items():
+            self.violations[key] = self.violations.get(key, 0) + count
+        for key, found in other.samples.items():
+            samples = self.samples.setdefault(key, [])
+            samples.extend(found[:SAMPLE_SIZE - len(samples)])
+        for table, count in other.quarantined.items():
+            self.quarantined[table] = self.quarantined.get(table, 0) + count
+
+    def to_dict(self):
+        return {
+            'ok': self.ok,
+            'rows_checked': self.rows_checked,
+            'violations': {key: count for key, count in self.violations.items() if count},
+            'samples': self.samples,
+            'quarantined': self.quarantined,
+        }
+
+
+class DataValidator:
+    # проверка таблиц целыми колонками, плохие строки можно отложить в карантин
+    # проверяются только присутствующие колонки (в streaming читаются не все)
+
+    def __init__(self, quarantine=False):
+        self.quarantine = quarantine
+        self.report = ValidationReport()
+        self.quarantined_rows = {}
+        self._stores = None
+        self._users = None
+
+    def check(self, table, df, extra=()):
+        # возвращает маску плохих строк; extra - дополнительные [(правило, маска)]
+        self.report.rows_checked[table] = self.report.rows_checked.get(table, 0) + len(df)
+        ids = df['id'].to_numpy() if 'id' in df.columns else None
+
+        bad_rows = np.zeros(len(df), dtype=bool)
+        for rule, column, check in RULES[table]:
+            if column not in df.columns:
+                continue
+            bad = check(df[column])
+            self.report.add(table, rule, bad, ids)
+            bad_rows |= bad
+
+        for rule, bad in extra:
+            self.report.add(table, rule, bad, ids)
+            bad_rows |= bad
+        return bad_rows
+
+    def set_references(self, stores_df=None, users_df=None):
+        # справочники для ссылочной целостности строятся один раз, а не на каждый батч
+        self._stores = StoreDimension(stores_df) if stores_df is not None else None
+        self._users = EligibleUsers(users_df['id']) if users_df is not None else None
+
+    def fresh(self):
+        # пустой отчет с теми же справочниками и карантином - для воркеров процессов
+        validator = DataValidator(quarantine=self.quarantine)
+        validator._stores = self._stores
+        validator._users = self._users
+        return validator
+
+    def merge(self, report, quarantined_rows):
+        # отчет и карантин валидатора из fresh() - обратно в этот
+        # (сам валидатор со справочниками из воркера не передается)
+        self.report.merge(report)
+        for table, parts in quarantined_rows.items():
+            self.quarantined_rows.setdefault(table, []).extend(parts)
+
+    def validate_orders(self, orders_df):
+        # + ссылочная целостность: заказ -> магазин, заказ -> пользователь
+        extra = []
+        if self._stores is not None and 'store_id' in orders_df.columns:
+            extra.append(('store_not_found', self._stores.codes(orders_df['store_id']) < 0))
+        if self._users is not None and 'user_id' in orders_df.columns:
+            extra.append(('user_not_found', ~self._users.contains(orders_df['user_id'])))
+        return self.apply('orders', orders_df, self.check('orders', orders_df, extra))
+
+    def validate(self, table, df):
+        return self.apply(table, df, self.check(table, df))
+
+    def apply(self, table, df, bad_rows):
+        # в режиме карантина плохие строки убираются из данных и копятся для записи
+        if not self.quarantine or not bad_rows.any():
+            return df
+
+        self.quarantined_rows.setdefault(table, []).append(df[bad_rows])
+        self.report.quarantined[table] = self.report.quarantined.get(table, 0) + int(bad_rows.sum())
+        return df[~bad_rows]
+
+    def write_quarantine(self, quarantine_dir, suffix=''):
+        # плохие строки - в quarantine_dir/<таблица><suffix>.parquet
+        paths = []
+        for table, parts in self.quarantined_rows.items():
+            quarantine_dir.mkdir(parents=True, exist_ok=True)
+            path = quarantine_dir / f'{table}{suffix}.parquet'
+            pd.concat(parts, ignore_index=True).to_parquet(path, index=False)
+            paths.append(path)
+        return paths
+
+
+def _plain(value):
+    # numpy скаляры в обычные python значения для JSON
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,143 @@
+# запись результата: DataFrame превращается в Arrow один раз и отдается нескольким приемникам
+# локальные файлы пишутся во временный файл рядом и подменяются через os.replace,
+# поэтому наполовину записанный result.* никогда не виден
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from profiling import StageProfiler
+from s3_io import S3MultipartWriter
+
+
+# настройки parquet по умолчанию, переопределяются etl.output в конфиге
+PARQUET_OPTIONS = {
+    'compression': 'zstd',
+    'compression_level': 3,
+    'row_group_size': 1_000_000,
+    'write_statistics': True,
+}
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+
+def parquet_options(config=None):
+    # PARQUET_OPTIONS + секция parquet из etl.output
+    options = dict(PARQUET_OPTIONS)
+    options.update((config or {}).get('parquet', {}))
+    return options
+
+
+class AtomicFile:
+    # файл пишется в <path>.tmp-<pid> и подменяет path только после успешной записи
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path.with_name(f'.{path.name}.tmp-{os.getpid()}')
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.tmp_path, 'wb')
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+        return False
+
+
+class ParquetFileSink:
+    stage = 'write_parquet'
+
+    def __init__(self, path, **options):
+        self.path = path
+        self.options = {**PARQUET_OPTIONS, **options}
+
+    def write(self, table):
+        with AtomicFile(self.path) as f:
+            pq.write_table(table, f, **self.options)
+        return self.path.stat().st_size
+
+
+# кавычки только где нужно; в pyarrow без quoting_style (< 13) строки всегда в кавычках - csv тот же
+try:
+    CSV_OPTIONS = pa_csv.WriteOptions(quoting_style='needed')
+except TypeError:
+    CSV_OPTIONS = pa_csv.WriteOptions()
+
+
+class CsvFileSink:
+    # csv через pyarrow.csv; BOM - чтобы Excel открывал кириллицу (как utf-8-sig раньше)
+    stage = 'write_csv'
+
+    def __init__(self, path, bom=True):
+        self.path = path
+        self.bom = bom
+
+    def write(self, table):
+        with AtomicFile(self.path) as f:
+            if self.bom:
+                f.write(UTF8_BOM)
+            pa_csv.write_csv(table, f, CSV_OPTIONS)
+        return self.path.stat().st_size
+
+
+class S3ParquetSink:
+    # parquet прямо в multipart upload: объект появляется только после complete,
+    # при ошибке upload отменяется
+    def __init__(self, s3_client, bucket_name, s3_key, **options):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.stage = f's3_write:{s3_key}'
+        self.options = {**PARQUET_OPTIONS, **options}
+
+    def write(self, table):
+        with S3MultipartWriter(self.s3_client, self.bucket_name, self.s3_key) as sink:
+            pq.write_table(table, sink, **self.options)
+        return sink.bytes_written
+
+
+class ResultWriter:
+    # один pa.Table на все приемники, приемники пишутся параллельно в потоках
+    # (pyarrow отпускает GIL при кодировании и записи)
+
+    def __init__(self, sinks, profiler=None, max_workers=None):
+        self.sinks = list(sinks)
+        self.profiler = profiler or StageProfiler()
+        self.max_workers = max_workers or len(self.sinks)
+
+    def write(self, df):
+        # возвращает {stage: байт записано}
+        with self.profiler.stage('write_to_arrow', rows=len(df)):
+            table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+
+        # у каждого потока свой профайлер, записи добавляются в порядке приемников
+        # (tracemalloc глобальный, из нескольких потоков его не включаем)
+        profilers = [StageProfiler() for _ in self.sinks]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._write_sink, sink, table, profiler)
+                       for sink, profiler in zip(self.sinks, profilers)]
+            written = {sink.stage: future.result() for sink, future in zip(self.sinks, futures)}
+
+        for profiler in profilers:
+            self.profiler.stages.extend(profiler.stages)
+        return written
+
+    @staticmethod
+    def _write_sink(sink, table, profiler):
+        with profiler.stage(sink.stage, rows=table.num_rows) as stage:
+            stage['bytes'] = sink.write(table)
+        return stage['bytes']
@@ -0,0 +1,80 @@
+# тесты онлайн агрегации
+
+
+import pytest
+import pandas as pd
+from datetime import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from aggregation import StoreAggregator
+from etl_process import StoreAnalyticsETL
+
+
+class TestStoreAggregator:
+    @pytest.fixture
+    def sample_stores(self):
+        return pd.DataFrame({
+            'id': [1, 2, 3, 4, 5],
+            'name': ['Store_A', 'Store_B', 'Store_C', 'Store_D', 'Store_E'],
+            'city': ['Moscow', 'Moscow', 'Moscow', 'Moscow', 'SPB']
+        })
+
+    @pytest.fixture
+    def sample_orders(self):
+        return pd.DataFrame({
+            'user_id': [1] * 8,
+            'store_id': [1, 2, 3, 4, 5, 1, 2, 99],
+            'amount': [100.0, 200.0, 300.0, 400.0, 50.0, 500.0, 10.0, 1000.0]
+        })
+
+    def test_batches_equal_single_pass(self, sample_stores, sample_orders):
+        whole = StoreAggregator()
+        whole.update(sample_orders)
+
+        batched = StoreAggregator()
+        for start in range(0, len(sample_orders), 3):
+            batched.update(sample_orders.iloc[start:start + 3])
+
+        assert batched.sums == whole.sums
+        assert batched.rows == whole.rows == 8
+
+    def test_top_n_per_city(self, sample_stores, sample_orders):
+        aggregator = StoreAggregator()
+        aggregator.update(sample_orders)
+        result = aggregator.top_n(sample_stores, n=3)
+
+        # магазин 99 отсутствует в справочнике и отбрасывается (inner join)
+        assert result.to_dict('records') == [
+            {'city': 'Moscow', 'store_name': 'Store_A', 'target_amount': 600.0},
+            {'city': 'Moscow', 'store_name': 'Store_D', 'target_amount': 400.0},
+            {'city': 'Moscow', 'store_name': 'Store_C', 'target_amount': 300.0},
+            {'city': 'SPB', 'store_name': 'Store_E', 'target_amount': 50.0},
+        ]
+
+    def test_merge_partials(self, sample_stores, sample_orders):
+        left, right = StoreAggregator(), StoreAggregator()
+        left.update(sample_orders.iloc[:4])
+        right.update(sample_orders.iloc[4:])
+        left.merge(right)
+
+        whole = StoreAggregator()
+        whole.update(sample_orders)
+        pd.testing.assert_frame_equal(left.top_n(sample_stores), whole.top_n(sample_stores))
+
+    def test_empty(self, sample_stores):
+        result = StoreAggregator().top_n(sample_stores)
+        assert len(result) == 0
+        assert list(result.columns) == ['city', 'store_name', 'target_amount']
+
+    def test_streaming_transform_matches_transform(self, sample_stores, sample_orders):
+        users = pd.DataFrame({'id': [1], 'created_at': [datetime(2025, 3, 1)]})
+        etl = StoreAnalyticsETL()
+
+        expected = etl.transform(sample_stores, users, sample_orders)
+        batches = (sample_orders.iloc[i:i + 2] for i in range(0, len(sample_orders), 2))
+        result = etl.transform_streaming(sample_stores, users, batches)
+
+        pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,100 @@
+# тесты точки входа: команды CLI и ленивые импорты
+
+
+import pytest
+import logging
+import os
+import subprocess
+import pandas as pd
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+import main
+from etl_process import StoreAnalyticsETL
+
+
+def loaded_modules(code):
+    # какие тяжелые модули оказались в sys.modules после code, в чистом процессе
+    script = f"{code}\nimport sys\nprint(sorted(m for m in ('pandas', 'pyarrow', 'boto3') if m in sys.modules))"
+    process = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                             env={**os.environ, 'PYTHONPATH': str(SRC_DIR)})
+    return process.stdout.strip()
+
+
+class TestLazyImports:
+    def test_main_imports_nothing_heavy(self):
+        assert loaded_modules('import main; main.build_parser().format_help()') == '[]'
+
+    def test_local_run_without_boto3(self):
+        assert loaded_modules('import main, etl_process') == "['pandas', 'pyarrow']"
+
+    def test_s3_handler_reexported(self):
+        pytest.importorskip('boto3')
+        from s3_handler import S3Handler
+        assert main.S3Handler is S3Handler
+        with pytest.raises(AttributeError):
+            main.missing
+
+
+class TestCommands:
+    @pytest.fixture
+    def workdir(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('ETL_CONFIG', str(tmp_path / 'missing.yaml'))
+        return tmp_path
+
+    def test_generate_and_run(self, workdir):
+        main.main(['generate', '--stores', '10', '--users', '200', '--orders', '2000', '--seed', '1'])
+        assert sorted(path.name for path in (workdir / 'data' / 'input').iterdir()) == \
+            ['orders.parquet', 'stores.parquet', 'users.parquet']
+
+        result = main.main(['run', '--etl-mode', 'streaming', '--engine', 'arrow'])
+        expected = StoreAnalyticsETL(workdir / 'data' / 'input', workdir / 'expected', workdir / 'logs').run()
+        pd.testing.assert_frame_equal(result, expected)
+        assert (workdir / 'data' / 'output' / 'result.parquet').exists()
+
+    def test_no_command_is_run(self, workdir, monkeypatch):
+        calls = []
+        monkeypatch.setattr(main.ETLRunner, 'run', lambda self: calls.append((self.run_mode, self.etl_mode)))
+        monkeypatch.setenv('ETL_MODE', 'streaming')
+
+        main.main([])
+        main.main(['--etl-mode', 'incremental'])
+        assert calls == [('local', 'streaming'), ('local', 'incremental')]
+
+    def test_validation_from_config(self, workdir, monkeypatch):
+        (workdir / 'config.yaml').write_text(
+            '{"etl": {"validation": {"enabled": true, "quarantine": true}, "cache": {"enabled": false}}}')
+        monkeypatch.setenv('ETL_CONFIG', str(workdir / 'config.yaml'))
+        main.main(['generate', '--stores', '10', '--users', '200', '--orders', '2000', '--seed', '1'])
+
+        runner = main.ETLRunner(etl_mode='parallel', workers=1)
+        runner.run()
+        assert runner.etl.validator.quarantine
+        assert runner.etl.validator.report.rows_checked['orders'] == 2000
+
+        (workdir / 'config.yaml').write_text('{"etl": {"validation": {"enabled": false}}}')
+        assert main.ETLRunner().validate is False
+
+    def test_bad_arguments(self, workdir):
+        with pytest.raises(SystemExit):
+            main.main(['run', '--unknown'])
+        with pytest.raises(SystemExit):
+            main.main(['run', '--engine', 'spark'])
+
+
+class TestLogging:
+    def test_log_file_only_while_running(self, tmp_path):
+        from data_generator import DataGenerator
+
+        DataGenerator(num_stores=5, num_users=50, num_orders=200, seed=2).generate_all_fast(tmp_path / 'input')
+        etl = StoreAnalyticsETL(tmp_path / 'input', tmp_path / 'output', tmp_path / 'logs')
+        assert list((tmp_path / 'logs').glob('*.log')) == []
+
+        handlers = list(logging.getLogger().handlers)
+        etl.run()
+        assert etl.log_file.exists()
+        assert logging.getLogger().handlers == handlers
@@ -0,0 +1,113 @@
+# тесты справочников-массивов
+
+
+import pytest
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from dimensions import EligibleUsers, StoreDimension
+
+
+class TestStoreDimension:
+    @pytest.fixture
+    def sample_stores(self):
+        return pd.DataFrame({
+            'id': [3, 1, 2, 4],
+            'name': ['Store_C', 'Store_A', 'Store_B', 'Store_D'],
+            'city': ['SPB', 'Moscow', 'Moscow', 'SPB']
+        })
+
+    def test_codes_dense(self, sample_stores):
+        dimension = StoreDimension(sample_stores)
+        codes = dimension.codes([1, 2, 3, 4, 5, -1])
+
+        assert list(codes[-2:]) == [-1, -1]
+        assert list(np.asarray(dimension.cities)[codes[:4]]) == ['Moscow', 'Moscow', 'SPB', 'SPB']
+        assert list(np.asarray(dimension.names)[codes[:4]]) == ['Store_A', 'Store_B', 'Store_C', 'Store_D']
+
+    def test_codes_sparse(self, sample_stores):
+        sparse = sample_stores.assign(id=sample_stores['id'] * 10**9)
+        dimension = StoreDimension(sparse)
+        codes = dimension.codes([10**9, 4 * 10**9, 7])
+
+        assert dimension._lookup is None
+        assert list(np.asarray(dimension.names)[codes[:2]]) == ['Store_A', 'Store_D']
+        assert codes[2] == -1
+
+    def test_aggregate_and_top_n(self, sample_stores):
+        dimension = StoreDimension(sample_stores)
+        store_ids = np.array([1, 2, 2, 3, 99])
+        amounts = np.array([100.0, 80.0, 30.0, 50.0, 1000.0])
+
+        totals, counts = dimension.aggregate(dimension.codes(store_ids), amounts)
+        result = dimension.top_n(totals, counts, n=1)
+
+        # Store_D без заказов не попадает в результат, магазин 99 отброшен
+        assert result.to_dict('records') == [
+            {'city': 'Moscow', 'store_name': 'Store_B', 'target_amount': 110.0},
+            {'city': 'SPB', 'store_name': 'Store_C', 'target_amount': 50.0},
+        ]
+
+    def test_same_name_in_city_is_one_group(self):
+        stores = pd.DataFrame({'id': [1, 2], 'name': ['Store', 'Store'], 'city': ['Moscow', 'Moscow']})
+        dimension = StoreDimension(stores)
+
+        totals, counts = dimension.aggregate(dimension.codes([1, 2]), [10.0, 20.0])
+        result = dimension.top_n(totals, counts)
+
+        assert len(result) == 1
+        assert result['target_amount'].iloc[0] == 30.0
+
+    @pytest.mark.parametrize('n', [1, 3, 50])
+    def test_top_codes_matches_full_sort(self, n):
+        # частичный отбор дает тот же порядок, что полная сортировка, в том числе при равных суммах
+        rng = np.random.default_rng(7)
+        stores = pd.DataFrame({
+            'id': np.arange(2000),
+            'name': [f'Store_{i:04}' for i in range(2000)],
+            'city': rng.choice([f'City_{i}' for i in range(12)], 2000),
+        })
+        dimension = StoreDimension(stores)
+        codes = np.flatnonzero(rng.random(dimension.num_groups) < 0.8)
+        amounts = rng.integers(0, 20, len(codes)).astype(np.float64)
+
+        city_codes = dimension.cities.codes[codes]
+        order = np.lexsort((-amounts, city_codes))
+        rank = np.arange(len(order)) - np.searchsorted(city_codes[order], city_codes[order])
+        expected = codes[order[rank < n]]
+
+        np.testing.assert_array_equal(dimension.top_codes(codes, amounts, n=n), expected)
+
+
+class TestEligibleUsers:
+    def test_dense_mask(self):
+        eligible = EligibleUsers([1, 2, 4, 4])
+
+        assert eligible._mask is not None
+        assert len(eligible) == 3
+        assert list(eligible.contains([1, 2, 3, 4, 5, 100, -1])) == [True, True, False, True, False, False, False]
+
+    def test_sparse_ids(self):
+        eligible = EligibleUsers([10**12, 5, 3 * 10**12])
+
+        assert eligible._mask is None
+        assert len(eligible) == 3
+        assert list(eligible.contains([5, 10**12, 2 * 10**12])) == [True, True, False]
+
+    def test_empty(self):
+        eligible = EligibleUsers([])
+        assert len(eligible) == 0
+        assert not eligible.contains([1, 2]).any()
+
+    def test_from_users(self):
+        users = pd.DataFrame({
+            'id': [1, 2, 3],
+            'created_at': [datetime(2025, 1, 1), datetime(2024, 12, 31), datetime(2025, 12, 31, 23, 59)]
+        })
+        eligible = EligibleUsers.from_users(users, 2025)
+        assert list(eligible.contains([1, 2, 3])) == [True, False, True]
@@ -0,0 +1,65 @@
+# тесты компактных типов колонок
+
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from dtypes import downcast_float, downcast_int, optimize_dtypes, read_dictionary
+from dimensions import EligibleUsers, StoreDimension
+
+
+class TestDowncast:
+    def test_int32_when_fits(self):
+        assert downcast_int(np.array([1, 2, 2**31 - 2])).dtype == np.int32
+        assert downcast_int(np.array([1, 2**31])).dtype == np.int64
+
+    def test_float_only_lossless(self):
+        assert downcast_float(np.array([1.5, 0.25, np.nan])).dtype == np.float32
+        assert downcast_float(np.array([6526.84])).dtype == np.float64
+
+    def test_optimize_dtypes(self):
+        df = pd.DataFrame({
+            'id': np.arange(1, 4, dtype=np.int64),
+            'amount': [100.1, 0.5, 2.0],
+            'status': ['completed', 'pending', 'completed'],
+        })
+        optimize_dtypes(df)
+
+        assert df['id'].dtype == np.int32
+        assert df['amount'].dtype == np.float64
+        assert df['amount'].tolist() == [100.1, 0.5, 2.0]
+
+    def test_read_dictionary(self, tmp_path):
+        pd.DataFrame({'id': [1, 2], 'name': ['A', 'B'], 'city': ['Moscow', 'Moscow']}).to_parquet(
+            tmp_path / 'stores.parquet', index=False)
+        stores = pd.read_parquet(tmp_path / 'stores.parquet', read_dictionary=read_dictionary('stores'))
+
+        assert isinstance(stores['city'].dtype, pd.CategoricalDtype)
+        assert read_dictionary('users') is None
+        assert read_dictionary('stores', ['id', 'city']) == ['city']
+
+
+class TestCompactPipeline:
+    def test_int32_ids_and_categorical_result(self, tmp_path):
+        stores = pd.DataFrame({
+            'id': np.array([1, 2, 3], dtype=np.int32),
+            'name': pd.Categorical(['A', 'B', 'C']),
+            'city': pd.Categorical(['Moscow', 'Moscow', 'SPB']),
+        })
+        dimension = StoreDimension(stores)
+        codes = dimension.codes(np.array([1, 3, 3, 9], dtype=np.int32))
+        totals, counts = dimension.aggregate(codes, np.array([1.0, 2.0, 3.0, 4.0]))
+        result = dimension.top_n(totals, counts)
+
+        assert EligibleUsers(np.array([5], dtype=np.int32)).contains(np.array([5, 6], dtype=np.int32)).tolist() == [True, False]
+        assert result['store_name'].tolist() == ['A', 'C']
+        assert list(result['city'].cat.categories) == ['Moscow', 'SPB']
+
+        result.to_parquet(tmp_path / 'result.parquet', index=False)
+        schema = pq.read_schema(tmp_path / 'result.parquet')
+        assert str(schema.field('city').type).startswith('dictionary')
@@ -0,0 +1,82 @@
+# паритет движков transform: одинаковый result.parquet
+
+
+import pytest
+from datetime import datetime
+import pandas as pd
+import pyarrow.parquet as pq
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_generator import DataGenerator
+from engines import get_engine
+from etl_process import StoreAnalyticsETL
+
+
+def run_etl(input_dir, out_dir, **kwargs):
+    etl = StoreAnalyticsETL(input_dir, out_dir / 'output', out_dir / 'logs', **kwargs)
+    etl.run()
+    return etl
+
+
+@pytest.fixture(scope='module')
+def generated(tmp_path_factory):
+    path = tmp_path_factory.mktemp('engines')
+    generator = DataGenerator(num_stores=40, num_users=2000, num_orders=20000, seed=3,
+                              distributions={'store_popularity': 'zipf'})
+    generator.generate_all_fast(path, chunk_size=5000)
+    return path
+
+
+class TestEngineParity:
+    @pytest.fixture
+    def ties(self, tmp_path):
+        # равные суммы, магазин без заказов, заказ несуществующего магазина, пользователь 2024
+        pd.DataFrame({
+            'id': [1, 2, 3, 4, 5],
+            'name': ['B', 'A', 'C', 'D', 'E'],
+            'city': ['Moscow', 'Moscow', 'Moscow', 'Moscow', 'SPB'],
+        }).to_parquet(tmp_path / 'stores.parquet', index=False)
+        pd.DataFrame({
+            'id': [1, 2],
+            'name': ['User_1', 'User_2'],
+            'phone': ['+7', '+7'],
+            'created_at': [datetime(2025, 5, 1), datetime(2024, 5, 1)],
+        }).to_parquet(tmp_path / 'users.parquet', index=False)
+        pd.DataFrame({
+            'id': [1, 2, 3, 4, 5, 6, 7],
+            'amount': [100.0, 100.0, 100.0, 50.0, 10.0, 30.0, 999.0],
+            'user_id': [1, 1, 1, 1, 1, 2, 1],
+            'store_id': [1, 2, 3, 4, 5, 5, 42],
+            'status': ['completed'] * 7,
+            'created_at': [datetime(2025, 6, 1)] * 7,
+        }).to_parquet(tmp_path / 'orders.parquet', index=False)
+        return tmp_path
+
+    @pytest.mark.parametrize('mode', ['full', 'streaming'])
+    def test_arrow_matches_pandas(self, generated, tmp_path, mode):
+        pandas_run = run_etl(generated, tmp_path / 'pandas', engine='pandas')
+        arrow_run = run_etl(generated, tmp_path / 'arrow', mode=mode, engine='arrow')
+
+        expected = pq.read_table(tmp_path / 'pandas' / 'output' / 'result.parquet')
+        actual = pq.read_table(tmp_path / 'arrow' / 'output' / 'result.parquet')
+        assert actual.schema.remove_metadata() == expected.schema.remove_metadata()
+        pd.testing.assert_frame_equal(actual.to_pandas(), expected.to_pandas())
+
+        for key in ('users_2025', 'orders_filtered'):
+            assert arrow_run.metrics['records_processed'][key] == pandas_run.metrics['records_processed'][key]
+
+    def test_ties_and_missing_stores(self, ties, tmp_path):
+        results = {}
+        for name in ('pandas', 'arrow'):
+            run_etl(ties, tmp_path / name, engine=name)
+            results[name] = pd.read_parquet(tmp_path / name / 'output' / 'result.parquet')
+
+        assert results['arrow']['store_name'].tolist() == ['A', 'B', 'C', 'E']
+        pd.testing.assert_frame_equal(results['arrow'], results['pandas'])
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError, match='Неизвестный движок'):
+            get_engine('spark')
@@ -3,6 +3,7 @@
 
 import pytest
 import pandas as pd
+import pyarrow.parquet as pq
 from datetime import datetime
 import sys
 from pathlib import Path
@@ -122,6 +123,63 @@ class TestETLTransform:
         assert len(result) == 0
 
 
+class TestStreamingExtract:
+
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        stores = pd.DataFrame({
+            'id': [1, 2, 3, 4],
+            'name': ['Store_A', 'Store_B', 'Store_C', 'Store_D'],
+            'city': ['Moscow', 'Moscow', 'SPB', 'SPB']
+        })
+        users = pd.DataFrame({
+            'id': [1, 2, 3, 4, 5],
+            'name': [f'User_{i}' for i in range(1, 6)],
+            'phone': ['+71111111111'] * 5,
+            'created_at': [datetime(2025, 1, 15), datetime(2025, 6, 20), datetime(2024, 12, 31),
+                           datetime(2025, 12, 1), datetime(2023, 5, 10)]
+        })
+        orders = pd.DataFrame({
+            'id': list(range(1, 11)),
+            'amount': [100.0, 200.0, 150.0, 300.0, 250.0, 400.0, 180.0, 220.0, 350.0, 120.0],
+            'user_id': [1, 1, 2, 2, 3, 3, 4, 4, 5, 1],
+            'store_id': [1, 2, 1, 2, 1, 2, 3, 4, 3, 1],
+            'status': ['completed'] * 10,
+            'created_at': [datetime(2025, 1, i) for i in range(1, 11)]
+        })
+        stores.to_parquet(tmp_path / 'stores.parquet', index=False)
+        users.to_parquet(tmp_path / 'users.parquet', index=False)
+        # несколько row group'ов, чтобы было что стримить
+        orders.to_parquet(tmp_path / 'orders.parquet', index=False, row_group_size=3)
+        return tmp_path
+
+    def test_users_filter_pushdown(self, input_dir):
+        etl = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs', mode='streaming')
+        stores_df, users_df, _ = etl.extract_streaming()
+
+        assert list(stores_df.columns) == ['id', 'name', 'city']
+        assert list(users_df.columns) == ['id', 'created_at']
+        assert set(users_df['id']) == {1, 2, 4}
+        assert etl.metrics['records_processed']['users'] == 5
+
+    def test_orders_read_in_batches(self, input_dir):
+        etl = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs',
+                                mode='streaming', batch_size=3)
+        _, _, batches = etl.extract_streaming()
+        batches = list(batches)
+
+        assert len(batches) == 4
+        assert all(list(b.columns) == ['user_id', 'store_id', 'amount'] for b in batches)
+        assert sum(len(b) for b in batches) == 10
+
+    def test_streaming_matches_full(self, input_dir):
+        full = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs').run()
+        streaming = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs',
+                                      mode='streaming', batch_size=3).run()
+
+        pd.testing.assert_frame_equal(full, streaming)
+
+
 class TestDataGenerator:
     
     def test_stores_generation(self):
@@ -172,6 +230,107 @@ class TestDataGenerator:
         # Проверяем положительные суммы
         assert all(orders_df['amount'] > 0)
 
+    def test_fast_generation_schema(self, tmp_path):
+        from data_generator import DataGenerator
+        import pyarrow.parquet as pq
+
+        gen = DataGenerator(num_stores=5, num_users=200, num_orders=1000, seed=42)
+        gen.generate_all_fast(tmp_path, chunk_size=300)
+        slow = DataGenerator(num_stores=2, num_users=3, num_orders=3)
+
+        for name, df in [('stores', slow.generate_stores()), ('users', slow.generate_users())]:
+            assert pq.read_schema(tmp_path / f'{name}.parquet').names == list(df.columns)
+
+        orders_file = pq.ParquetFile(tmp_path / 'orders.parquet')
+        assert orders_file.num_row_groups == 4
+        orders_df = orders_file.read().to_pandas()
+        users_df = pd.read_parquet(tmp_path / 'users.parquet')
+
+        assert orders_df['id'].tolist() == list(range(1, 1001))
+        assert orders_df['user_id'].between(1, 200).all()
+        assert orders_df['store_id'].between(1, 5).all()
+        assert orders_df['amount'].between(100, 10000).all()
+        assert (orders_df['created_at'].dt.year == 2025).all()
+        assert set(orders_df['status']) <= set(gen.statuses)
+        assert users_df['id'].is_unique
+        assert (users_df['created_at'].dt.year == 2025).mean() > 0.6
+        assert users_df['phone'].str.match(r'^\+79\d{9}$').all()
+
+    def test_skewed_distributions(self):
+        from data_generator import DataGenerator
+
+        gen = DataGenerator(num_stores=100, num_users=1000, num_orders=20000, seed=1, distributions={
+            'user_popularity': 'zipf', 'store_popularity': 'zipf', 'store_zipf_a': 1.5,
+            'num_cities': 40, 'seasonality': 0.8, 'peak_month': 12, 'diurnal': True
+        })
+        stores = gen.generate_stores_fast().to_pandas()
+        orders = gen.generate_orders_chunk(stores['id'], range(1, 1001), 1, 20000, 0).to_pandas()
+
+        store_share = orders['store_id'].value_counts(normalize=True)
+        assert store_share.iloc[0] > 0.2
+        assert orders['user_id'].value_counts().iloc[0] > 20000 / 1000 * 10
+        assert stores['city'].str.startswith('Город_').all()
+
+        months = orders['created_at'].dt.month.value_counts()
+        assert months[12] > 3 * months[6]
+        hours = orders['created_at'].dt.hour.value_counts()
+        assert hours[19] > 5 * hours[3]
+
+    def test_zipf_same_popular_store_across_workers(self, tmp_path):
+        from data_generator import DataGenerator
+
+        # без seed: все куски, в том числе из разных процессов, ранжируют магазины одинаково
+        gen = DataGenerator(num_stores=50, num_orders=40000, distributions={
+            'store_popularity': 'zipf', 'store_zipf_a': 1.5
+        })
+        gen.write_orders_chunked(tmp_path / 'orders.parquet', range(1, 51), range(1, 1001),
+                                 chunk_size=10000, workers=2)
+
+        orders = pq.ParquetFile(tmp_path / 'orders.parquet')
+        top_stores = {
+            orders.read_row_group(index, columns=['store_id']).to_pandas()['store_id'].value_counts().index[0]
+            for index in range(orders.num_row_groups)
+        }
+        assert orders.num_row_groups == 4
+        assert len(top_stores) == 1
+
+    def test_late_arrivals(self):
+        from data_generator import DataGenerator
+
+        gen = DataGenerator(num_orders=10000, seed=1, distributions={
+            'late_arrival_ratio': 0.1, 'late_arrival_max_days': 60
+        })
+        orders = gen.generate_orders_chunk([1, 2], [1, 2], 1, 10000, 0).to_pandas()
+
+        # опоздавшие заказы нарушают порядок времени по id
+        out_of_order = (orders['created_at'].diff().dt.total_seconds() < 0).mean()
+        assert 0.05 < out_of_order < 0.15
+        assert (orders['created_at'].dt.year == 2024).any()
+
+    def test_from_config(self):
+        from data_generator import DataGenerator
+        from config import load_config
+
+        gen = DataGenerator.from_config(load_config(), num_orders=5, seed=3)
+        assert gen.num_orders == 5
+        assert gen.num_users == 10000
+        assert gen.seed == 3
+        assert gen.distributions['user_popularity'] == 'uniform'
+        assert gen.cities[0] == 'Москва'
+
+    def test_fast_generation_reproducible(self, tmp_path):
+        from data_generator import DataGenerator
+
+        DataGenerator(num_users=100, num_orders=1000, seed=7).generate_all_fast(tmp_path / 'a', chunk_size=250)
+        DataGenerator(num_users=100, num_orders=1000, seed=7).generate_all_fast(
+            tmp_path / 'b', chunk_size=250, workers=2)
+
+        for name in ['stores', 'users', 'orders']:
+            pd.testing.assert_frame_equal(
+                pd.read_parquet(tmp_path / 'a' / f'{name}.parquet'),
+                pd.read_parquet(tmp_path / 'b' / f'{name}.parquet')
+            )
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v', '--tb=short'])
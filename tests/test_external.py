@@ -0,0 +1,95 @@
+# тесты внешней агрегации со spill на диск
+
+
+import pytest
+import json
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_generator import DataGenerator
+from dimensions import EligibleUsers, StoreDimension
+from etl_process import StoreAnalyticsETL
+from external import ExternalAggregator, plan_partitions
+
+
+@pytest.fixture(scope='module')
+def input_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp('external')
+    DataGenerator(num_stores=300, num_users=2000, num_orders=40000, seed=5).generate_all_fast(path, chunk_size=10000)
+    return path
+
+
+class TestExternalAggregator:
+    @pytest.fixture
+    def sample(self):
+        # разреженные id, в каждой группе (город, название) по несколько магазинов
+        rng = np.random.default_rng(3)
+        stores = pd.DataFrame({
+            'id': np.arange(1, 201) * 10**7,
+            'name': [f'Store_{i % 50}' for i in range(200)],
+            'city': [f'City_{i % 10}' for i in range(200)],
+        })
+        orders = pd.DataFrame({
+            'user_id': rng.integers(1, 500, 20000),
+            'store_id': rng.choice(np.append(stores['id'].to_numpy(), 5), 20000),
+            'amount': rng.random(20000) * 1000,
+        })
+        return stores, EligibleUsers(np.arange(1, 300)), orders
+
+    def expected(self, stores, eligible, orders, n):
+        dimension = StoreDimension(stores)
+        filtered = orders[eligible.contains(orders['user_id'])]
+        totals, counts = dimension.aggregate(dimension.codes(filtered['store_id']), filtered['amount'])
+        return dimension.top_n(totals, counts, n=n)
+
+    @pytest.mark.parametrize('partitions', [1, 3, 16])
+    def test_matches_in_memory(self, sample, tmp_path, partitions):
+        stores, eligible, orders = sample
+        # бюджет в несколько килобайт - spill почти на каждом батче
+        with ExternalAggregator(StoreDimension(stores), eligible, 16 * 1024, tmp_path, partitions) as aggregator:
+            for start in range(0, len(orders), 1000):
+                aggregator.update(orders.iloc[start:start + 1000])
+            result = aggregator.top_n(n=2)
+
+        # суммы совпадают точно, не только с точностью до округления
+        pd.testing.assert_frame_equal(result, self.expected(stores, eligible, orders, 2), check_exact=True)
+        assert aggregator.stats['spills'] > 1
+        assert aggregator.rows == int(eligible.contains(orders['user_id']).sum())
+        assert aggregator.stats['max_partition_rows'] < aggregator.stats['spilled_rows'] or partitions == 1
+        assert list(tmp_path.iterdir()) == []
+
+    def test_spill_removed_on_error(self, sample, tmp_path):
+        stores, eligible, orders = sample
+        with pytest.raises(KeyError):
+            with ExternalAggregator(StoreDimension(stores), eligible, 1024, tmp_path, 4) as aggregator:
+                aggregator.update(orders)
+                aggregator.update(orders.drop(columns='amount'))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_plan_partitions(self):
+        assert plan_partitions(0, 1024) == 1
+        assert plan_partitions(10**6, 32 * 10**6) == 1
+        assert plan_partitions(10**6, 4 * 10**6) == 8
+        assert plan_partitions(10**9, 10**6, max_partitions=64) == 64
+
+
+class TestExternalMode:
+    def test_same_result_as_full(self, input_dir, tmp_path):
+        expected = StoreAnalyticsETL(input_dir, tmp_path / 'full', tmp_path / 'full_logs').run()
+
+        etl = StoreAnalyticsETL(input_dir, tmp_path / 'external', tmp_path / 'logs', mode='external',
+                                batch_size=5000, external={'memory_budget_mb': 0.1, 'spill_dir': tmp_path / 'spill'})
+        result = etl.run()
+
+        pd.testing.assert_frame_equal(result, expected, check_exact=True)
+        assert etl.metrics['external']['partitions'] > 1
+        assert etl.metrics['records_processed']['orders_filtered'] > 0
+        assert list((tmp_path / 'spill').iterdir()) == []
+
+        metrics = json.loads(sorted((tmp_path / 'logs').glob('metrics_*.json'))[-1].read_text(encoding='utf-8'))
+        assert metrics['external']['spilled_rows'] > 0
+        assert {'spill_orders', 'aggregate_partitions'} <= {record['stage'] for record in metrics['stages']}
@@ -0,0 +1,112 @@
+# тесты инкрементального режима
+
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from etl_process import StoreAnalyticsETL
+
+
+def make_users(num_users, rng):
+    return pd.DataFrame({
+        'id': np.arange(1, num_users + 1),
+        'name': [f'User_{i}' for i in range(1, num_users + 1)],
+        'phone': ['+71111111111'] * num_users,
+        'created_at': [datetime(int(year), 5, 1) for year in rng.choice([2024, 2025], size=num_users)]
+    })
+
+
+def make_orders(start_id, num_orders, max_user_id, rng):
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + num_orders),
+        'amount': rng.uniform(100, 10000, size=num_orders).round(2),
+        'user_id': rng.integers(1, max_user_id + 1, size=num_orders),
+        'store_id': rng.integers(1, 7, size=num_orders),
+        'status': ['completed'] * num_orders,
+        'created_at': [datetime(2025, 6, 1)] * num_orders
+    })
+
+
+class TestIncrementalMode:
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        rng = np.random.default_rng(3)
+        pd.DataFrame({
+            'id': np.arange(1, 7),
+            'name': [f'Store_{i}' for i in range(1, 7)],
+            'city': ['Moscow', 'Moscow', 'Moscow', 'Moscow', 'SPB', 'SPB']
+        }).to_parquet(tmp_path / 'stores.parquet', index=False)
+        make_users(50, rng).to_parquet(tmp_path / 'users.parquet', index=False)
+        # заказы пользователей 51-80 приходят раньше самих пользователей
+        make_orders(1, 300, 80, rng).to_parquet(tmp_path / 'orders.parquet', index=False, row_group_size=100)
+        return tmp_path
+
+    def run(self, input_dir, mode):
+        etl = StoreAnalyticsETL(input_dir, input_dir / f'out_{mode}', input_dir / 'logs', mode=mode)
+        return etl.run(), etl.metrics['records_processed']
+
+    def test_first_run_matches_full(self, input_dir):
+        full, _ = self.run(input_dir, 'full')
+        incremental, stats = self.run(input_dir, 'incremental')
+
+        pd.testing.assert_frame_equal(full, incremental)
+        assert (input_dir / 'out_incremental' / 'etl_state.json').exists()
+        assert stats['users_new'] == stats['users_2025']
+
+    def test_delta_run(self, input_dir):
+        rng = np.random.default_rng(4)
+        self.run(input_dir, 'incremental')
+
+        # новые пользователи 51-80 (их старые заказы уже лежат в файле) и новые заказы
+        users = make_users(80, rng)
+        users.iloc[:50] = pd.read_parquet(input_dir / 'users.parquet')
+        users.to_parquet(input_dir / 'users.parquet', index=False)
+
+        orders = pd.read_parquet(input_dir / 'orders.parquet')
+        orders = pd.concat([orders, make_orders(301, 150, 80, rng)], ignore_index=True)
+        orders.to_parquet(input_dir / 'orders.parquet', index=False, row_group_size=100)
+
+        incremental, stats = self.run(input_dir, 'incremental')
+        full, _ = self.run(input_dir, 'full')
+
+        pd.testing.assert_frame_equal(full, incremental)
+        new_eligible = users[(users['id'] > 50) & (users['created_at'].dt.year == 2025)]['id']
+        assert stats['orders_backfill'] == int(orders.iloc[:300]['user_id'].isin(new_eligible).sum()) > 0
+        assert stats['orders_new'] <= 150
+
+    def test_no_changes(self, input_dir):
+        first, _ = self.run(input_dir, 'incremental')
+        second, stats = self.run(input_dir, 'incremental')
+
+        pd.testing.assert_frame_equal(first, second)
+        assert stats['orders_new'] == 0
+        assert stats['users_new'] == 0
+
+    def test_regenerated_orders_reset_state(self, input_dir):
+        self.run(input_dir, 'incremental')
+
+        rng = np.random.default_rng(5)
+        make_orders(1, 100, 50, rng).to_parquet(input_dir / 'orders.parquet', index=False)
+
+        incremental, _ = self.run(input_dir, 'incremental')
+        full, _ = self.run(input_dir, 'full')
+        pd.testing.assert_frame_equal(full, incremental)
+
+    def test_regenerated_with_same_ids_reset_state(self, input_dir):
+        # generate с другим seed: те же id заказов 1..300 и пользователей 1..50, другие значения
+        self.run(input_dir, 'incremental')
+
+        rng = np.random.default_rng(6)
+        make_users(50, rng).to_parquet(input_dir / 'users.parquet', index=False)
+        make_orders(1, 300, 80, rng).to_parquet(input_dir / 'orders.parquet', index=False, row_group_size=100)
+
+        incremental, stats = self.run(input_dir, 'incremental')
+        full, _ = self.run(input_dir, 'full')
+        pd.testing.assert_frame_equal(full, incremental)
+        assert stats['orders_new'] == stats['orders_filtered']
@@ -0,0 +1,176 @@
+# тесты micro-batch режима
+
+
+import pytest
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_generator import DataGenerator
+from etl_process import StoreAnalyticsETL
+from microbatch import STATUS_FILE, LocalPartSource, MicroBatchETL, S3PartSource
+
+
+@pytest.fixture(scope='module')
+def generated(tmp_path_factory):
+    path = tmp_path_factory.mktemp('microbatch')
+    DataGenerator(num_stores=20, num_users=500, num_orders=6000, seed=11).generate_all_fast(path, chunk_size=2000)
+    return path
+
+
+@pytest.fixture
+def input_dir(generated, tmp_path):
+    # половина заказов - база orders.parquet, остальное придет частями
+    input_dir = tmp_path / 'input'
+    input_dir.mkdir()
+    for name in ('stores.parquet', 'users.parquet'):
+        shutil.copy(generated / name, input_dir / name)
+    orders = pd.read_parquet(generated / 'orders.parquet')
+    orders.iloc[:3000].to_parquet(input_dir / 'orders.parquet', index=False)
+    (input_dir / 'orders').mkdir()
+    return input_dir
+
+
+def write_parts(input_dir, orders, count):
+    for index, rows in enumerate(np.array_split(np.arange(len(orders)), count)):
+        orders.iloc[rows].to_parquet(input_dir / 'orders' / f'part-{index:03}.parquet', index=False)
+
+
+def make_microbatch(input_dir, tmp_path, **kwargs):
+    etl = StoreAnalyticsETL(input_dir, tmp_path / 'output', tmp_path / 'logs')
+    return MicroBatchETL(etl, LocalPartSource(input_dir / 'orders'), **kwargs)
+
+
+def expected(input_dir, tmp_path):
+    return StoreAnalyticsETL(input_dir, tmp_path / 'expected', tmp_path / 'logs').run()
+
+
+def assert_same_result(result, other):
+    pd.testing.assert_frame_equal(result.astype({'city': str, 'store_name': str}),
+                                  other.astype({'city': str, 'store_name': str}), check_exact=False)
+
+
+class TestMicroBatch:
+    def test_parts_match_full_run(self, generated, input_dir, tmp_path):
+        microbatch = make_microbatch(input_dir, tmp_path, publish_interval=0)
+        microbatch.start()
+        first = microbatch.publish()
+
+        write_parts(input_dir, pd.read_parquet(generated / 'orders.parquet').iloc[3000:], 4)
+        assert microbatch.cycle() == 4
+        result = pd.read_parquet(tmp_path / 'output' / 'result.parquet')
+
+        assert not result.equals(first)
+        assert_same_result(result, expected(generated, tmp_path))
+        # уже учтенные части второй раз не читаются
+        assert microbatch.cycle() == 0
+        with open(tmp_path / 'output' / STATUS_FILE, encoding='utf-8') as f:
+            status = json.load(f)
+        assert status['files'] == 4
+        assert status['rows'] == 3000
+
+    def test_backpressure(self, generated, input_dir, tmp_path):
+        write_parts(input_dir, pd.read_parquet(generated / 'orders.parquet').iloc[3000:], 6)
+        microbatch = make_microbatch(input_dir, tmp_path, poll_interval=0, publish_interval=3600,
+                                     max_files_per_cycle=1, max_pending=2)
+        microbatch.start()
+
+        assert microbatch.cycle() == 1
+        assert len(microbatch.seen) == 2
+        assert len(microbatch.pending) == 1
+        assert microbatch.stats['publishes'] == 1
+
+        # публикация не чаще publish_interval, очередь не длиннее max_pending
+        microbatch.run(max_cycles=10)
+        assert microbatch.stats['files'] == 6
+        assert microbatch.stats['max_pending'] == 2
+        assert microbatch.stats['publishes'] == 2
+        assert_same_result(pd.read_parquet(tmp_path / 'output' / 'result.parquet'),
+                           expected(generated, tmp_path))
+
+    def test_incomplete_and_hidden_parts(self, generated, input_dir, tmp_path):
+        orders = pd.read_parquet(generated / 'orders.parquet').iloc[3000:]
+        orders.to_parquet(input_dir / 'orders' / '.part-000.parquet.tmp', index=False)
+        orders.to_parquet(input_dir / 'orders' / '_part-000.parquet', index=False)
+        data = (input_dir / 'orders' / '_part-000.parquet').read_bytes()
+        (input_dir / 'orders' / 'part-000.parquet').write_bytes(data[:len(data) // 2])
+
+        microbatch = make_microbatch(input_dir, tmp_path, publish_interval=0)
+        microbatch.start()
+        assert microbatch.cycle() == 0
+
+        (input_dir / 'orders' / 'part-000.parquet').write_bytes(data)
+        assert microbatch.cycle() == 1
+
+    def test_new_users_refold(self, generated, input_dir, tmp_path):
+        write_parts(input_dir, pd.read_parquet(generated / 'orders.parquet').iloc[3000:], 2)
+        microbatch = make_microbatch(input_dir, tmp_path, publish_interval=0)
+        microbatch.start()
+        microbatch.cycle()
+
+        # пользователи 2024 года перерегистрированы в 2025: их старые заказы теперь учитываются
+        users = pd.read_parquet(input_dir / 'users.parquet')
+        users.loc[users['created_at'].dt.year == 2024, 'created_at'] = pd.Timestamp('2025-03-01')
+        users.to_parquet(input_dir / 'users.parquet', index=False)
+
+        microbatch.cycle()
+        assert microbatch.stats['refolds'] == 1
+
+        full = tmp_path / 'full'
+        full.mkdir()
+        for name in ('stores.parquet', 'orders.parquet'):
+            shutil.copy(generated / name, full / name)
+        users.to_parquet(full / 'users.parquet', index=False)
+        assert_same_result(pd.read_parquet(tmp_path / 'output' / 'result.parquet'), expected(full, tmp_path))
+
+    def test_quarantine_written_on_publish(self, generated, input_dir, tmp_path):
+        orders = pd.read_parquet(generated / 'orders.parquet').iloc[3000:].reset_index(drop=True)
+        orders.loc[0, 'amount'] = -1.0
+        write_parts(input_dir, orders, 2)
+        etl = StoreAnalyticsETL(input_dir, tmp_path / 'output', tmp_path / 'logs', quarantine=True)
+        microbatch = MicroBatchETL(etl, LocalPartSource(input_dir / 'orders'), publish_interval=0)
+        microbatch.start()
+        microbatch.cycle()
+
+        quarantine_dir = tmp_path / 'output' / 'quarantine'
+        assert len(pd.read_parquet(quarantine_dir)) == 1
+        assert etl.validator.quarantined_rows == {}
+
+        # пересчет после смены справочников: строки частей не учитываются дважды
+        users = pd.read_parquet(input_dir / 'users.parquet')
+        users.loc[users['created_at'].dt.year == 2024, 'created_at'] = pd.Timestamp('2025-03-01')
+        users.to_parquet(input_dir / 'users.parquet', index=False)
+        microbatch.cycle()
+
+        assert microbatch.stats['refolds'] == 1
+        assert etl.validator.report.rows_checked['orders'] == 6000
+        assert etl.validator.report.quarantined == {'orders': 1}
+        assert len(list(quarantine_dir.iterdir())) == 1
+        assert pd.read_parquet(quarantine_dir)['amount'].tolist() == [-1.0]
+
+
+class TestS3PartSource:
+    def test_list_and_read(self, generated, monkeypatch):
+        moto = pytest.importorskip('moto')
+        from s3_handler import S3Handler
+
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        with moto.mock_aws():
+            handler = S3Handler(None, 'test', 'test', 'etl-test')
+            handler.ensure_bucket_exists()
+            orders = pd.read_parquet(generated / 'orders.parquet').iloc[:100]
+            handler.write_parquet_to_s3(orders, 'input/orders/part-000.parquet')
+            handler.write_parquet_to_s3(orders, 'input/orders/_tmp.parquet')
+            handler.write_parquet_to_s3(orders, 'input/orders.parquet')
+
+            source = S3PartSource(handler)
+            parts = source.list()
+            assert [part.name for part in parts] == ['input/orders/part-000.parquet']
+            batch = next(source.read(parts[0]))
+            assert list(batch.columns) == ['user_id', 'store_id', 'amount']
+            assert len(batch) == 100
@@ -0,0 +1,111 @@
+# тесты моделей и колоночных контейнеров
+
+
+import pytest
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from models import Order, OrderBatch, Store, User, UserBatch
+
+
+@pytest.fixture
+def orders_df():
+    return pd.DataFrame({
+        'id': [1, 2, 3],
+        'amount': [100.0, 250.5, 0.0],
+        'user_id': [10, 11, 10],
+        'store_id': [1, 2, 1],
+        'status': ['completed', 'pending', 'completed'],
+        'created_at': [datetime(2025, 1, 1), datetime(2025, 2, 1, 12, 30), datetime(2024, 12, 31)]
+    })
+
+
+@pytest.fixture
+def users_df():
+    return pd.DataFrame({
+        'id': [10, 11],
+        'name': ['User_10', 'User_11'],
+        'phone': ['+7900', '+7901'],
+        'created_at': [datetime(2025, 3, 1), datetime(2024, 3, 1)]
+    })
+
+
+class TestModels:
+    def test_slots(self):
+        store = Store(id=1, name='Store_A', city='Moscow')
+
+        assert not hasattr(store, '__dict__')
+        with pytest.raises(AttributeError):
+            store.extra = 1
+
+    def test_validation_kept(self):
+        with pytest.raises(ValueError):
+            Order(id=1, amount=-1.0, user_id=1, store_id=1, status='completed', created_at=datetime(2025, 1, 1))
+
+
+class TestOrderBatch:
+    def test_row_views(self, orders_df):
+        batch = OrderBatch.from_pandas(orders_df)
+        row = batch[1]
+
+        assert len(batch) == 3
+        assert (row.id, row.amount, row.status) == (2, 250.5, 'pending')
+        assert row.created_at == datetime(2025, 2, 1, 12, 30)
+        assert [view.store_id for view in batch] == [1, 2, 1]
+        assert batch[-1].id == 3
+        with pytest.raises(IndexError):
+            batch[3]
+
+    def test_to_model(self, orders_df):
+        order = OrderBatch.from_pandas(orders_df)[0].to_model()
+
+        assert isinstance(order, Order)
+        assert order.to_dict()['amount'] == 100.0
+
+    def test_typed_storage(self, orders_df):
+        batch = OrderBatch.from_pandas(orders_df)
+
+        assert batch.columns['id'].dtype == np.int64
+        assert batch.columns['created_at'].dtype == np.int64
+        assert batch.columns['status'].codes.dtype == np.int8
+        assert batch.nbytes == 3 * (8 * 5 + 1)
+
+    def test_from_pandas_no_copy(self, orders_df):
+        batch = OrderBatch.from_pandas(orders_df)
+
+        assert np.shares_memory(batch.columns['amount'], orders_df['amount'].to_numpy())
+
+    def test_pandas_arrow_roundtrip(self, orders_df):
+        batch = OrderBatch.from_pandas(orders_df)
+        table = batch.to_arrow()
+
+        assert pa.types.is_dictionary(table.schema.field('status').type)
+        restored = OrderBatch.from_arrow(table).to_pandas()
+        pd.testing.assert_frame_equal(restored, batch.to_pandas())
+        pd.testing.assert_frame_equal(restored.astype({'status': 'str'}), orders_df, check_dtype=False)
+
+    def test_from_records(self, orders_df):
+        records = [Order(**row) for row in orders_df.to_dict('records')]
+        batch = OrderBatch.from_records(records)
+
+        assert [view.to_model() for view in batch] == records
+
+
+class TestUserBatch:
+    def test_registered_in(self, users_df):
+        batch = UserBatch.from_pandas(users_df)
+
+        assert list(batch.registered_in(2025)) == [True, False]
+        assert batch[0].to_model() == User(**users_df.iloc[0].to_dict())
+
+    def test_arrow_roundtrip(self, users_df):
+        batch = UserBatch.from_arrow(pa.Table.from_pandas(users_df))
+
+        assert batch[1].name == 'User_11'
+        pd.testing.assert_frame_equal(batch.to_pandas(), users_df, check_dtype=False)
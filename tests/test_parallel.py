@@ -0,0 +1,95 @@
+# тесты параллельного режима
+
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from dimensions import EligibleUsers, StoreDimension
+from etl_process import StoreAnalyticsETL
+from parallel import aggregate_parallel, plan_tasks
+
+
+class TestParallelMode:
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        rng = np.random.default_rng(7)
+        stores = pd.DataFrame({
+            'id': np.arange(1, 21),
+            'name': [f'Store_{i}' for i in range(1, 21)],
+            'city': rng.choice(['Moscow', 'SPB', 'Kazan'], size=20)
+        })
+        users = pd.DataFrame({
+            'id': np.arange(1, 501),
+            'name': [f'User_{i}' for i in range(1, 501)],
+            'phone': ['+71111111111'] * 500,
+            'created_at': [datetime(int(year), 3, 1) for year in rng.choice([2024, 2025], size=500)]
+        })
+        orders = pd.DataFrame({
+            'id': np.arange(1, 5001),
+            'amount': rng.uniform(100, 10000, size=5000).round(2),
+            'user_id': rng.integers(1, 501, size=5000),
+            'store_id': rng.integers(1, 22, size=5000),
+            'status': ['completed'] * 5000,
+            'created_at': [datetime(2025, 1, 1)] * 5000
+        })
+        stores.to_parquet(tmp_path / 'stores.parquet', index=False)
+        users.to_parquet(tmp_path / 'users.parquet', index=False)
+        orders.to_parquet(tmp_path / 'orders.parquet', index=False, row_group_size=700)
+        return tmp_path
+
+    def test_parallel_matches_full(self, input_dir):
+        full = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs').run()
+        etl = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs', mode='parallel', workers=2)
+        parallel = etl.run()
+
+        pd.testing.assert_frame_equal(full, parallel)
+        assert etl.metrics['records_processed']['orders'] == 5000
+
+    def test_sparse_users_shared(self, input_dir):
+        stores = pd.read_parquet(input_dir / 'stores.parquet')
+        orders = pd.read_parquet(input_dir / 'orders.parquet')
+        dimension = StoreDimension(stores)
+
+        dense = EligibleUsers(np.arange(1, 251))
+        # искусственно разреженный индекс с теми же пользователями
+        sparse = EligibleUsers(np.append(np.arange(1, 251), 10**12))
+        assert dense.dense and not sparse.dense
+
+        dense_totals, dense_counts, dense_rows = aggregate_parallel(
+            input_dir / 'orders.parquet', dense, dimension, workers=2)
+        sparse_totals, sparse_counts, sparse_rows = aggregate_parallel(
+            input_dir / 'orders.parquet', sparse, dimension, workers=2)
+
+        assert dense_rows == sparse_rows == int((orders['user_id'] <= 250).sum())
+        np.testing.assert_array_equal(dense_counts, sparse_counts)
+        np.testing.assert_allclose(dense_totals, sparse_totals)
+
+    def test_row_group_split_into_ranges(self, input_dir):
+        # один row group на несколько процессов - задачи-диапазоны из shared memory
+        orders = pd.read_parquet(input_dir / 'orders.parquet')
+        orders.to_parquet(input_dir / 'single.parquet', index=False)
+        stores = pd.read_parquet(input_dir / 'stores.parquet')
+        dimension = StoreDimension(stores)
+        eligible = EligibleUsers(np.arange(1, 251))
+
+        whole = aggregate_parallel(input_dir / 'single.parquet', eligible, dimension, workers=1)
+        split = aggregate_parallel(input_dir / 'single.parquet', eligible, dimension, workers=3,
+                                   min_task_rows=1000)
+
+        assert whole[2] == split[2] == int((orders['user_id'] <= 250).sum())
+        np.testing.assert_array_equal(whole[1], split[1])
+        np.testing.assert_allclose(whole[0], split[0])
+
+    def test_plan_tasks(self):
+        # row group'ов не меньше чем процессов - не делятся
+        assert plan_tasks([10**6] * 4, workers=4) == [(i, None, None) for i in range(4)]
+        assert plan_tasks([10**6], workers=4) == [(0, 0, 250000), (0, 250000, 500000),
+                                                  (0, 500000, 750000), (0, 750000, 1000000)]
+        # маленький row group не делится мельче MIN_TASK_ROWS
+        assert plan_tasks([250_000, 10], workers=8) == [(0, 0, 125000), (0, 125000, 250000), (1, None, None)]
@@ -0,0 +1,121 @@
+# тесты секционированного результата
+
+
+import pytest
+import json
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import partitioned
+from partitioned import MANIFEST_FILE, PartitionedParquetSink, load_manifest, read_partitioned
+from writers import ResultWriter
+
+
+@pytest.fixture
+def result():
+    return pd.DataFrame({
+        'city': pd.Categorical(['Москва', 'Москва', 'Санкт-Петербург', 'Нижний Новгород']),
+        'store_name': pd.Categorical(['Магазин_2', 'Магазин_1', 'Магазин_3', 'Магазин_4']),
+        'target_amount': [1500.0, 900.0, 700.0, 50.0],
+    })
+
+
+def write(root, df, run_date, **kwargs):
+    sink = PartitionedParquetSink(root, run_date=run_date, **kwargs)
+    ResultWriter([sink]).write(df)
+    return sink
+
+
+class TestPartitionedSink:
+    def test_layout_and_statistics(self, result, tmp_path):
+        write(tmp_path, result, '2025-06-01', bloom_filter=True)
+
+        path = tmp_path / 'city=%D0%9C%D0%BE%D1%81%D0%BA%D0%B2%D0%B0' / 'run_date=2025-06-01' / 'part-0.parquet'
+        assert path.exists()
+        metadata = pq.ParquetFile(path).metadata
+        assert metadata.schema.names == ['store_name', 'target_amount']
+        stats = metadata.row_group(0).column(0).statistics
+        assert (stats.min, stats.max) == ('Магазин_1', 'Магазин_2')
+        assert metadata.row_group(0).sorting_columns[0].column_index == 0
+        assert metadata.row_group(0).column(0).bloom_filter_offset is not None
+        assert pq.read_table(path)['store_name'].to_pylist() == ['Магазин_1', 'Магазин_2']
+
+    def test_bloom_filter_skipped_on_old_pyarrow(self, result, tmp_path, monkeypatch, caplog):
+        # pyarrow без bloom_filter_options: секции пишутся без фильтра, с предупреждением
+        monkeypatch.setattr(partitioned, 'WRITER_OPTIONS', partitioned.WRITER_OPTIONS - {'bloom_filter_options'})
+        with caplog.at_level('WARNING', logger='partitioned'):
+            write(tmp_path, result, '2025-06-01', bloom_filter=True)
+
+        assert 'bloom_filter_options' in caplog.text
+        path = tmp_path / 'city=%D0%9C%D0%BE%D1%81%D0%BA%D0%B2%D0%B0' / 'run_date=2025-06-01' / 'part-0.parquet'
+        assert pq.ParquetFile(path).metadata.row_group(0).column(0).bloom_filter_offset is None
+        assert pq.read_table(path)['store_name'].to_pylist() == ['Магазин_1', 'Магазин_2']
+
+    def test_manifest(self, result, tmp_path):
+        write(tmp_path, result, '2025-06-01')
+        manifest = load_manifest(tmp_path)
+
+        assert manifest['latest_run_date'] == '2025-06-01'
+        moscow = next(item for item in manifest['files'] if item['city'] == 'Москва')
+        assert moscow['rows'] == 2
+        assert moscow['target_amount_max'] == 1500.0
+
+    def test_hive_readable_by_pyarrow(self, result, tmp_path):
+        write(tmp_path, result, '2025-06-01')
+        dataset = ds.dataset(tmp_path, format='parquet', partitioning='hive', exclude_invalid_files=True)
+
+        table = dataset.to_table(filter=ds.field('city') == 'Нижний Новгород')
+        assert table['store_name'].to_pylist() == ['Магазин_4']
+
+    def test_unchanged_partitions_skipped(self, result, tmp_path):
+        write(tmp_path, result, '2025-06-01')
+        changed = result.copy()
+        changed.loc[2, 'target_amount'] = 800.0
+
+        sink = write(tmp_path, changed, '2025-06-01')
+        assert sink.skipped == 2
+
+        removed = write(tmp_path, result[result['city'] != 'Москва'], '2025-06-01')
+        assert removed.skipped == 1
+        assert not any(p.name == 'part-0.parquet' for p in (tmp_path / 'city=%D0%9C%D0%BE%D1%81%D0%BA%D0%B2%D0%B0').rglob('*'))
+
+
+class TestReadPartitioned:
+    def test_prunes_by_manifest(self, result, tmp_path):
+        write(tmp_path, result.assign(target_amount=result['target_amount'] / 2), '2025-05-01')
+        write(tmp_path, result, '2025-06-01')
+
+        latest = read_partitioned(tmp_path, cities=['Москва'])
+        assert latest['target_amount'].tolist() == [900.0, 1500.0]
+        assert set(latest['run_date']) == {'2025-06-01'}
+
+        older = read_partitioned(tmp_path, cities=['Москва'], run_date='2025-05-01')
+        assert older['target_amount'].tolist() == [450.0, 750.0]
+
+    def test_filters(self, result, tmp_path):
+        write(tmp_path, result, '2025-06-01')
+
+        assert read_partitioned(tmp_path, store_names=['Магазин_3'])['city'].tolist() == ['Санкт-Петербург']
+        assert sorted(read_partitioned(tmp_path, min_amount=800)['store_name']) == ['Магазин_1', 'Магазин_2']
+        assert read_partitioned(tmp_path, cities=['Казань']).empty
+
+    def test_etl_partitioned_output(self, tmp_path):
+        from etl_process import StoreAnalyticsETL
+
+        input_dir = Path(__file__).parent.parent / 'data' / 'input'
+        if not (input_dir / 'orders.parquet').exists():
+            pytest.skip('нет data/input')
+        etl = StoreAnalyticsETL(input_dir, tmp_path / 'output', tmp_path / 'logs',
+                                output={'partitioned': {'enabled': True}})
+        result = etl.run()
+
+        root = tmp_path / 'output' / 'result_partitioned'
+        assert (root / MANIFEST_FILE).exists()
+        restored = read_partitioned(root)
+        assert len(restored) == len(result)
+        assert json.loads((root / MANIFEST_FILE).read_text(encoding='utf-8'))['files']
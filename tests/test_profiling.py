@@ -0,0 +1,67 @@
+# тесты замеров по этапам
+
+
+import pytest
+import pandas as pd
+from datetime import datetime
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from etl_process import StoreAnalyticsETL
+from profiling import StageProfiler
+
+
+class TestStageProfiler:
+    def test_stage_record(self):
+        profiler = StageProfiler(trace_memory=True)
+        with profiler.stage('work', rows=1000) as stage:
+            data = [0] * 100_000
+            stage['bytes'] = 8 * len(data)
+
+        record = profiler.stages[0]
+        assert record['stage'] == 'work'
+        assert record['wall_seconds'] >= 0
+        assert record['cpu_seconds'] >= 0
+        assert record['peak_rss_mb'] > 0
+        assert record['tracemalloc_peak_delta_mb'] > 0.5
+        assert record['bytes'] == 800_000
+
+    def test_stage_recorded_on_error(self):
+        profiler = StageProfiler()
+        with pytest.raises(ValueError):
+            with profiler.stage('broken'):
+                raise ValueError('boom')
+
+        assert profiler.stages[0]['stage'] == 'broken'
+        assert 'tracemalloc_peak_delta_mb' not in profiler.stages[0]
+
+
+class TestMetricsStages:
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        pd.DataFrame({'id': [1, 2], 'name': ['A', 'B'], 'city': ['Moscow', 'SPB']}) \
+            .to_parquet(tmp_path / 'stores.parquet', index=False)
+        pd.DataFrame({
+            'id': [1, 2], 'name': ['U1', 'U2'], 'phone': ['+7'] * 2,
+            'created_at': [datetime(2025, 1, 1), datetime(2024, 1, 1)]
+        }).to_parquet(tmp_path / 'users.parquet', index=False)
+        pd.DataFrame({
+            'id': [1, 2, 3], 'amount': [10.0, 20.0, 30.0], 'user_id': [1, 1, 2], 'store_id': [1, 2, 1],
+            'status': ['completed'] * 3, 'created_at': [datetime(2025, 2, 1)] * 3
+        }).to_parquet(tmp_path / 'orders.parquet', index=False)
+        return tmp_path
+
+    def test_metrics_json_has_stages(self, input_dir):
+        etl = StoreAnalyticsETL(input_dir, input_dir / 'out', input_dir / 'logs', profile=True)
+        etl.run()
+
+        metrics = json.loads(next((input_dir / 'logs').glob('metrics_*.json')).read_text(encoding='utf-8'))
+        stages = [record['stage'] for record in metrics['stages']]
+        assert stages == ['read_stores', 'read_users', 'read_orders', 'validate', 'filter_users', 'filter_orders',
+                          'merge', 'groupby', 'top_n', 'write_to_arrow', 'write_parquet', 'write_csv']
+        assert metrics['stages'][2]['rows'] == 3
+        assert 'rows_per_second' in metrics['stages'][2]
+        assert list((input_dir / 'logs').glob('profile_*.prof'))
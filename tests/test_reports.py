@@ -0,0 +1,169 @@
+# тесты параметризованных отчетов
+
+
+import pytest
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_generator import DataGenerator
+from etl_process import StoreAnalyticsETL
+from reports import ReportRunner, ReportSpec
+
+
+@pytest.fixture(scope='module')
+def generated(tmp_path_factory):
+    path = tmp_path_factory.mktemp('reports')
+    DataGenerator(num_stores=30, num_users=1500, num_orders=12000, seed=5).generate_all_fast(path, chunk_size=4000)
+    return path
+
+
+@pytest.fixture(scope='module')
+def frames(generated):
+    return {name: pd.read_parquet(generated / f'{name}.parquet') for name in ('stores', 'users', 'orders')}
+
+
+def expected_join(frames, year=None):
+    # медленный эталон: merge + фильтры pandas
+    orders = frames['orders']
+    if year is not None:
+        users = frames['users']
+        orders = orders[orders['user_id'].isin(users.loc[users['created_at'].dt.year == year, 'id'])]
+    return orders.merge(frames['stores'], left_on='store_id', right_on='id', suffixes=('', '_store'))
+
+
+class TestReportSpec:
+    def test_defaults(self):
+        spec = ReportSpec('top', top_n=3)
+
+        assert spec.group_by == ('city', 'store')
+        assert spec.value_column == 'sum_amount'
+        assert spec.order_columns == {'amount', 'store_id'}
+
+    def test_from_dict(self):
+        spec = ReportSpec.from_dict({'name': 'monthly', 'group_by': ['month'], 'measure': 'mean',
+                                     'date_from': '2025-01-01'})
+
+        assert spec.group_by == ('month',)
+        assert spec.order_columns == {'amount', 'created_at'}
+
+    @pytest.mark.parametrize('kwargs', [
+        {'group_by': ['country']},
+        {'measure': 'median'},
+        {'top_n': 0},
+        {'group_by': []},
+    ])
+    def test_invalid(self, kwargs):
+        with pytest.raises(ValueError):
+            ReportSpec('bad', **kwargs)
+
+
+class TestReportRunner:
+    def test_main_result_as_report(self, generated, frames, tmp_path):
+        etl = StoreAnalyticsETL(generated, tmp_path / 'output', tmp_path / 'logs')
+        expected = etl.run()
+
+        spec = ReportSpec('top', top_n=3, target_year=2025, column='target_amount')
+        report = ReportRunner(frames['stores'], frames['users']).run([spec], generated / 'orders.parquet',
+                                                                    batch_size=1000)['top']
+        pd.testing.assert_frame_equal(report, expected)
+
+    def test_several_reports_one_pass(self, frames):
+        specs = [
+            ReportSpec('status_by_city', group_by=('city', 'status'), measure='count', target_year=2025),
+            ReportSpec('monthly_mean', group_by=('month',), measure='mean',
+                       date_from='2025-03-01', date_to='2025-06-01'),
+            ReportSpec('top_status', group_by=('status',), measure='sum', top_n=2),
+        ]
+        runner = ReportRunner(frames['stores'], frames['users'])
+        reports = runner.run(specs, frames['orders'])
+        assert runner.rows == len(frames['orders'])
+
+        joined = expected_join(frames, year=2025)
+        counts = joined.groupby(['city', 'status']).size()
+        actual = reports['status_by_city'].set_index(['city', 'status'])['count_amount']
+        assert actual.astype(int).to_dict() == counts.to_dict()
+
+        orders = expected_join(frames)
+        period = orders[(orders['created_at'] >= '2025-03-01') & (orders['created_at'] < '2025-06-01')]
+        means = period.groupby(period['created_at'].dt.strftime('%Y-%m'))['amount'].mean()
+        monthly = reports['monthly_mean']
+        assert monthly['month'].tolist() == list(means.index)
+        assert np.allclose(monthly['mean_amount'], means.to_numpy())
+
+        sums = orders.groupby('status')['amount'].sum().sort_values(ascending=False).head(2)
+        assert reports['top_status']['status'].tolist() == list(sums.index)
+        assert np.allclose(reports['top_status']['sum_amount'], sums.to_numpy())
+
+    def test_batches_match_whole_frame(self, generated, frames):
+        spec = ReportSpec('by_month', group_by=('city', 'month'), measure='sum', target_year=2025)
+        runner = ReportRunner(frames['stores'], frames['users'])
+
+        batched = runner.run([spec], generated / 'orders.parquet', batch_size=700)['by_month']
+        whole = runner.run([spec], frames['orders'])['by_month']
+        pd.testing.assert_frame_equal(batched, whole)
+
+
+class TestETLParameters:
+    def test_target_year_and_top_n(self, generated, frames, tmp_path):
+        etl = StoreAnalyticsETL(generated, tmp_path / 'output', tmp_path / 'logs', target_year=2024, top_n=1)
+        result = etl.run()
+
+        joined = expected_join(frames, year=2024)
+        best = joined.groupby(['city', 'name'])['amount'].sum().groupby(level='city').max()
+        assert result['city'].is_unique
+        assert np.allclose(result['target_amount'], best.loc[result['city'].tolist()].to_numpy())
+        assert 'users_2024' in etl.metrics['records_processed']
+
+    def test_reports_written(self, generated, tmp_path):
+        etl = StoreAnalyticsETL(generated, tmp_path / 'output', tmp_path / 'logs', reports=[
+            {'name': 'by_status', 'group_by': ['status'], 'measure': 'count'},
+        ])
+        etl.run()
+
+        report = pd.read_parquet(tmp_path / 'output' / 'reports' / 'by_status.parquet')
+        assert report['count_amount'].sum() > 0
+        metrics = json.loads(next((tmp_path / 'logs').glob('metrics_*.json')).read_text(encoding='utf-8'))
+        assert metrics['reports'] == {'by_status': len(report)}
+
+    @pytest.mark.parametrize('mode', ['full', 'streaming'])
+    def test_main_result_in_shared_pass(self, generated, tmp_path, mode):
+        expected = StoreAnalyticsETL(generated, tmp_path / 'plain', tmp_path / 'plain_logs', mode=mode).run()
+        etl = StoreAnalyticsETL(generated, tmp_path / 'output', tmp_path / 'logs', mode=mode, reports=[
+            {'name': 'by_status', 'group_by': ['status'], 'measure': 'count'},
+        ])
+        result = etl.run()
+
+        # основной топ-N - отчет того же прохода, заказы не читаются второй раз
+        pd.testing.assert_frame_equal(result, expected)
+        stages = [record['stage'] for record in etl.profiler.stages]
+        assert stages.count('reports') == 1
+        assert 'stream_orders' not in stages and 'groupby' not in stages
+        assert (tmp_path / 'output' / 'reports' / 'by_status.parquet').exists()
+
+    @pytest.mark.parametrize('mode', ['parallel', 'incremental', 'external'])
+    def test_separate_pass_validated(self, generated, tmp_path, mode):
+        # плохие заказы с карантином не попадают в отчеты ни в одном режиме
+        input_dir = tmp_path / 'input'
+        shutil.copytree(generated, input_dir)
+        orders = pd.read_parquet(input_dir / 'orders.parquet')
+        orders.loc[:9, 'amount'] = -1e6
+        orders.to_parquet(input_dir / 'orders.parquet', index=False)
+        reports = [{'name': 'by_status', 'group_by': ['status'], 'measure': 'sum'}]
+
+        StoreAnalyticsETL(input_dir, tmp_path / 'full', tmp_path / 'full_logs', quarantine=True, reports=reports).run()
+        etl = StoreAnalyticsETL(input_dir, tmp_path / 'output', tmp_path / 'logs', mode=mode, workers=1,
+                                quarantine=True, reports=reports)
+        etl.run()
+
+        expected = pd.read_parquet(tmp_path / 'full' / 'reports' / 'by_status.parquet')
+        report = pd.read_parquet(tmp_path / 'output' / 'reports' / 'by_status.parquet')
+        assert (report['sum_amount'] > 0).all()
+        pd.testing.assert_frame_equal(report, expected, check_exact=False)
+        # нарушения считаются один раз, отдельный проход отчетов их не удваивает
+        assert etl.validator.report.quarantined['orders'] <= 10
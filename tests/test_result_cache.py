@@ -0,0 +1,225 @@
+# тесты кеша результатов
+
+
+import pytest
+import json
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from data_generator import DataGenerator
+from result_cache import CHECKSUM_FILE, INDEX_FILE, ResultCache, parquet_fingerprint
+
+
+@pytest.fixture
+def result():
+    return pd.DataFrame({
+        'city': pd.Categorical(['Москва', 'Москва', 'Самара']),
+        'store_name': pd.Categorical(['Магазин_2', 'Магазин_1', 'Магазин_3']),
+        'target_amount': [1500.0, 900.0, 700.0],
+    })
+
+
+class TestFingerprint:
+    def test_depends_on_content(self, result, tmp_path):
+        path = tmp_path / 'orders.parquet'
+        result.to_parquet(path, index=False)
+        first = parquet_fingerprint(path)
+
+        result.to_parquet(path, index=False)
+        assert parquet_fingerprint(path) == first
+
+        result.assign(target_amount=[1500.0, 900.0, 701.0]).to_parquet(path, index=False)
+        assert parquet_fingerprint(path) != first
+
+    def test_swapped_values_same_size(self, tmp_path):
+        # размеры страниц, min/max и footer те же - отпечаток все равно другой
+        path = tmp_path / 'orders.parquet'
+        orders = pd.DataFrame({'store_id': [1, 2, 1, 2], 'amount': [10.0, 20.0, 30.0, 40.0]})
+        orders.to_parquet(path, index=False, compression=None)
+        first, size = parquet_fingerprint(path), path.stat().st_size
+
+        orders.assign(store_id=[2, 1, 2, 1]).to_parquet(path, index=False, compression=None)
+        assert path.stat().st_size == size
+        assert parquet_fingerprint(path) != first
+
+    def test_md5_cached_by_mtime(self, result, tmp_path, monkeypatch):
+        import hashlib
+
+        path = tmp_path / 'orders.parquet'
+        result.to_parquet(path, index=False)
+        first = parquet_fingerprint(path)
+        assert json.loads((tmp_path / CHECKSUM_FILE).read_text())['orders.parquet']['md5'] == first
+
+        monkeypatch.setattr(hashlib, 'md5', None)
+        assert parquet_fingerprint(path) == first
+
+    def test_not_parquet(self, tmp_path):
+        path = tmp_path / 'data.bin'
+        path.write_bytes(b'abc')
+        first = parquet_fingerprint(path)
+        path.write_bytes(b'abd')
+        assert parquet_fingerprint(path) != first
+
+
+class TestResultCache:
+    def test_key_depends_on_params(self):
+        inputs = {'orders.parquet': 'abc'}
+        assert ResultCache.key(inputs, {'top_n': 3}) == ResultCache.key(inputs, {'top_n': 3})
+        assert ResultCache.key(inputs, {'top_n': 3}) != ResultCache.key(inputs, {'top_n': 2})
+        assert ResultCache.key(inputs, {'top_n': 3}) != ResultCache.key({'orders.parquet': 'abd'}, {'top_n': 3})
+
+    def test_hit_and_miss(self, result, tmp_path):
+        cache = ResultCache(tmp_path)
+        assert cache.get('k1') is None
+
+        cache.put('k1', result)
+        cached = cache.get('k1')
+        pd.testing.assert_frame_equal(cached, result)
+        assert cache.get('k1', kind='aggregates') is None
+
+        # индекс переживает перезапуск
+        reopened = ResultCache(tmp_path)
+        pd.testing.assert_frame_equal(reopened.get('k1'), result)
+        assert reopened.index['k1/result']['hits'] == 2
+
+    def test_evicts_least_recently_used(self, result, tmp_path):
+        cache = ResultCache(tmp_path, max_entries=2)
+        cache.put('k1', result)
+        cache.put('k2', result)
+        cache.get('k1')
+        cache.put('k3', result)
+
+        assert cache.get('k2') is None
+        assert not (tmp_path / 'k2').exists()
+        assert cache.get('k1') is not None
+        assert cache.get('k3') is not None
+
+    def test_evicts_by_size(self, result, tmp_path):
+        cache = ResultCache(tmp_path)
+        cache.put('k1', result)
+        cache.max_bytes = cache.total_bytes
+        cache.put('k2', result)
+
+        assert list(cache.index) == ['k2/result']
+        assert cache.total_bytes <= cache.max_bytes
+
+    def test_corrupted_index(self, result, tmp_path):
+        (tmp_path / INDEX_FILE).write_text('{not json')
+        cache = ResultCache(tmp_path)
+        assert cache.index == {}
+
+        cache.put('k1', result)
+        with open(tmp_path / INDEX_FILE, encoding='utf-8') as f:
+            assert list(json.load(f)) == ['k1/result']
+
+
+class TestRunnerCache:
+    @pytest.fixture
+    def workdir(self, tmp_path, monkeypatch):
+        pytest.importorskip('boto3')
+        generator = DataGenerator(num_stores=30, num_users=1000, num_orders=5000, seed=5)
+        generator.generate_all_fast(tmp_path / 'data' / 'input', chunk_size=2500)
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv('ETL_CACHE', raising=False)
+        return tmp_path
+
+    def configure(self, workdir, monkeypatch, top_n, **etl_config):
+        config = {'etl': {'top_n': top_n, 'cache': {'enabled': True, 'dir': str(workdir / 'cache')}, **etl_config}}
+        (workdir / 'config.yaml').write_text(json.dumps(config))
+        monkeypatch.setenv('ETL_CONFIG', str(workdir / 'config.yaml'))
+
+    def test_hit_skips_etl(self, workdir, monkeypatch):
+        from main import ETLRunner
+        import etl_process
+
+        self.configure(workdir, monkeypatch, top_n=3)
+        first = ETLRunner('local').run()
+
+        def fail(self):
+            raise AssertionError("ETL не должен запускаться при попадании в кеш")
+
+        monkeypatch.setattr(etl_process.StoreAnalyticsETL, 'run', fail)
+        (workdir / 'data' / 'output' / 'result.csv').unlink()
+
+        second = ETLRunner('local').run()
+        pd.testing.assert_frame_equal(second, first)
+        assert (workdir / 'data' / 'output' / 'result.csv').exists()
+
+    def test_other_top_n_from_aggregates(self, workdir, monkeypatch):
+        from main import ETLRunner
+        from etl_process import StoreAnalyticsETL
+        import etl_process
+
+        etl = StoreAnalyticsETL(workdir / 'data' / 'input', workdir / 'expected', workdir / 'logs', top_n=2)
+        expected = etl.run()
+
+        self.configure(workdir, monkeypatch, top_n=3)
+        ETLRunner('local').run()
+
+        monkeypatch.setattr(etl_process.StoreAnalyticsETL, 'run',
+                            lambda self: pytest.fail("ETL не должен запускаться"))
+        self.configure(workdir, monkeypatch, top_n=2)
+        result = ETLRunner('local').run()
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_changed_input_misses(self, workdir, monkeypatch):
+        from main import ETLRunner
+
+        self.configure(workdir, monkeypatch, top_n=3)
+        runner = ETLRunner('local')
+        runner.run()
+        assert runner.etl is not None
+
+        orders = pd.read_parquet(workdir / 'data' / 'input' / 'orders.parquet')
+        orders['amount'] = orders['amount'] * 2
+        orders.to_parquet(workdir / 'data' / 'input' / 'orders.parquet', index=False)
+
+        runner = ETLRunner('local')
+        result = runner.run()
+        assert runner.etl is not None
+        assert len(runner.cache.index) == 4
+        assert len(result) > 0
+
+    def test_swapped_store_ids_miss(self, workdir, monkeypatch):
+        from main import ETLRunner
+
+        input_dir = workdir / 'data' / 'input'
+        orders = pd.read_parquet(input_dir / 'orders.parquet')
+        orders.to_parquet(input_dir / 'orders.parquet', index=False, compression=None)
+        self.configure(workdir, monkeypatch, top_n=3)
+        ETLRunner('local').run()
+
+        # магазины 1 и 2 меняются заказами: размер файла и статистика footer'а не меняются
+        size = (input_dir / 'orders.parquet').stat().st_size
+        orders['store_id'] = orders['store_id'].replace({1: 2, 2: 1})
+        orders.to_parquet(input_dir / 'orders.parquet', index=False, compression=None)
+        assert (input_dir / 'orders.parquet').stat().st_size == size
+
+        runner = ETLRunner('local')
+        result = runner.run()
+        assert runner.etl is not None
+
+        monkeypatch.setenv('ETL_CACHE', '0')
+        pd.testing.assert_frame_equal(result, ETLRunner('local').run())
+
+    def test_reports_and_partitioned_bypass_cache(self, workdir, monkeypatch):
+        from main import ETLRunner
+
+        self.configure(workdir, monkeypatch, top_n=3, reports=[])
+        first = ETLRunner('local').run()
+
+        # отчеты и секции пишет только ETL - кеш не должен их пропускать
+        self.configure(workdir, monkeypatch, top_n=3,
+                       reports=[{'name': 'by_status', 'group_by': ['status'], 'measure': 'count'}],
+                       output={'partitioned': {'enabled': True}})
+        runner = ETLRunner('local')
+        result = runner.run()
+
+        assert runner.etl is not None
+        pd.testing.assert_frame_equal(result, first)
+        assert (workdir / 'data' / 'output' / 'reports' / 'by_status.parquet').exists()
+        assert (workdir / 'data' / 'output' / 'result_partitioned').is_dir()
@@ -0,0 +1,221 @@
+# тесты работы с S3 (moto вместо MinIO)
+
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+moto = pytest.importorskip('moto')
+
+from main import S3Handler
+from s3_io import S3MultipartWriter, S3RangeReader
+
+
+@pytest.fixture
+def s3_handler(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        handler = S3Handler(None, 'test', 'test', 'etl-test')
+        handler.ensure_bucket_exists()
+        yield handler
+
+
+class TestS3InMemory:
+    @pytest.fixture
+    def orders(self):
+        rng = np.random.default_rng(1)
+        return pd.DataFrame({
+            'id': np.arange(1, 10001),
+            'amount': rng.uniform(100, 10000, size=10000).round(2),
+            'user_id': rng.integers(1, 100, size=10000),
+            'store_id': rng.integers(1, 10, size=10000),
+            'status': ['completed'] * 10000,
+            'created_at': [datetime(2025, 1, 1)] * 10000
+        })
+
+    def test_roundtrip(self, s3_handler, orders):
+        s3_handler.write_parquet_to_s3(orders, 'input/orders.parquet')
+        result = s3_handler.read_parquet_from_s3('input/orders.parquet')
+
+        pd.testing.assert_frame_equal(result, orders)
+
+    def test_projection_reads_part_of_object(self, s3_handler, orders, tmp_path):
+        orders.to_parquet(tmp_path / 'orders.parquet', index=False, row_group_size=1000)
+        s3_handler.upload_file(tmp_path / 'orders.parquet', 'input/orders.parquet')
+
+        reader = S3RangeReader(s3_handler.s3_client, 'etl-test', 'input/orders.parquet')
+        import pyarrow.parquet as pq
+        table = pq.read_table(reader, columns=['store_id', 'amount'], filters=[('id', '<=', 1000)])
+
+        assert table.column_names == ['store_id', 'amount']
+        assert table.num_rows == 1000
+        assert reader.bytes_read < reader.size
+
+    def test_tempfile_mode_still_works(self, s3_handler, orders):
+        s3_handler.io_mode = 'tempfile'
+        s3_handler.write_parquet_to_s3(orders, 'output/result.parquet')
+        result = s3_handler.read_parquet_from_s3('output/result.parquet', columns=['id'])
+
+        assert list(result.columns) == ['id']
+        assert len(result) == len(orders)
+
+
+class TestS3MultipartWriter:
+    def test_multipart_upload(self, s3_handler):
+        client = s3_handler.s3_client
+        payload = np.random.default_rng(2).bytes(11 * 1024 * 1024)
+
+        with S3MultipartWriter(client, 'etl-test', 'big.bin', part_size=5 * 1024 * 1024) as sink:
+            for start in range(0, len(payload), 1024 * 1024):
+                sink.write(payload[start:start + 1024 * 1024])
+
+        assert len(sink.parts) == 3
+        body = client.get_object(Bucket='etl-test', Key='big.bin')['Body'].read()
+        assert body == payload
+
+    def test_error_aborts_upload(self, s3_handler):
+        client = s3_handler.s3_client
+
+        with pytest.raises(RuntimeError):
+            with S3MultipartWriter(client, 'etl-test', 'broken.bin', part_size=5 * 1024 * 1024) as sink:
+                sink.write(b'x' * (6 * 1024 * 1024))
+                raise RuntimeError('boom')
+
+        listing = client.list_objects_v2(Bucket='etl-test')
+        assert 'broken.bin' not in [obj['Key'] for obj in listing.get('Contents', [])]
+        assert not client.list_multipart_uploads(Bucket='etl-test').get('Uploads')
+
+
+class TestS3BatchTransfer:
+    @pytest.fixture
+    def input_files(self, tmp_path):
+        for name in ['stores', 'users', 'orders']:
+            df = pd.DataFrame({'id': np.arange(1, 101), 'value': np.arange(100) * 1.5})
+            df.to_parquet(tmp_path / f'{name}.parquet', index=False)
+        return tmp_path
+
+    def test_upload_and_read_many(self, s3_handler, input_files):
+        s3_handler.upload_many([
+            (input_files / f'{name}.parquet', f'input/{name}.parquet')
+            for name in ['stores', 'users', 'orders']
+        ])
+
+        frames = s3_handler.read_many_parquet({
+            'input/stores.parquet': {'columns': ['id']},
+            'input/users.parquet': {'filters': [('id', '<=', 10)]},
+            'input/orders.parquet': {},
+        })
+
+        assert list(frames['input/stores.parquet'].columns) == ['id']
+        assert len(frames['input/users.parquet']) == 10
+        assert len(frames['input/orders.parquet']) == 100
+
+    def test_read_many_keys_list(self, s3_handler, input_files):
+        s3_handler.upload_many([(input_files / 'stores.parquet', 'input/stores.parquet')])
+        frames = s3_handler.read_many_parquet(['input/stores.parquet'])
+        assert len(frames['input/stores.parquet']) == 100
+
+    def test_error_is_raised(self, s3_handler):
+        with pytest.raises(Exception):
+            s3_handler.read_many_parquet(['input/missing.parquet'])
+
+    def test_transfer_settings(self, monkeypatch):
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        with moto.mock_aws():
+            handler = S3Handler(None, 'test', 'test', 'etl-test',
+                                transfer={'max_workers': 3, 'max_pool_connections': 64})
+
+        assert handler.max_workers == 3
+        assert handler.s3_client.meta.config.max_pool_connections == 64
+        assert handler.transfer_config.max_request_concurrency == 4
+
+
+class TestInputSync:
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        for name in ['stores', 'users']:
+            pd.DataFrame({'id': np.arange(1, 11)}).to_parquet(tmp_path / f'{name}.parquet', index=False)
+        return tmp_path
+
+    def test_uploads_only_changed(self, s3_handler, input_dir):
+        from s3_sync import InputSync
+
+        first = InputSync(s3_handler, input_dir).sync(['stores.parquet', 'users.parquet', 'orders.parquet'])
+        assert first == {'stores.parquet': True, 'users.parquet': True}
+
+        # новый объект синка - состояние читается из файла
+        second = InputSync(s3_handler, input_dir).sync(['stores.parquet', 'users.parquet'])
+        assert second == {'stores.parquet': False, 'users.parquet': False}
+
+        pd.DataFrame({'id': np.arange(1, 21)}).to_parquet(input_dir / 'users.parquet', index=False)
+        third = InputSync(s3_handler, input_dir).sync(['stores.parquet', 'users.parquet'])
+        assert third == {'stores.parquet': False, 'users.parquet': True}
+
+        head = s3_handler.s3_client.head_object(Bucket='etl-test', Key='input/users.parquet')
+        assert head['ContentLength'] == (input_dir / 'users.parquet').stat().st_size
+
+    def test_plain_etag_matches(self, s3_handler, input_dir):
+        from s3_sync import InputSync
+
+        # объект загружен без metadata - сравниваем с ETag
+        s3_handler.upload_file(input_dir / 'stores.parquet', 'input/stores.parquet')
+        status = InputSync(s3_handler, input_dir).sync(['stores.parquet'])
+        assert status == {'stores.parquet': False}
+
+    def test_checksum_cached_by_mtime(self, s3_handler, input_dir, monkeypatch):
+        from s3_sync import InputSync
+        import hashlib
+
+        sync = InputSync(s3_handler, input_dir)
+        first = sync.local_checksum(input_dir / 'stores.parquet')
+
+        monkeypatch.setattr(hashlib, 'md5', None)
+        assert sync.local_checksum(input_dir / 'stores.parquet') == first
+
+
+class TestS3ResultSink:
+    def test_result_fan_out_to_s3(self, s3_handler, tmp_path):
+        from writers import ParquetFileSink, ResultWriter, S3ParquetSink
+
+        result = pd.DataFrame({'city': ['Москва'], 'store_name': ['Магазин_1'], 'target_amount': [10.5]})
+        ResultWriter([
+            ParquetFileSink(tmp_path / 'result.parquet'),
+            S3ParquetSink(s3_handler.s3_client, 'etl-test', 'output/result.parquet'),
+        ]).write(result)
+
+        pd.testing.assert_frame_equal(s3_handler.read_parquet_from_s3('output/result.parquet'),
+                                      pd.read_parquet(tmp_path / 'result.parquet'))
+
+
+class TestS3Mode:
+    def test_reports_in_s3_mode(self, tmp_path, monkeypatch):
+        from data_generator import DataGenerator
+        from etl_process import StoreAnalyticsETL
+        from main import ETLRunner
+
+        DataGenerator(num_stores=20, num_users=500, num_orders=5000, seed=3).generate_all_fast(
+            tmp_path / 'data' / 'input')
+        config = tmp_path / 'config.yaml'
+        config.write_text('{"etl": {"cache": {"enabled": false}, '
+                          '"reports": [{"name": "by_status", "group_by": ["status"], "measure": "count"}]}}')
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('ETL_CONFIG', str(config))
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        monkeypatch.setenv('S3_ENDPOINT', 'https://s3.amazonaws.com')
+        monkeypatch.setenv('S3_BUCKET', 'etl-test')
+
+        with moto.mock_aws():
+            runner = ETLRunner('s3')
+            result = runner.run()
+            report = runner.s3_handler.read_parquet_from_s3('output/reports/by_status.parquet')
+
+        expected = StoreAnalyticsETL(tmp_path / 'data' / 'input', tmp_path / 'expected', tmp_path / 'logs').run()
+        pd.testing.assert_frame_equal(result, expected)
+        assert report['count_amount'].sum() == 5000
+        # отчеты считаются тем же проходом, что и основной топ-N
+        assert [record['stage'] for record in runner.etl.profiler.stages].count('reports') == 1
@@ -0,0 +1,155 @@
+# тесты постоянного режима (сервис с теплым состоянием)
+
+
+import pytest
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+pytest.importorskip('boto3')
+
+from data_generator import DataGenerator
+from etl_process import StoreAnalyticsETL
+from main import ETLRunner
+from service import ETLService, make_server
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    generator = DataGenerator(num_stores=30, num_users=1000, num_orders=5000, seed=7)
+    generator.generate_all_fast(tmp_path / 'data' / 'input', chunk_size=2500)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ETL_CONFIG', str(tmp_path / 'missing.yaml'))
+    return tmp_path
+
+
+def expected(workdir, **kwargs):
+    etl = StoreAnalyticsETL(workdir / 'data' / 'input', workdir / 'expected', workdir / 'logs', **kwargs)
+    return etl.run()
+
+
+class TestETLService:
+    @pytest.mark.parametrize('engine', ['pandas', 'arrow'])
+    def test_query_matches_etl(self, workdir, engine):
+        service = ETLService(ETLRunner('local', engine=engine))
+        service.warm()
+
+        result, info = service.query({})
+        assert info['source'] == 'memory'
+        pd.testing.assert_frame_equal(result, expected(workdir))
+
+        result, info = service.query({'top_n': '1', 'target_year': '2024'})
+        assert info['source'] == 'etl'
+        pd.testing.assert_frame_equal(result, expected(workdir, top_n=1, target_year=2024))
+
+    def test_refreshes_only_changed(self, workdir):
+        service = ETLService(ETLRunner('local'))
+        service.warm()
+        stores = service.tables['stores.parquet']
+        assert service.refresh() == {'changed': []}
+
+        orders_path = workdir / 'data' / 'input' / 'orders.parquet'
+        orders = pd.read_parquet(orders_path)
+        orders['amount'] = orders['amount'] * 2
+        orders.to_parquet(orders_path, index=False)
+
+        result, info = service.query({})
+        assert info['changed'] == ['orders.parquet']
+        assert info['source'] == 'etl'
+        assert service.tables['stores.parquet'] is stores
+        pd.testing.assert_frame_equal(result, expected(workdir))
+
+    def test_quarantine_per_refresh(self, workdir, monkeypatch):
+        config = {'etl': {'validation': {'enabled': True, 'quarantine': True}}}
+        (workdir / 'config.yaml').write_text(json.dumps(config))
+        monkeypatch.setenv('ETL_CONFIG', str(workdir / 'config.yaml'))
+        orders_path = workdir / 'data' / 'input' / 'orders.parquet'
+        orders = pd.read_parquet(orders_path)
+        orders.loc[0, 'amount'] = -1.0
+        orders.to_parquet(orders_path, index=False)
+
+        service = ETLService(ETLRunner('local'))
+        service.warm()
+        service.query({'target_year': '2024'})
+        orders['amount'] = orders['amount'] * 2
+        orders.to_parquet(orders_path, index=False)
+        service.query({})
+
+        # каждое чтение заказов - своим валидатором, строки не копятся между обновлениями
+        assert service.validator.quarantined_rows == {}
+        assert 'orders' not in service.validator.report.rows_checked
+        quarantined = pd.read_parquet(workdir / 'data' / 'output' / 'quarantine' / 'orders.parquet')
+        assert quarantined['amount'].tolist() == [-2.0]
+
+    def test_run_publishes(self, workdir):
+        service = ETLService(ETLRunner('local'))
+        service.warm()
+        result, _ = service.run({'top_n': 2})
+
+        published = pd.read_parquet(workdir / 'data' / 'output' / 'result.parquet')
+        assert published['store_name'].astype(str).tolist() == result['store_name'].astype(str).tolist()
+        assert (workdir / 'data' / 'output' / 'result.csv').exists()
+
+    def test_invalid_params(self, workdir):
+        service = ETLService(ETLRunner('local'))
+        service.warm()
+        with pytest.raises(ValueError):
+            service.query({'top_n': '0'})
+        with pytest.raises(ValueError):
+            service.query({'target_year': 'abc'})
+
+
+class TestHTTP:
+    @pytest.fixture
+    def url(self, workdir):
+        service = ETLService(ETLRunner('local'))
+        service.warm()
+        server = make_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+        server.shutdown()
+        server.server_close()
+
+    def request(self, url, method='GET', body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_endpoints(self, url, workdir):
+        status, health = self.request(f'{url}/health')
+        assert status == 200
+        assert health['warm_years'] == [2025]
+
+        status, answer = self.request(f'{url}/result?top_n=1')
+        assert status == 200
+        assert answer['source'] == 'memory'
+        cities = [row['city'] for row in answer['result']]
+        assert len(cities) == len(set(cities)) == answer['rows']
+
+        city = cities[0]
+        status, answer = self.request(f'{url}/result?city={urllib.parse.quote(city)}')
+        assert {row['city'] for row in answer['result']} == {city}
+
+        status, answer = self.request(f'{url}/run', 'POST', {'top_n': 2})
+        assert status == 200
+        assert (workdir / 'data' / 'output' / 'result.parquet').exists()
+
+        status, answer = self.request(f'{url}/refresh', 'POST')
+        assert (status, answer['changed']) == (200, [])
+
+    def test_errors(self, url):
+        assert self.request(f'{url}/result?top_n=-1')[0] == 400
+        assert self.request(f'{url}/missing')[0] == 404
+        assert self.request(f'{url}/run', 'POST', [1, 2])[0] == 400
@@ -0,0 +1,146 @@
+# тесты колоночной проверки данных
+
+
+import pytest
+from datetime import datetime
+import json
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from validation import DataValidator
+from etl_process import StoreAnalyticsETL
+
+
+@pytest.fixture
+def stores():
+    return pd.DataFrame({
+        'id': [1, 2, 0],
+        'name': ['Store_A', '  ', 'Store_C'],
+        'city': ['Moscow', 'SPB', None]
+    })
+
+
+@pytest.fixture
+def users():
+    return pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['User_1', '', 'User_3'],
+        'phone': ['+7', '+7', '+7'],
+        'created_at': [datetime(2025, 1, 1), datetime(2025, 2, 1), pd.NaT]
+    })
+
+
+@pytest.fixture
+def orders():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, -5],
+        'amount': [100.0, -1.0, np.nan, 50.0, 10.0],
+        'user_id': [1, 1, 2, 99, 3],
+        'store_id': [1, 2, 1, 1, 7],
+        'status': ['completed'] * 5,
+        'created_at': [datetime(2025, 3, 1)] * 5
+    })
+
+
+class TestDataValidator:
+    def test_store_rules(self, stores):
+        validator = DataValidator()
+        validator.validate('stores', stores)
+        report = validator.report.to_dict()
+
+        assert not report['ok']
+        assert report['violations'] == {
+            'stores.id_not_positive': 1, 'stores.name_empty': 1, 'stores.city_empty': 1
+        }
+        assert report['samples']['stores.name_empty'] == [2]
+        assert report['rows_checked'] == {'stores': 3}
+
+    def test_user_rules(self, users):
+        validator = DataValidator()
+        validator.validate('users', users)
+
+        assert validator.report.violations['users.name_empty'] == 1
+        assert validator.report.violations['users.created_at_not_datetime'] == 1
+
+    def test_created_at_wrong_type(self, users):
+        validator = DataValidator()
+        validator.validate('users', users.assign(created_at='2025-01-01'))
+
+        assert validator.report.violations['users.created_at_not_datetime'] == 3
+
+    def test_order_rules_and_references(self, stores, users, orders):
+        validator = DataValidator()
+        validator.set_references(stores, users)
+        validator.validate_orders(orders)
+        violations = validator.report.to_dict()['violations']
+
+        assert violations == {
+            'orders.id_not_positive': 1,
+            'orders.amount_negative': 2,
+            'orders.store_not_found': 1,
+            'orders.user_not_found': 1,
+        }
+        assert validator.report.samples['orders.user_not_found'] == [4]
+
+    def test_missing_columns_skipped(self, orders):
+        # в streaming читаются только нужные колонки
+        validator = DataValidator()
+        validator.validate_orders(orders[['user_id', 'store_id', 'amount']])
+
+        assert validator.report.to_dict()['violations'] == {'orders.amount_negative': 2}
+
+    def test_report_only_keeps_rows(self, orders):
+        validator = DataValidator()
+
+        assert len(validator.validate_orders(orders)) == len(orders)
+        assert validator.report.quarantined == {}
+
+    def test_quarantine(self, stores, users, orders, tmp_path):
+        validator = DataValidator(quarantine=True)
+        validator.set_references(stores, users)
+        clean = validator.validate_orders(orders)
+
+        assert list(clean['id']) == [1]
+        assert validator.report.quarantined == {'orders': 4}
+
+        paths = validator.write_quarantine(tmp_path / 'quarantine')
+        assert paths == [tmp_path / 'quarantine' / 'orders.parquet']
+        assert sorted(pd.read_parquet(paths[0])['id']) == [-5, 2, 3, 4]
+
+
+class TestETLValidation:
+    @pytest.fixture
+    def input_dir(self, tmp_path, stores, users, orders):
+        stores.assign(id=[1, 2, 3]).to_parquet(tmp_path / 'stores.parquet', index=False)
+        users.assign(created_at=[datetime(2025, 1, 1)] * 3).to_parquet(tmp_path / 'users.parquet', index=False)
+        orders.to_parquet(tmp_path / 'orders.parquet', index=False)
+        return tmp_path
+
+    @pytest.mark.parametrize('mode', ['full', 'streaming', 'parallel', 'incremental', 'external'])
+    def test_quarantine_excluded_from_result(self, input_dir, tmp_path, mode):
+        etl = StoreAnalyticsETL(input_dir, tmp_path / f'out_{mode}', tmp_path / f'logs_{mode}',
+                                mode=mode, quarantine=True)
+        result = etl.run()
+
+        # отрицательная сумма не попадает в итог, пустой город уходит в карантин
+        assert result['target_amount'].sum() == pytest.approx(100.0)
+        assert (tmp_path / f'out_{mode}' / 'quarantine' / 'stores.parquet').exists()
+
+        metrics = json.loads(next((tmp_path / f'logs_{mode}').glob('metrics_*.json')).read_text())
+        assert metrics['validation']['quarantined']['stores'] == 2
+        # заказы проверяются во всех режимах, в parallel - в воркерах
+        assert metrics['validation']['quarantined']['orders'] >= 2
+        assert metrics['validation']['violations']['orders.amount_negative'] == 2
+        assert not metrics['validation']['ok']
+
+    def test_arrow_streaming_warns_orders_unchecked(self, input_dir, tmp_path, caplog):
+        etl = StoreAnalyticsETL(input_dir, tmp_path / 'out', tmp_path / 'logs', mode='streaming', engine='arrow',
+                                quarantine=True)
+        with caplog.at_level('WARNING'):
+            etl.run()
+        assert 'Заказы не проверяются' in caplog.text
+        assert 'orders' not in etl.validator.report.rows_checked
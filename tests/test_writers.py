@@ -0,0 +1,75 @@
+# тесты записи результата
+
+
+import pytest
+import pandas as pd
+import pyarrow.parquet as pq
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from profiling import StageProfiler
+from writers import AtomicFile, CsvFileSink, ParquetFileSink, ResultWriter, parquet_options
+
+
+@pytest.fixture
+def result():
+    return pd.DataFrame({
+        'city': pd.Categorical(['Москва', 'Москва', 'Рыбинск, "центр"']),
+        'store_name': pd.Categorical(['Магазин_1', 'Магазин_2', 'Магазин_3']),
+        'target_amount': [1500.5, 900.25, 10.0],
+    })
+
+
+class FailingSink:
+    stage = 'write_broken'
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, table):
+        # падаем посреди записи, когда временный файл уже создан
+        with AtomicFile(self.path) as f:
+            f.write(b'PAR1 half written')
+            assert any(p.name.startswith('.result.parquet.tmp') for p in self.path.parent.iterdir())
+            raise OSError('диск закончился')
+
+
+class TestResultWriter:
+    def test_fan_out(self, result, tmp_path):
+        profiler = StageProfiler()
+        written = ResultWriter([
+            ParquetFileSink(tmp_path / 'result.parquet', row_group_size=2),
+            CsvFileSink(tmp_path / 'result.csv'),
+        ], profiler=profiler).write(result)
+
+        assert [record['stage'] for record in profiler.stages] == ['write_to_arrow', 'write_parquet', 'write_csv']
+        assert written['write_parquet'] == (tmp_path / 'result.parquet').stat().st_size
+
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / 'result.parquet'), result)
+        metadata = pq.ParquetFile(tmp_path / 'result.parquet').metadata
+        assert metadata.num_row_groups == 2
+        assert metadata.row_group(0).column(2).statistics.has_min_max
+        assert metadata.row_group(0).column(2).compression == 'ZSTD'
+
+        raw = (tmp_path / 'result.csv').read_bytes()
+        assert raw.startswith(b'\xef\xbb\xbf')
+        csv = pd.read_csv(tmp_path / 'result.csv', encoding='utf-8-sig')
+        pd.testing.assert_frame_equal(csv, result.astype({'city': str, 'store_name': str}), check_dtype=False)
+
+    def test_failed_write_keeps_old_file(self, result, tmp_path):
+        path = tmp_path / 'result.parquet'
+        ResultWriter([ParquetFileSink(path)]).write(result.head(1))
+
+        with pytest.raises(OSError):
+            ResultWriter([FailingSink(path)]).write(result)
+
+        assert len(pd.read_parquet(path)) == 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['result.parquet']
+
+    def test_parquet_options_from_config(self):
+        options = parquet_options({'parquet': {'compression': 'snappy'}})
+
+        assert options['compression'] == 'snappy'
+        assert options['write_statistics'] is True